@@ -4,12 +4,36 @@
 This module initializes and runs the Flask application for regex matching.
 """
 
+import asyncio
+import contextlib
 import html
+import itertools
+import json
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
-from flask import Flask, jsonify, render_template, request, send_from_directory
+from flask import Flask, Response, jsonify, render_template, request, send_from_directory
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+try:
+    from flask_sock import Sock
+except ImportError:  # Optional, live sessions are only available with flask-sock
+    Sock = None
 
 from project import App, Config, log
 from src import EngineManager
+from src.admission import AdmissionController, Throttled, engine_seconds
+from src.engine.profiler import profile
+from src.live_session import LiveSession, ResyncRequired
+from src.metrics import SIZE_BUCKETS, metrics
+from src.redos import RISK_EXPONENTIAL, RISK_NONE, analyze
+from src.result_cache import ResultCache
+from src.sessions import MatchSessions, Superseded
+from src.single_flight import ORIGIN_LEADER, SingleFlight
+from src.text_store import TextHandle, TextTooLargeError, text_store
+from src.utils.compare import OFFSET_UNIT_UTF16, diff_results, normalize_offsets, utf16_to_code_point_table
+from src.utils.export import EXPORT_FORMATS, iter_csv, iter_jsonl, iter_ndjson
 from src.utils.interface import ColorGenerator, MatchHighlighterRegex, MatchHighlighterText, MatchTableGenerator
 from src.utils.link import decode_dict, encode_dict
 
@@ -21,18 +45,50 @@ class RegexMatcherApp:
 
     def __init__(self):
         self.app = Flask(__name__)
+        if Config.proxy_count:
+            # Take the client address from the X-Forwarded-For headers set by the trusted proxies in front of the app
+            self.app.wsgi_app = ProxyFix(self.app.wsgi_app, x_for=Config.proxy_count)
         self.engine_manager = EngineManager()
+        self.engine_manager.start()
+        self.result_cache = ResultCache()
+        self.admission = AdmissionController()
+        self.single_flight = SingleFlight()
+        self.sessions = MatchSessions()
+        self.text_store = text_store
+        self.metrics = metrics
         self.color_generator = ColorGenerator(division_factor=4)
         self.match_highlighter_text = MatchHighlighterText()
         self.match_highlighter_regex = MatchHighlighterRegex()
         self.match_table_generator = MatchTableGenerator()
 
         self.app.add_url_rule("/", methods=["GET", "POST"], view_func=self.index)
+        self.app.add_url_rule("/stream", methods=["POST"], view_func=self.stream)
+        self.app.add_url_rule("/batch", methods=["POST"], view_func=self.batch)
+        self.app.add_url_rule("/compare", methods=["POST"], view_func=self.compare)
+        self.app.add_url_rule("/upload_text", methods=["POST"], view_func=self.upload_text)
         self.app.add_url_rule("/get_engine_info", methods=["POST"], view_func=self.get_engine_info)
         self.app.add_url_rule("/get_example_regex", methods=["POST"], view_func=self.get_example_regex)
         self.app.add_url_rule("/get_decode_link", methods=["POST"], view_func=self.decode_link)
+        self.app.add_url_rule("/cache_stats", methods=["GET"], view_func=self.cache_stats)
+        self.app.add_url_rule("/metrics", methods=["GET"], view_func=self.metrics_endpoint)
         self.app.add_url_rule("/robots.txt", methods=["GET"], view_func=self.robots_txt)
         self.app.add_url_rule("/favicon.ico", methods=["GET"], view_func=self.favicon)
+        self.app.before_request(self._record_request_size)
+        self.app.register_error_handler(Throttled, self._throttled)
+        self.app.register_error_handler(Superseded, self._superseded)
+        self.live_sessions = Config.live_sessions and self._init_live_sessions()
+
+    def _init_live_sessions(self):
+        """Serves live sessions on the `/live` WebSocket, returns whether they are available."""
+        if Sock is None:
+            log.warning("Live sessions need flask-sock, the page sends a request for every match instead")
+            return False
+        self.app.config["SOCK_SERVER_OPTIONS"] = {
+            "ping_interval": 25,
+            "max_message_size": Config.max_upload_mb * 1024 * 1024,
+        }
+        Sock(self.app).route("/live")(self.live)
+        return True
 
     def robots_txt(self):
         """
@@ -48,12 +104,35 @@ class RegexMatcherApp:
         """
         return send_from_directory(self.app.static_folder, "favicon.svg", mimetype="image/svg+xml")
 
-    def _process_regex(self, regex_pattern, input_text, selected_engine):
+    async def _process_regex(
+        self,
+        regex_pattern,
+        input_text,
+        selected_engine,
+        limit=Config.max_matches,
+        offset=0,
+        match_text=None,
+        session=None,
+    ):
         """
         Processes the regex matching and returns the results.  This is the
         core logic, extracted for reuse.  Returns a dictionary suitable for
-        either jsonify or render_template.
+        either jsonify or render_template. Only one page of at most `limit`
+        matches starting at `offset` is matched and rendered. `match_text` is
+        sent to the match workers in place of the text, e.g. a `TextHandle`.
+        The `timing` of the result breaks the time down into the phases of the match (see `MatchWorkerPool.match`),
+        with `engine` for the whole match, `highlight` and `table` for rendering and `total` for the request.
+        `redos` holds the backtracking risk of the pattern and the action taken (see `_check_redos`).
+        Matches which are not served from the cache pass the admission control of the client. The match is awaited in
+        the event loop of the request, see `EngineManager.match_async`. Concurrent identical requests share one match
+        (see `SingleFlight`), their `timing` only holds the time they waited for it as `flight`. `session` is the
+        `(session id, sequence number)` of the request, its match is cancelled when a newer request of the session
+        arrives (see `MatchSessions`).
+
+        :raises Throttled: If the client or the host is over a limit of the admission control.
+        :raises Superseded: If a newer request of the session arrived.
         """
+        start_time = time.perf_counter()
         data = {"r": regex_pattern, "t": input_text, "e": selected_engine}
         encode_data = encode_dict(data)
 
@@ -68,17 +147,108 @@ class RegexMatcherApp:
                 "dark_theme_color": {},
                 "light_theme_color": {},
                 "encode_data": encode_data,
+                "offset": offset,
+                "limit": limit,
+                "match_count": 0,
+                "has_more": False,
             }
 
-        matches, error, execution_time = self.engine_manager.match(selected_engine, regex_pattern, input_text)
+        redos = self._check_redos(regex_pattern, selected_engine)
+        engine = self.engine_manager.get_engine(selected_engine)
+        cache_key = None
+        if engine and redos["action"] != "refuse":
+            # An uploaded text is keyed by its handle, which is already the hash of its content
+            cache_key = ResultCache.make_key(
+                selected_engine, engine.version, regex_pattern, 0, match_text or input_text, limit=limit, offset=offset
+            )
+            cached = self._cached_result(cache_key)
+            if cached:
+                cached["execution_time"] = f"{cached['execution_time']} (cached)"
+                total = time.perf_counter() - start_time
+                cached["timing"] = {"cache": total, "total": total}
+                return cached
+
+        async def match_and_render():
+            page = await self._run_match(
+                selected_engine, regex_pattern, match_text or input_text, limit, offset, redos, session
+            )
+            result = self._render_page(page, regex_pattern, input_text, selected_engine, offset, limit, start_time)
+            result.update(encode_data=encode_data, redos=redos)
+            # Errors include timeouts, which depend on the load of the host, only successful matches are reused
+            if cache_key and not page["error"]:
+                self.result_cache.put(cache_key, {**result, "matches": page["matches"]})
+            return result
+
+        if cache_key is None:
+            return await match_and_render()
+        # Identical requests arriving while this one runs wait for it instead of running the same match again
+        result, origin = await self.single_flight.run(
+            cache_key,
+            match_and_render,
+            lookup=(lambda: self._cached_result(cache_key)) if self.result_cache.enabled else None,
+        )
+        if origin != ORIGIN_LEADER:
+            self.metrics.inc("openregex_coalesced_matches_total", {"scope": origin})
+            total = time.perf_counter() - start_time
+            result = {**result, "execution_time": f"{result['execution_time']} (shared)"}
+            result["timing"] = {"flight": total, "total": total}
+        return result
+
+    def _cached_result(self, cache_key):
+        """Returns the cached result of a match without its matches, None if it is not cached."""
+        cached = self.result_cache.get(cache_key)
+        if self.result_cache.enabled:
+            self.metrics.inc("openregex_result_cache_lookups_total", {"result": "hit" if cached else "miss"})
+        if cached:
+            cached.pop("matches", None)
+        return cached
+
+    async def _run_match(self, selected_engine, regex_pattern, text, limit, offset, redos, session=None):
+        """Matches one page under the admission control of the client, or refuses the pattern for its ReDoS risk.
+
+        The match of a session is cancelled, and its match worker killed, when a newer request of the session arrives.
+        """
+        if redos["action"] == "refuse":
+            error = self._redos_error(redos)
+            return {"matches": [], "error": error, "execution_time": 0, "has_more": False, "timing": {"total": 0.0}}
+        with self._admitted() as charge:
+            match = self.engine_manager.match_async(
+                selected_engine, regex_pattern, text, limit=limit, offset=offset, timeout=redos["timeout"]
+            )
+            page = await (self.sessions.run(*session, match) if session else match)
+            charge(engine_seconds(page["timing"]))
+        return page
+
+    def _profile(self, regex_pattern, input_text, selected_engine):
+        """Profiles the backtracking of a match in this process under the admission control of the client, charged
+        with the time the profiler ran.
+
+        :raises Throttled: If the client or the host is over a limit.
+        """
+        with self._admitted():
+            return profile(regex_pattern, input_text, selected_engine)
+
+    def _render_page(self, page, regex_pattern, input_text, selected_engine, offset, limit, start_time):
+        """Renders the matches table and the highlighting of a matched page, with the timing of the request."""
+        matches, error, execution_time = page["matches"], page["error"], page["execution_time"]
+        table_start = time.perf_counter()
         number_of_colors = self.get_number_of_colors(matches)
         self.color_generator.generate_color(number_of_colors)
-        matches_table = self.match_table_generator.generate_match_table(matches)
+        matches_table = self.match_table_generator.generate_match_table(matches, first_number=offset + 1)
+        highlight_start = time.perf_counter()
         highlighted_text = self.match_highlighter_text.highlight_matches(input_text, matches)
         highlighted_regex = self.match_highlighter_regex.highlight_regex(regex_pattern, number_of_colors)
         self.color_generator.generate_gray_color(
             number_of_colors, number_of_colors + self.match_highlighter_regex.gray_color_counter
         )
+        highlight_end = time.perf_counter()
+        timing = {key: value for key, value in page["timing"].items() if key != "total"}
+        timing.update(
+            engine=page["timing"]["total"],
+            table=highlight_start - table_start,
+            highlight=highlight_end - highlight_start,
+            total=highlight_end - start_time,
+        )
 
         if error:
             highlighted_text = html.escape(error)
@@ -93,9 +263,40 @@ class RegexMatcherApp:
             "execution_time": self.execution_time(execution_time),
             "dark_theme_color": self.color_generator.dark_theme_colors,
             "light_theme_color": self.color_generator.light_theme_colors,
-            "encode_data": encode_data,
+            "offset": offset,
+            "limit": limit,
+            "match_count": len(matches),
+            "has_more": page["has_more"],
+            "timing": timing,
         }
 
+    def _check_redos(self, regex_pattern, selected_engine):
+        """Analyzes the pattern for catastrophic backtracking and applies `OPENREGEX_REDOS_POLICY` to risky patterns.
+
+        Patterns with an exponential risk get the shorter `OPENREGEX_REDOS_TIMEOUT_S` with the `budget` policy (the
+        default) and are not matched at all with `refuse`. Polynomial risks, and every risk with the `warn` policy, are
+        only reported. Returns the report of `src.redos.analyze` with the `action` taken and the `timeout` of the
+        match, None for the default timeout.
+        """
+        report = analyze(regex_pattern, selected_engine)
+        action, timeout = "none", None
+        if report.risk != RISK_NONE:
+            action = "warn"
+            if report.risk == RISK_EXPONENTIAL and Config.redos_policy in ("budget", "refuse"):
+                action = Config.redos_policy
+                timeout = Config.redos_timeout if action == "budget" else None
+            self.metrics.inc("openregex_redos_patterns_total", {"risk": report.risk, "action": action})
+        return {**report.to_dict(), "action": action, "timeout": timeout}
+
+    @staticmethod
+    def _redos_error(redos):
+        """Describes why a pattern was refused."""
+        finding = redos["findings"][0]
+        return (
+            f"Pattern refused, it may backtrack catastrophically: {finding['message']} "
+            f"Rewrite characters {finding['start']}-{finding['end']} so the text can be matched only in one way."
+        )
+
     def _render_index(self, context_data=None):
         """Renders the index.html template with provided context or defaults."""
         default_context = {
@@ -113,6 +314,7 @@ class RegexMatcherApp:
             "execution_time": self.execution_time(0),
             "dark_theme_color": {},
             "light_theme_color": {},
+            "live_sessions": self.live_sessions,
         }
 
         # Update the default context with any provided data
@@ -121,18 +323,380 @@ class RegexMatcherApp:
 
         return render_template("index.html", **default_context)
 
-    def index(self):
-        """Handles the main page requests."""
+    async def index(self):
+        """Handles the main page requests, matches are awaited without blocking on the match worker."""
         if request.method == "POST":
             regex_pattern = request.json["regex_input"]
-            input_text = request.json["text_input"]
             selected_engine = request.json.get("engine", "")
-            result = self._process_regex(regex_pattern, input_text, selected_engine)
+            try:
+                input_text, match_text = self._request_text()
+            except KeyError:
+                return jsonify({"error": "Unknown text handle, upload the text again."}), 404
+            try:
+                limit = max(0, int(request.json.get("limit", Config.max_matches)))
+                offset = max(0, int(request.json.get("offset", 0)))
+                session = self._request_session()
+            except (TypeError, ValueError):
+                return jsonify({"error": "Limit, offset and seq must be integers."}), 400
+            if session:
+                self.sessions.begin(*session)
+            result = await self._process_regex(
+                regex_pattern, input_text, selected_engine, limit, offset, match_text, session
+            )
+            if request.json.get("profile") and regex_pattern and input_text:
+                # Profiles depend on the step budget and are never served from the result cache. The result may be
+                # shared with coalesced requests (see `SingleFlight`), the profile goes into a copy
+                result = {**result, "profile": self._profile(regex_pattern, input_text, selected_engine)}
             return jsonify(result)  # AJAX response
 
         return self._render_index()  # Default GET request
 
-    def get_engine_info(self):
+    def live(self, ws):
+        """Serves a live session: the page sends edits (see `LiveSession`) over the WebSocket and gets `matching`, then
+        `result` or `error` for every edit, or `cancelled` when the next edit supersedes it before its match ends.
+
+        The connection holds its thread for as long as it is open, the match of the latest edit runs in the event loop
+        of the connection and is cancelled on the next edit, which also kills its match worker.
+        """
+        receiver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LiveReceive")
+        try:
+            asyncio.run(self._live(ws, receiver))
+        finally:
+            receiver.shutdown(wait=False)
+
+    async def _live(self, ws, receiver):
+        """Waits for the next edit of a live session and for the match of the latest edit, whichever comes first.
+
+        The blocking `receive` of the WebSocket runs in the `receiver` thread, nothing is polled.
+        """
+        loop = asyncio.get_running_loop()
+        session = LiveSession()
+        receive = loop.run_in_executor(receiver, ws.receive)
+        task, seq = None, 0
+        try:
+            while True:
+                done, _ = await asyncio.wait({receive, task} - {None}, return_when=asyncio.FIRST_COMPLETED)
+                if task in done:
+                    self._live_send(ws, task.result())
+                    task = None
+                if receive not in done:
+                    continue
+                message = receive.result()
+                receive = loop.run_in_executor(receiver, ws.receive)
+                if not self._live_apply(ws, session, message):
+                    continue
+                if task is not None:
+                    await self._cancel(task)
+                    self._live_send(ws, {"type": "cancelled", "seq": seq})
+                seq = session.seq
+                task = asyncio.ensure_future(self._live_match(session, seq))
+                self._live_send(ws, {"type": "matching", "seq": seq})
+        finally:
+            if task is not None:
+                await self._cancel(task)
+
+    def _live_apply(self, ws, session, message):
+        """Applies an edit to the session, returns whether it was applied. Rejected edits are answered with a seq."""
+        try:
+            message = json.loads(message)
+            session.apply(message)
+            return True
+        except ResyncRequired as e:
+            # The page answers with the whole text as a new edit
+            log.debug(str(e))
+            self._live_send(ws, {"type": "resync", "seq": message["seq"]})
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            seq = message.get("seq") if isinstance(message, dict) else None
+            self._live_send(ws, {"type": "error", "seq": seq, "status": 400, "error": f"Invalid edit: {e}"})
+        return False
+
+    async def _live_match(self, session, seq):
+        """Matches the state of the session and returns the message answering edit `seq`."""
+        # The next edit changes the session while the match runs
+        regex_pattern, input_text, selected_engine = session.regex, session.text, session.engine
+        offset, with_profile = session.offset, session.profile
+        try:
+            result = await self._process_regex(regex_pattern, input_text, selected_engine, offset=offset)
+            if with_profile and regex_pattern and input_text:
+                result = {**result, "profile": self._profile(regex_pattern, input_text, selected_engine)}
+        except Throttled as e:
+            self._record_throttled(e)
+            return {"type": "error", "seq": seq, "status": 429, "error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            # The session stays open, the page gets the error like a failed request
+            log.error(f"Live match failed: {e}")
+            return {"type": "error", "seq": seq, "status": 500, "error": "Matching failed."}
+        return {"type": "result", "seq": seq, "result": result}
+
+    def _live_send(self, ws, message):
+        ws.send(self.app.json.dumps(message))
+
+    @staticmethod
+    async def _cancel(task):
+        """Cancels a task and waits until it ended."""
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def stream(self):
+        """Streams the matches while the engine finds them, as NDJSON or as a JSONL/CSV export of the groups."""
+        regex_pattern = request.json.get("regex_input", "")
+        selected_engine = request.json.get("engine", "")
+        try:
+            match_text = self._request_match_text()
+        except KeyError:
+            return jsonify({"error": "Unknown text handle, upload the text again."}), 404
+        export_format = request.json.get("format", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({"error": f"Invalid format, use one of: {', '.join(EXPORT_FORMATS)}."}), 400
+        if not regex_pattern:
+            return jsonify({"error": "No regex provided."}), 400
+        redos = self._check_redos(regex_pattern, selected_engine)
+        if redos["action"] == "refuse":
+            return jsonify({"error": self._redos_error(redos), "redos": redos}), 400
+
+        client = self._client()
+        ticket = self.admission.acquire(client)
+        messages = self.engine_manager.stream(selected_engine, regex_pattern, match_text, timeout=redos["timeout"])
+        messages = self._release_after_stream(messages, ticket, client)
+        first_message = next(messages)
+        if export_format == "ndjson":
+            response = Response(
+                iter_ndjson(itertools.chain([first_message], messages)), mimetype="application/x-ndjson"
+            )
+        # Exports have no room for an error, report errors before the first match as a failed request
+        elif first_message["error"]:
+            messages.close()
+            return jsonify({"error": first_message["error"]}), 400
+        else:
+            matches = self._iter_stream_matches(itertools.chain([first_message], messages))
+            if export_format == "csv":
+                body, mimetype = iter_csv(matches), "text/csv"
+            else:
+                body, mimetype = iter_jsonl(matches), "application/jsonl"
+            response = Response(
+                body,
+                mimetype=mimetype,
+                headers={"Content-Disposition": f"attachment; filename=matches.{export_format}"},
+            )
+        # The server closes the response when the client disconnects, the stream then ends its match and admission
+        response.call_on_close(messages.close)
+        return response
+
+    def _release_after_stream(self, messages, ticket, client):
+        """Passes the messages of a stream through and releases its admission when the stream ends or is closed.
+
+        The last message has the timing of the whole stream, an abandoned stream is charged with the time it ran.
+        """
+        start_time = time.perf_counter()
+        seconds = None
+        try:
+            for message in messages:
+                if message.get("done"):
+                    seconds = engine_seconds(message["timing"])
+                yield message
+        finally:
+            messages.close()
+            self.admission.release(ticket, client, time.perf_counter() - start_time if seconds is None else seconds)
+
+    @staticmethod
+    def _iter_stream_matches(messages):
+        """Yields the matches of a stream, an error after the first match ends the export early."""
+        for message in messages:
+            yield from message["matches"]
+            if message["error"]:
+                log.error(f"Export stopped after an engine error: {message['error']}")
+
+    def batch(self):
+        """Matches a list of jobs in parallel and returns the results in order with their timings and errors.
+
+        Every job has the fields of a match request (`regex_input`, `text_input` or `text_handle`, `engine`, `limit`,
+        `offset`) and an optional `timeout` in seconds.
+        """
+        jobs = request.json.get("jobs")
+        if not isinstance(jobs, list) or not jobs:
+            return jsonify({"error": "No jobs provided."}), 400
+        if len(jobs) > Config.max_batch_jobs:
+            return jsonify({"error": f"Too many jobs, at most {Config.max_batch_jobs} are allowed."}), 400
+
+        try:
+            match_jobs = [self._batch_job(job) for job in jobs]
+        except (AttributeError, TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid job: {e}"}), 400
+
+        # The batch takes one admission slot per match worker it occupies
+        parallelism = self.engine_manager.parallelism(len(match_jobs))
+        time_start = time.time()
+        with self._admitted(parallelism) as charge:
+            results = self.engine_manager.match_many(match_jobs, parallelism)
+            charge(sum(engine_seconds(result["timing"]) for result in results))
+        return jsonify({"results": results, "execution_time": time.time() - time_start})
+
+    @staticmethod
+    def _batch_job(job):
+        """Converts a job of a batch request into a job of `EngineManager.match_many`."""
+        text = TextHandle(job["text_handle"]) if job.get("text_handle") else job.get("text_input", "")
+        timeout = job.get("timeout")
+        return {
+            "engine": job.get("engine", ""),
+            "pattern": str(job.get("regex_input", "")),
+            "text": text,
+            "limit": max(0, int(job.get("limit", Config.max_matches))),
+            "offset": max(0, int(job.get("offset", 0))),
+            "timeout": float(timeout) if timeout is not None else None,
+        }
+
+    def compare(self):
+        """Runs the pattern on every engine in parallel and returns the results with a diff of their matches.
+
+        Match and group indices of all engines are returned in code points, engines counting UTF-16 code units are
+        converted, so the spans of all engines can be compared directly.
+        """
+        regex_pattern = request.json.get("regex_input", "")
+        if not regex_pattern:
+            return jsonify({"error": "No regex provided."}), 400
+        try:
+            input_text, match_text = self._request_text()
+            limit = max(0, int(request.json.get("limit", Config.max_matches)))
+        except KeyError:
+            return jsonify({"error": "Unknown text handle, upload the text again."}), 404
+        except (TypeError, ValueError):
+            return jsonify({"error": "Limit must be an integer."}), 400
+
+        time_start = time.time()
+        with self._admitted(len(self.engine_manager.engine)) as charge:
+            results = self.engine_manager.compare(regex_pattern, match_text, limit=limit)
+            charge(sum(engine_seconds(result["timing"]) for result in results.values()))
+        utf16_engines = [
+            name for name in results if self.engine_manager.get_engine(name).offset_unit == OFFSET_UNIT_UTF16
+        ]
+        table = utf16_to_code_point_table(input_text) if utf16_engines else None
+        for name in utf16_engines:
+            results[name]["matches"] = normalize_offsets(results[name]["matches"], table)
+        return jsonify({"results": results, "diff": diff_results(results), "execution_time": time.time() - time_start})
+
+    def upload_text(self):
+        """Stores the request body as a text and returns its handle for match requests.
+
+        The body is UTF-8 text, optionally gzip compressed (`Content-Encoding: gzip`) or sent with chunked transfer
+        encoding. It is spooled to the text store while it is received.
+        """
+        try:
+            handle = self.text_store.put_stream(self._iter_request_body(), max_size=Config.max_upload_mb * 1024 * 1024)
+        except TextTooLargeError as e:
+            return jsonify({"error": str(e)}), 413
+        except (UnicodeDecodeError, zlib.error) as e:
+            return jsonify({"error": f"Invalid text: {e}"}), 400
+        return jsonify({"handle": handle})
+
+    @staticmethod
+    def _iter_request_body(chunk_size=64 * 1024):
+        """Yields the request body in chunks, decompressed if it is gzip encoded."""
+        gzip_encoded = request.headers.get("Content-Encoding", "").lower() == "gzip"
+        decompressor = zlib.decompressobj(wbits=31) if gzip_encoded else None
+        while True:
+            chunk = request.stream.read(chunk_size)
+            if not chunk:
+                break
+            if decompressor is None:
+                yield chunk
+                continue
+            # Bound the output of every step, a small compressed body may expand to a huge text
+            while chunk:
+                yield decompressor.decompress(chunk, chunk_size)
+                chunk = decompressor.unconsumed_tail
+        if decompressor is not None:
+            yield decompressor.flush()
+            if not decompressor.eof:
+                raise zlib.error("Incomplete gzip body")
+
+    @staticmethod
+    def _client():
+        """Returns the identity of the client for the admission control, its address."""
+        return request.remote_addr or ""
+
+    @contextlib.contextmanager
+    def _admitted(self, slots=1):
+        """Runs a match under the admission control of the client, it is charged with the engine seconds passed to
+        the yielded function. A match which fails before reporting its time is charged with the time it ran.
+
+        :param slots: Number of matches the request runs at the same time.
+        :raises Throttled: If the client or the host is over a limit.
+        """
+        client = self._client()
+        ticket = self.admission.acquire(client, slots)
+        start_time = time.perf_counter()
+        charged = []
+        try:
+            yield charged.append
+        finally:
+            self.admission.release(ticket, client, charged[-1] if charged else time.perf_counter() - start_time)
+
+    @staticmethod
+    def _request_session():
+        """Returns the `(session id, sequence number)` of a match request, None for requests without a session.
+
+        :raises TypeError: If the request has a session without a `seq`, or with a `seq` which is not a number.
+        :raises ValueError: If the `seq` of the session is not an integer.
+        """
+        session = request.json.get("session")
+        if not session:
+            return None
+        seq = request.json.get("seq")
+        if seq is None or isinstance(seq, (bool, list, dict)):
+            raise TypeError(f"Invalid seq: {seq!r}")
+        if isinstance(seq, float) and not seq.is_integer():
+            raise ValueError(f"Invalid seq: {seq!r}")
+        return str(session)[:64], int(seq)
+
+    @staticmethod
+    def _superseded(error):
+        """Answers a request superseded by a newer request of its session, the page no longer waits for it."""
+        log.debug(str(error))
+        return jsonify({"error": str(error)}), 409
+
+    def _throttled(self, error):
+        """Refuses a match over a limit of the admission control with 429 and `Retry-After`."""
+        self._record_throttled(error)
+        response = jsonify({"error": str(error), "reason": error.reason, "retry_after": error.retry_after})
+        response.status_code = 429
+        response.headers["Retry-After"] = error.retry_after_header
+        return response
+
+    def _record_throttled(self, error):
+        """Counts and logs a match refused by the admission control."""
+        self.metrics.inc("openregex_admission_rejections_total", {"reason": error.reason})
+        log.info(f"Match of client {self._client()} refused ({error.reason}), retry after {error.retry_after:.1f}s")
+
+    def _request_text(self):
+        """Returns the input text of a JSON request and the text to send to the match workers.
+
+        A request either carries the text in `text_input` or the handle of an uploaded text in `text_handle`, the
+        workers then receive only the handle.
+
+        :raises KeyError: If the text handle is unknown.
+        """
+        handle = request.json.get("text_handle")
+        if handle:
+            return self.text_store.read(handle), TextHandle(handle)
+        input_text = request.json.get("text_input", "")
+        return input_text, input_text
+
+    def _request_match_text(self):
+        """Returns the text of a JSON request to send to the match workers, like `_request_text` but an uploaded text
+        is not read, its handle is only checked.
+
+        :raises KeyError: If the text handle is unknown.
+        """
+        handle = request.json.get("text_handle")
+        if handle:
+            self.text_store.touch(handle)
+            return TextHandle(handle)
+        return request.json.get("text_input", "")
+
+    async def get_engine_info(self):
         """Returns information about the selected regex engine."""
         selected_engine = request.json.get("engine", None)
         engine = self.engine_manager.get_engine(selected_engine)
@@ -146,7 +710,7 @@ class RegexMatcherApp:
             }
         )
 
-    def get_example_regex(self):
+    async def get_example_regex(self):
         """Returns the example regex and text."""
         selected_engine = request.json.get("engine", None)
         engine = self.engine_manager.get_engine(selected_engine)
@@ -155,6 +719,21 @@ class RegexMatcherApp:
         else:
             return jsonify({"error": "Invalid engine selected."})
 
+    def cache_stats(self):
+        """Returns the hit rate, evictions and compile time of the compiled pattern caches."""
+        return jsonify(self.engine_manager.get_cache_stats())
+
+    def metrics_endpoint(self):
+        """Returns the metrics of all application processes in the Prometheus text format."""
+        return Response(self.metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    def _record_request_size(self):
+        """Records the size of request bodies per endpoint, chunked uploads without a length are not counted."""
+        if request.content_length is not None and request.endpoint:
+            self.metrics.observe(
+                "openregex_request_size_bytes", request.content_length, {"endpoint": request.endpoint}, SIZE_BUCKETS
+            )
+
     @staticmethod
     def decode_link():
         """Decodes the encoded link data and returns it as JSON."""
@@ -0,0 +1,106 @@
+"""
+This module provides the benchmark scenarios: realistic patterns together with generated texts of several sizes.
+
+Texts are generated from a seeded random generator, so every run matches exactly the same input. Patterns use only
+syntax understood by all engines (no named groups, no inline flags), the timings of the engines stay comparable.
+"""
+
+import random
+from dataclasses import dataclass
+
+SEED = 2025
+
+# Number of text units (log lines, words, ...) of each size, multiplied by the scale of the run
+SIZES = {"small": 20, "medium": 2_000, "large": 50_000}
+
+_OCTET = r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+_METHODS = ["GET", "POST", "PUT", "DELETE", "HEAD"]
+_PATHS = ["/", "/index.html", "/api/v1/users", "/api/v1/orders/42", "/static/app.js", "/login?next=%2Fhome"]
+_STATUSES = [200, 201, 204, 301, 304, 400, 401, 403, 404, 500, 503]
+_WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod"]
+_DOMAINS = ["example.com", "mail.example.org", "openregex.com", "uni.edu.pl"]
+_UNICODE_WORDS = ["zażółć", "gęślą", "jaźń", "Straße", "naïve", "καλημέρα", "привет", "日本語", "한국어", "🙂", "😀👍"]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """A pattern matched against a generated text of one size."""
+
+    name: str
+    pattern: str
+    text: str
+    flags: int = 0
+
+    @property
+    def text_length(self) -> int:
+        return len(self.text)
+
+
+def _ip(rng: random.Random) -> str:
+    return ".".join(str(rng.randint(0, 255)) for _ in range(4))
+
+
+def _access_log(rng: random.Random, lines: int) -> str:
+    return "\n".join(
+        f"{_ip(rng)} - - [18/Oct/2025:{rng.randint(0, 23):02}:{rng.randint(0, 59):02}:{rng.randint(0, 59):02} +0000] "
+        f'"{rng.choice(_METHODS)} {rng.choice(_PATHS)} HTTP/1.1" {rng.choice(_STATUSES)} {rng.randint(0, 99_999)}'
+        for _ in range(lines)
+    )
+
+
+def _prose_with_emails(rng: random.Random, words: int) -> str:
+    parts = []
+    for _ in range(words):
+        if rng.random() < 0.05:
+            parts.append(f"{rng.choice(_WORDS)}.{rng.choice(_WORDS)}{rng.randint(1, 99)}@{rng.choice(_DOMAINS)}")
+        else:
+            parts.append(rng.choice(_WORDS))
+    return " ".join(parts)
+
+
+def _csv_rows(rng: random.Random, rows: int) -> str:
+    return "\n".join(",".join(str(rng.randint(0, 9_999)) for _ in range(20)) for _ in range(rows))
+
+
+def _unicode_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_UNICODE_WORDS + _WORDS) for _ in range(words))
+
+
+def _backtracking_text(length: int) -> str:
+    # Every run of "a" fails at the trailing "!", the nested quantifier retries all ways to split the run
+    return "\n".join("a" * length + "!" for _ in range(4))
+
+
+def build_scenarios(scale: float = 1.0, sizes: list[str] | None = None) -> list[Scenario]:
+    """Builds the benchmark scenarios.
+
+    :param scale: Factor applied to the number of text units of every size.
+    :type scale: float
+    :param sizes: Names of the text sizes from `SIZES` to build, all of them by default.
+    :type sizes: list[str] | None
+    :return: The scenarios named `<workload>/<size>`.
+    :rtype: list[Scenario]
+    """
+    rng = random.Random(SEED)
+    scenarios = []
+    for size in sizes or SIZES:
+        units = max(1, int(SIZES[size] * scale))
+        access_log = _access_log(rng, units)
+        scenarios += [
+            Scenario(f"ipv4/{size}", rf"\b{_OCTET}\.{_OCTET}\.{_OCTET}\.{_OCTET}\b", access_log),
+            Scenario(
+                f"access_log/{size}",
+                r'(\d+\.\d+\.\d+\.\d+) - - \[([^\]]+)\] "([A-Z]+) (\S+) [^"]*" (\d{3}) (\d+)',
+                access_log,
+            ),
+            Scenario(
+                f"email/{size}",
+                r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}",
+                _prose_with_emails(rng, units * 10),
+            ),
+            Scenario(f"many_groups/{size}", ",".join([r"(\d+)"] * 20), _csv_rows(rng, units)),
+            Scenario(f"unicode_words/{size}", r"\w+", _unicode_text(rng, units * 10)),
+        ]
+    # Exponential in the length of a run, it is sized by the run length and not by the text size
+    scenarios.append(Scenario("backtracking/nested_quantifier", r"(a+)+$", _backtracking_text(int(16 + 2 * scale))))
+    return scenarios
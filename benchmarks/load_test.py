@@ -0,0 +1,401 @@
+"""
+This module generates HTTP load against the application and reports throughput, latency, errors and memory.
+
+The application is started under gunicorn with the given workers and threads, served in process through the Flask
+test client, or an already running server is used. A weighted mix of `/`, `/get_engine_info`, `/get_example_regex` and
+`/get_decode_link` requests is sent by a fixed number of concurrent clients, each sending its next request as soon as
+the previous one is answered.
+
+    python -m benchmarks.load_test --workers 4 --threads 4 --concurrency 16 --duration 30
+    python -m benchmarks.load_test --target flask --mix index=100 --bust-cache
+    python -m benchmarks.load_test --url http://localhost:5000 --output benchmarks/results/load.json
+
+Every concurrent client has an address of its own, sent in `X-Forwarded-For`, so the admission control of the
+application limits each of them separately. The gunicorn server started here trusts one proxy for it, a server given
+with `--url` has to run with `OPENREGEX_PROXY_COUNT=1` to do the same. Refused requests (`429`) are reported as
+throttled.
+
+Peak RSS is the peak of the summed resident memory of the server process and all of its descendants (gunicorn workers,
+match workers, engine daemons), sampled from /proc. It is not reported on systems without /proc or for `--url`.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from benchmarks.corpus import build_scenarios
+from benchmarks.run import environment_metadata, percentile
+from project import Path, log
+from src.utils.link import encode_dict
+
+ENDPOINTS = {
+    "index": "/",
+    "engine_info": "/get_engine_info",
+    "example": "/get_example_regex",
+    "decode_link": "/get_decode_link",
+}
+DEFAULT_MIX = "index=70,engine_info=10,example=10,decode_link=10"
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """Parses a traffic mix like `index=70,engine_info=30` into endpoint weights.
+
+    :raises ValueError: If an endpoint is unknown, a weight is negative or all weights are 0.
+    """
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}', choose from {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+        if weights[name] < 0:
+            raise ValueError(f"Negative weight for '{name}'")
+    if not sum(weights.values()):
+        raise ValueError("The traffic mix has no weight")
+    return weights
+
+
+class RequestFactory:
+    """
+    Builds the payloads of the traffic mix from the small benchmark scenarios.
+
+    With `bust_cache` every `/` request gets a unique text, so it is matched by an engine instead of being answered by
+    the result cache.
+    """
+
+    def __init__(self, mix: dict[str, float], engines: list[str], bust_cache: bool = False):
+        self.endpoints = list(mix)
+        self.weights = list(mix.values())
+        self.engines = engines
+        self.bust_cache = bust_cache
+        self.scenarios = [
+            scenario for scenario in build_scenarios(sizes=["small"]) if "backtracking" not in scenario.name
+        ]
+        self.links = [
+            encode_dict({"r": scenario.pattern, "t": scenario.text, "e": engine})
+            for scenario in self.scenarios
+            for engine in engines
+        ]
+        self._counter = itertools.count()
+
+    def build(self, rng: random.Random) -> tuple[str, dict]:
+        """Returns the endpoint name and the JSON payload of the next request."""
+        endpoint = rng.choices(self.endpoints, self.weights)[0]
+        engine = rng.choice(self.engines)
+        if endpoint == "index":
+            scenario = rng.choice(self.scenarios)
+            text = scenario.text
+            if self.bust_cache:
+                text = f"{text}\n{next(self._counter)}"
+            return endpoint, {"regex_input": scenario.pattern, "text_input": text, "engine": engine}
+        if endpoint == "decode_link":
+            return endpoint, {"encoded_data": rng.choice(self.links)}
+        return endpoint, {"engine": engine}
+
+
+def _client_addresses():
+    """Yields a distinct private address for every client thread."""
+    for index in itertools.count(1):
+        yield f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+
+
+class HttpClient:
+    """Sends the requests to a running server, with one connection pool and client address per client thread."""
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+        self._addresses = _client_addresses()
+        self._addresses_lock = threading.Lock()
+
+    def post(self, path: str, payload: dict) -> tuple[int, dict | None]:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            with self._addresses_lock:
+                session.headers["X-Forwarded-For"] = next(self._addresses)
+        response = session.post(self.base_url + path, json=payload, timeout=self.timeout)
+        return response.status_code, _json_or_none(response.headers.get("Content-Type", ""), response.json)
+
+
+class FlaskClient:
+    """Sends the requests through the Flask test client of the application in this process, without HTTP."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+        self._addresses = _client_addresses()
+        self._addresses_lock = threading.Lock()
+
+    def post(self, path: str, payload: dict) -> tuple[int, dict | None]:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+            with self._addresses_lock:
+                client.environ_base["REMOTE_ADDR"] = next(self._addresses)
+        response = client.post(path, json=payload)
+        return response.status_code, _json_or_none(response.content_type or "", response.get_json)
+
+
+def _json_or_none(content_type: str, get_json):
+    return get_json() if content_type.startswith("application/json") else None
+
+
+def process_tree_rss(pid: int) -> int | None:
+    """Returns the summed resident memory in bytes of a process and all of its descendants, None without /proc."""
+    if not os.path.isdir("/proc"):
+        return None
+    children = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r", encoding="utf-8") as file:
+                # The command name in parentheses may contain spaces, the parent pid is the second field after it
+                parent = int(file.read().rpartition(")")[2].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children[parent].append(int(entry))
+
+    total, pending = 0, [pid]
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm", "r", encoding="utf-8") as file:
+                total += int(file.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            continue  # Exited while sampling
+        pending += children[current]
+    return total
+
+
+class RssSampler(threading.Thread):
+    """Samples the memory of a process tree in the background and keeps the peak."""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            rss = process_tree_rss(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> int | None:
+        """Stops sampling and returns the peak in bytes."""
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+
+class GunicornServer:
+    """Runs `app:app` under gunicorn on a free local port for the duration of a `with` block."""
+
+    def __init__(self, workers: int, threads: int, startup_timeout: float = 120):
+        self.workers = workers
+        self.threads = threads
+        self.startup_timeout = startup_timeout
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = None
+
+    def __enter__(self):
+        args = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{self.port}"]
+        args += ["--workers", str(self.workers), "--threads", str(self.threads), "app:app"]
+        log.info(f"Starting {' '.join(args)}")
+        # A session of its own lets a stuck shutdown be cleaned up with the whole process group
+        # The load clients send their addresses in X-Forwarded-For, as if the server was behind one proxy
+        env = {**os.environ, "OPENREGEX_PROXY_COUNT": "1"}
+        self.process = subprocess.Popen(args, cwd=Path.PROJECT, env=env, start_new_session=os.name == "posix")
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with code {self.process.returncode}")
+            try:
+                requests.get(f"{self.url}/robots.txt", timeout=1)
+                return self
+            except requests.RequestException:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"gunicorn did not answer within {self.startup_timeout} seconds")
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            if os.name == "posix":
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+            self.process.wait()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _classify(status: int, body: dict | None) -> str:
+    """Returns the outcome of a response: `ok`, `throttled` for requests refused by the admission control, `error` for
+    other HTTP errors or `timeout` for engine timeouts."""
+    if status == 429:
+        return "throttled"
+    if status >= 400:
+        return "error"
+    error = (body or {}).get("error") or ""
+    if "timeout" in error.lower() or "timed out" in error.lower():
+        return "timeout"
+    return "ok"
+
+
+def generate_load(client, factory: RequestFactory, concurrency: int, duration: float, seed: int = 0) -> list[tuple]:
+    """Sends requests from `concurrency` threads for `duration` seconds.
+
+    :return: One `(endpoint, latency in seconds, outcome)` tuple per request, the outcome is `ok`, `throttled`,
+             `error` or `timeout`. Client side timeouts and connection failures count as `timeout` and `error`.
+    :rtype: list[tuple]
+    """
+    records = []
+    records_lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        local_records = []
+        while time.monotonic() < deadline:
+            endpoint, payload = factory.build(rng)
+            start_time = time.perf_counter()
+            try:
+                status, body = client.post(ENDPOINTS[endpoint], payload)
+                outcome = _classify(status, body)
+            except requests.Timeout:
+                outcome = "timeout"
+            except (requests.RequestException, ValueError):
+                outcome = "error"
+            local_records.append((endpoint, time.perf_counter() - start_time, outcome))
+        with records_lock:
+            records.extend(local_records)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+
+def summarize_load(records: list[tuple], elapsed: float) -> dict:
+    """Summarizes the requests overall and per endpoint: count, throughput, latency percentiles and outcome rates."""
+
+    def summary(selected):
+        latencies = [latency for _, latency, _ in selected]
+        count = len(selected)
+        return {
+            "requests": count,
+            "throughput": count / elapsed if elapsed else 0.0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "error_rate": sum(outcome == "error" for *_, outcome in selected) / count if count else 0.0,
+            "timeout_rate": sum(outcome == "timeout" for *_, outcome in selected) / count if count else 0.0,
+            "throttled_rate": sum(outcome == "throttled" for *_, outcome in selected) / count if count else 0.0,
+        }
+
+    by_endpoint = defaultdict(list)
+    for record in records:
+        by_endpoint[record[0]].append(record)
+    return {"all": summary(records), **{endpoint: summary(selected) for endpoint, selected in by_endpoint.items()}}
+
+
+def format_load_report(summary: dict, peak_rss: int | None) -> str:
+    """Formats the load summary as a table, latencies in milliseconds."""
+    lines = [
+        f"{'endpoint':<12} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'errors':>7} {'timeouts':>8} {'throttled':>9}"
+    ]
+    for endpoint, entry in summary.items():
+        lines.append(
+            f"{endpoint:<12} {entry['requests']:>9} {entry['throughput']:>9.1f} {entry['p50'] * 1000:>9.2f} "
+            f"{entry['p95'] * 1000:>9.2f} {entry['p99'] * 1000:>9.2f} {entry['error_rate']:>7.1%} "
+            f"{entry['timeout_rate']:>8.1%} {entry['throttled_rate']:>9.1%}"
+        )
+    lines.append(f"Peak RSS: {peak_rss / 1024 / 1024:.1f} MB" if peak_rss is not None else "Peak RSS: n/a")
+    return "\n".join(lines)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate HTTP load against OpenRegex.")
+    parser.add_argument("--target", choices=["gunicorn", "flask"], default="gunicorn", help="How to serve the app.")
+    parser.add_argument("--url", help="Base URL of a running server, overrides --target.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("GUNICORN_WORKERS", "4")))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("GUNICORN_THREADS", "4")))
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent clients.")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of measured load.")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of load before measuring.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted endpoints, default {DEFAULT_MIX}.")
+    parser.add_argument("--engines", nargs="+", default=["Python - re"], help="Engines used by the requests.")
+    parser.add_argument("--bust-cache", action="store_true", help="Send unique texts to bypass the result cache.")
+    parser.add_argument("--timeout", type=float, default=30, help="Client timeout of one request in seconds.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Path of the JSON results.")
+    return parser.parse_args(argv)
+
+
+def _run_load(args: argparse.Namespace, client, server_pid: int | None) -> tuple[dict, int | None]:
+    factory = RequestFactory(parse_mix(args.mix), args.engines, args.bust_cache)
+    if args.warmup:
+        generate_load(client, factory, args.concurrency, args.warmup, args.seed)
+    sampler = RssSampler(server_pid) if server_pid else None
+    if sampler:
+        sampler.start()
+    start_time = time.perf_counter()
+    records = generate_load(client, factory, args.concurrency, args.duration, args.seed)
+    elapsed = time.perf_counter() - start_time
+    peak_rss = sampler.stop() if sampler else None
+    return summarize_load(records, elapsed), peak_rss
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.url:
+        summary, peak_rss = _run_load(args, HttpClient(args.url, args.timeout), None)
+    elif args.target == "flask":
+        from app import app
+
+        summary, peak_rss = _run_load(args, FlaskClient(app), os.getpid())
+    else:
+        with GunicornServer(args.workers, args.threads) as server:
+            summary, peak_rss = _run_load(args, HttpClient(server.url, args.timeout), server.process.pid)
+
+    print(format_load_report(summary, peak_rss))
+    if args.output:
+        metadata = environment_metadata([], vars(args))
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"metadata": metadata, "summary": summary, "peak_rss": peak_rss}, file, indent=2)
+    return 1 if summary["all"]["requests"] == 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+This module runs the engine benchmarks and compares the results with a stored baseline.
+
+Every scenario of `benchmarks.corpus` is matched by every available engine in two phases:
+
+* cold - the compiled pattern caches are cleared and the engine daemons are stopped before every sample, like the first
+  match of a freshly started match worker,
+* warm - the pattern is compiled and the daemon is running, like a repeated match of the same pattern.
+
+Run it from the project root:
+
+    python -m benchmarks.run --output benchmarks/results/latest.json
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.25
+
+The process exits with 1 if a scenario is slower than the baseline by more than the tolerance.
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.corpus import SIZES, build_scenarios
+from project import App, Path, log
+from src.engine import CppRegex, JavaRegex, JavaScriptRegex, PythonRe, PythonRegex
+from src.engine.cache import clear_caches
+
+BASELINE_PATH = os.path.join(Path.PROJECT, "benchmarks", "baseline.json")
+ENGINE_CLASSES = [PythonRe, PythonRegex, CppRegex, JavaRegex, JavaScriptRegex]
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    """Returns the percentile of the samples with linear interpolation between the closest ranks."""
+    ordered = sorted(samples)
+    if not ordered:
+        return math.nan
+    rank = (len(ordered) - 1) * percent / 100
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(samples: list[float]) -> dict:
+    """Returns the p50, p95, mean, min and max of the samples in seconds."""
+    return {
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "mean": statistics.fmean(samples) if samples else math.nan,
+        "min": min(samples, default=math.nan),
+        "max": max(samples, default=math.nan),
+    }
+
+
+def load_engines(names: list[str] | None = None) -> list:
+    """Creates the selected engines, engines whose runtime is not installed are skipped with a warning."""
+    engines = []
+    for engine_class in ENGINE_CLASSES:
+        try:
+            engine = engine_class()
+        except Exception as e:
+            log.warning(f"Skipping {engine_class.__name__}: {e}")
+            continue
+        if names is None or engine.name in names:
+            engines.append(engine)
+    return engines
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=Path.PROJECT, capture_output=True, text=True, check=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip()
+
+
+def environment_metadata(engines: list, settings: dict) -> dict:
+    """Describes the machine, the interpreter, the engine versions and the settings of the run."""
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "openregex_version": App.version,
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "engines": {engine.name: engine.version for engine in engines},
+        "settings": settings,
+    }
+
+
+def time_match(engine, scenario) -> tuple[float, int, str]:
+    """Matches a scenario once and returns the elapsed seconds, the number of matches and the error."""
+    start_time = time.perf_counter()
+    matches, error = engine.match(scenario.pattern, scenario.text, scenario.flags)
+    return time.perf_counter() - start_time, len(matches), error
+
+
+def run_scenario(engine, scenario, repeat: int, cold_repeat: int) -> list[dict]:
+    """Times one scenario on one engine in both phases.
+
+    :return: One result per phase with the raw samples, their summary, the number of matches and the error.
+    :rtype: list[dict]
+    """
+    results = []
+    for phase, count in (("cold", cold_repeat), ("warm", repeat)):
+        samples = []
+        match_count, error = 0, ""
+        if phase == "warm":
+            time_match(engine, scenario)
+        for _ in range(count):
+            if phase == "cold":
+                clear_caches()
+                engine.close()
+            elapsed, match_count, error = time_match(engine, scenario)
+            if error:
+                # A failing scenario, e.g. a timeout, is reported once and not repeated
+                break
+            samples.append(elapsed)
+        results.append(
+            {
+                "engine": engine.name,
+                "scenario": scenario.name,
+                "phase": phase,
+                "text_length": scenario.text_length,
+                "matches": match_count,
+                "error": error,
+                "samples": samples,
+                **summarize(samples),
+            }
+        )
+    return results
+
+
+def run(engines: list, scenarios: list, repeat: int, cold_repeat: int) -> list[dict]:
+    """Times every scenario on every engine."""
+    results = []
+    for engine in engines:
+        for scenario in scenarios:
+            log.info(f"{engine.name}: {scenario.name}")
+            results += run_scenario(engine, scenario, repeat, cold_repeat)
+        engine.close()
+    return results
+
+
+def _result_key(result: dict) -> tuple:
+    return result["engine"], result["scenario"], result["phase"]
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[dict]:
+    """Compares the p50 of every result with the same engine, scenario and phase of the baseline.
+
+    :param results: Results of this run.
+    :type results: list[dict]
+    :param baseline: Results of the baseline run.
+    :type baseline: list[dict]
+    :param tolerance: Allowed relative slowdown, e.g. 0.2 for 20 %.
+    :type tolerance: float
+    :return: One entry per compared result with the baseline and current p50, their `ratio` and `regression`, which
+             is True if the result is slower than the baseline by more than the tolerance.
+    :rtype: list[dict]
+    """
+    baseline_by_key = {_result_key(result): result for result in baseline}
+    comparison = []
+    for result in results:
+        reference = baseline_by_key.get(_result_key(result))
+        if reference is None or result["error"] or reference["error"]:
+            continue
+        if not reference["samples"] or not result["samples"]:
+            continue
+        ratio = result["p50"] / reference["p50"] if reference["p50"] > 0 else math.inf
+        comparison.append(
+            {
+                "engine": result["engine"],
+                "scenario": result["scenario"],
+                "phase": result["phase"],
+                "baseline_p50": reference["p50"],
+                "p50": result["p50"],
+                "ratio": ratio,
+                "regression": ratio > 1 + tolerance,
+            }
+        )
+    return comparison
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:10.3f}"
+
+
+def format_report(results: list[dict]) -> str:
+    """Formats the p50 and p95 of every engine, scenario and phase as a table in milliseconds."""
+    lines = [f"{'engine':<16} {'scenario':<32} {'phase':<5} {'p50 ms':>10} {'p95 ms':>10} {'matches':>8}"]
+    for result in results:
+        if result["error"]:
+            summary = f"error: {result['error']}"
+        else:
+            summary = f"{_ms(result['p50'])} {_ms(result['p95'])} {result['matches']:>8}"
+        lines.append(f"{result['engine']:<16} {result['scenario']:<32} {result['phase']:<5} {summary}")
+    return "\n".join(lines)
+
+
+def format_comparison(comparison: list[dict], tolerance: float) -> str:
+    """Formats the comparison with the baseline, the regressions are marked."""
+    lines = [f"Compared with the baseline, tolerance {tolerance:.0%}:"]
+    for entry in comparison:
+        marker = "REGRESSION" if entry["regression"] else ""
+        lines.append(
+            f"{entry['engine']:<16} {entry['scenario']:<32} {entry['phase']:<5} "
+            f"{_ms(entry['baseline_p50'])} -> {_ms(entry['p50'])} ms {entry['ratio']:6.2f}x {marker}"
+        )
+    return "\n".join(lines)
+
+
+def _write_json(path: str, data: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the OpenRegex engines.")
+    parser.add_argument("--engines", nargs="+", help="Names of the engines to run, all available by default.")
+    parser.add_argument("--scenarios", nargs="+", help="Prefixes of the scenario names to run, e.g. ipv4 email/large.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES), help="Text sizes to run.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Factor applied to the text sizes.")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of warm samples per scenario.")
+    parser.add_argument("--cold-repeat", type=int, default=5, help="Number of cold samples per scenario.")
+    parser.add_argument("--output", help="Path of the JSON results.")
+    parser.add_argument("--baseline", help=f"Baseline to compare with, {BASELINE_PATH} if it exists.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown against the baseline.")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    engines = load_engines(args.engines)
+    scenarios = [
+        scenario
+        for scenario in build_scenarios(args.scale, args.sizes)
+        if not args.scenarios or scenario.name.startswith(tuple(args.scenarios))
+    ]
+    results = run(engines, scenarios, args.repeat, args.cold_repeat)
+    data = {"metadata": environment_metadata(engines, vars(args)), "results": results}
+    print(format_report(results))
+
+    if args.output:
+        _write_json(args.output, data)
+    if args.save_baseline:
+        _write_json(args.baseline or BASELINE_PATH, data)
+        log.info(f"Baseline saved to {args.baseline or BASELINE_PATH}")
+        return 0
+
+    baseline_path = args.baseline or BASELINE_PATH
+    if not os.path.exists(baseline_path):
+        return 0
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    comparison = compare(results, baseline["results"], args.tolerance)
+    print(format_comparison(comparison, args.tolerance))
+    return 1 if any(entry["regression"] for entry in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
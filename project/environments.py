@@ -41,6 +41,7 @@ class _Path:
     ENGINE_CPP = os.path.join(PROJECT, "src", "engine", "cpp")
     ENGINE_JAVA = os.path.join(PROJECT, "src", "engine", "java")
     ENGINE_JAVASCRIPT = os.path.join(PROJECT, "src", "engine", "javascript")
+    CACHE = os.getenv("OPENREGEX_CACHE_DIR", os.path.join(PROJECT, ".cache"))
 
 
 @dataclass
@@ -48,6 +49,26 @@ class _Config:
     port = int(os.getenv("OPENREGEX_PORT", "5000"))
     log_level = os.getenv("OPENREGEX_LOG_LEVEL", "INFO").upper()
     regex_timeout = int(os.getenv("OPENREGEX_TIMEOUT_S", "5"))
+    redos_policy = os.getenv("OPENREGEX_REDOS_POLICY", "budget").lower()
+    redos_timeout = float(os.getenv("OPENREGEX_REDOS_TIMEOUT_S", "1"))
+    profile_max_steps = int(os.getenv("OPENREGEX_PROFILE_MAX_STEPS", "100000"))
+    client_cpu_rate = float(os.getenv("OPENREGEX_CLIENT_CPU_RATE", "0.5"))
+    client_cpu_burst = float(os.getenv("OPENREGEX_CLIENT_CPU_BURST", "10"))
+    client_max_inflight = int(os.getenv("OPENREGEX_CLIENT_MAX_INFLIGHT", "2"))
+    max_inflight = int(os.getenv("OPENREGEX_MAX_INFLIGHT", "16"))
+    proxy_count = int(os.getenv("OPENREGEX_PROXY_COUNT", "0"))
+    single_flight = os.getenv("OPENREGEX_SINGLE_FLIGHT", "host").lower()
+    live_sessions = os.getenv("OPENREGEX_LIVE_SESSIONS", "0").lower() in ("1", "true", "yes")
+    pool_size = int(os.getenv("OPENREGEX_POOL_SIZE", "4"))
+    pool_max_tasks = int(os.getenv("OPENREGEX_POOL_MAX_TASKS", "500"))
+    pool_start_method = os.getenv("OPENREGEX_POOL_START_METHOD", "")
+    pattern_cache_size = int(os.getenv("OPENREGEX_PATTERN_CACHE_SIZE", "256"))
+    max_matches = int(os.getenv("OPENREGEX_MAX_MATCHES", "1000"))
+    max_batch_jobs = int(os.getenv("OPENREGEX_MAX_BATCH_JOBS", "1000"))
+    result_cache_mb = int(os.getenv("OPENREGEX_RESULT_CACHE_MB", "64"))
+    text_store_mb = int(os.getenv("OPENREGEX_TEXT_STORE_MB", "512"))
+    max_upload_mb = int(os.getenv("OPENREGEX_MAX_UPLOAD_MB", "64"))
+    cpp_max_stack_mb = int(os.getenv("OPENREGEX_CPP_MAX_STACK_MB", "1024"))
     debug = log_level == "DEBUG"
 
 
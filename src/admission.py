@@ -0,0 +1,247 @@
+"""
+This module provides admission control for match requests, shared by all application processes of a host.
+
+Every client has a token bucket of engine seconds in a SQLite database in `OPENREGEX_CACHE_DIR`. The bucket holds at
+most `burst` seconds and refills at `rate` seconds per second. A match is admitted while the bucket is not empty and
+its engine time is taken from the bucket when it ends, so a client whose patterns keep the engines busy until the
+timeout runs into debt and has to wait, while a client with fast matches never notices the bucket. In-flight matches
+are stored with the process running them and the number of match workers they occupy at a time, their slots, which
+caps the matches of one client and of the whole host.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from project import Config, Path, log
+
+ADMISSION_PATH = os.path.join(Path.CACHE, "admission.sqlite3")
+
+# Reasons for refusing a match
+REASON_CLIENT_CPU = "client_cpu"
+REASON_CLIENT_INFLIGHT = "client_inflight"
+REASON_BUSY = "busy"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    client TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_updated ON buckets (updated);
+CREATE TABLE IF NOT EXISTS inflight (
+    id INTEGER PRIMARY KEY,
+    client TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    slots INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS inflight_client ON inflight (client);
+"""
+
+
+class Throttled(Exception):
+    """A match was refused, it may be retried after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: float, message: str):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Value of the `Retry-After` header, whole seconds and at least 1."""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def engine_seconds(timing: dict) -> float:
+    """Returns the engine time of a match from its `timing`, see `MatchWorkerPool.match`.
+
+    This is the CPU time of the match worker, or the time the worker was busy where that is longer: the Java and
+    JavaScript engines match in a daemon process and killed workers report no CPU time. Waiting for a free worker is
+    not counted.
+    """
+    busy = timing.get("total", 0.0) - (timing.get("queue") or 0.0) - (timing.get("ipc") or 0.0)
+    return max(timing.get("cpu") or 0.0, busy, 0.0)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AdmissionController:
+    """
+    Per-client token buckets of engine seconds and in-flight match caps in a SQLite database.
+
+    A `rate` of 0 disables the buckets, a cap of 0 disables the cap. Database errors are logged and the match is
+    admitted, admission control never fails a request by itself.
+    """
+
+    def __init__(
+        self,
+        path: str = ADMISSION_PATH,
+        rate: float = Config.client_cpu_rate,
+        burst: float = Config.client_cpu_burst,
+        max_inflight: int = Config.max_inflight,
+        client_max_inflight: int = Config.client_max_inflight,
+    ):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self.max_inflight = max_inflight
+        self.client_max_inflight = client_max_inflight
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any limit is set."""
+        return bool(self.rate or self.max_inflight or self.client_max_inflight)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _tokens(self, connection: sqlite3.Connection, client: str, now: float) -> float:
+        """Returns the tokens of the client refilled up to now, a client without a bucket has a full one."""
+        row = connection.execute("SELECT tokens, updated FROM buckets WHERE client = ?", (client,)).fetchone()
+        if row is None:
+            return self.burst
+        tokens, updated = row
+        return min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+
+    @staticmethod
+    def _inflight(connection: sqlite3.Connection, client: str | None = None) -> int:
+        """Returns the slots in flight of the client, of all clients for None."""
+        if client is None:
+            return connection.execute("SELECT COALESCE(SUM(slots), 0) FROM inflight").fetchone()[0]
+        query = "SELECT COALESCE(SUM(slots), 0) FROM inflight WHERE client = ?"
+        return connection.execute(query, (client,)).fetchone()[0]
+
+    @staticmethod
+    def _prune(connection: sqlite3.Connection):
+        """Deletes the in-flight matches of processes which are no longer running, e.g. killed gunicorn workers."""
+        pids = [pid for (pid,) in connection.execute("SELECT DISTINCT pid FROM inflight")]
+        dead = [(pid,) for pid in pids if pid != os.getpid() and not _process_alive(pid)]
+        if dead:
+            connection.executemany("DELETE FROM inflight WHERE pid = ?", dead)
+
+    def _check(self, connection: sqlite3.Connection, client: str, now: float, slots: int):
+        """Raises `Throttled` if the slots would take the client or the host over a limit.
+
+        A request with more slots than a cap is admitted while nothing else is in flight under that cap.
+        """
+        if self.rate:
+            tokens = self._tokens(connection, client, now)
+            if tokens <= 0:
+                raise Throttled(
+                    REASON_CLIENT_CPU,
+                    -tokens / self.rate,
+                    "Too many slow matches, wait before matching again.",
+                )
+        pruned = False
+        for cap, owner, reason, message in (
+            (self.client_max_inflight, client, REASON_CLIENT_INFLIGHT, "Too many matches running at the same time."),
+            (self.max_inflight, None, REASON_BUSY, "The server is busy, try again shortly."),
+        ):
+            if not cap or not self._over(self._inflight(connection, owner), slots, cap):
+                continue
+            if not pruned:
+                self._prune(connection)
+                pruned = True
+            if self._over(self._inflight(connection, owner), slots, cap):
+                raise Throttled(reason, 1.0, message)
+
+    @staticmethod
+    def _over(inflight: int, slots: int, cap: int) -> bool:
+        return inflight > 0 and inflight + slots > cap
+
+    def acquire(self, client: str, slots: int = 1) -> int | None:
+        """Admits a match of the client, the returned ticket must be passed to `release` when the match ends.
+
+        :param client: Identity of the client, e.g. its address.
+        :type client: str
+        :param slots: Number of match workers the request occupies at a time, e.g. the parallelism of a batch.
+        :type slots: int
+        :return: The ticket of the match, None if it is not tracked.
+        :rtype: int | None
+        :raises Throttled: If the bucket of the client is empty or an in-flight cap is reached.
+        """
+        if not self.enabled:
+            return None
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._check(connection, client, time.time(), slots)
+                ticket = connection.execute(
+                    "INSERT INTO inflight (client, pid, slots) VALUES (?, ?, ?)", (client, os.getpid(), slots)
+                ).lastrowid
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return ticket
+        except sqlite3.Error as e:
+            log.warning(f"Admission check failed, admitting the match: {e}")
+            return None
+
+    def release(self, ticket: int | None, client: str, seconds: float):
+        """Ends a match and takes its engine time from the bucket of the client.
+
+        :param ticket: Ticket returned by `acquire`.
+        :type ticket: int | None
+        :param client: Identity of the client.
+        :type client: str
+        :param seconds: Engine time of the match, see `engine_seconds`.
+        :type seconds: float
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            if ticket is not None:
+                connection.execute("DELETE FROM inflight WHERE id = ?", (ticket,))
+            if self.rate:
+                tokens = self._tokens(connection, client, now) - seconds
+                connection.execute(
+                    "INSERT OR REPLACE INTO buckets (client, tokens, updated) VALUES (?, ?, ?)", (client, tokens, now)
+                )
+                # Buckets which refilled completely are the same as no bucket
+                connection.execute(
+                    "DELETE FROM buckets WHERE updated < ? AND tokens + (? - updated) * ? >= ?",
+                    (now - self.burst / self.rate, now, self.rate, self.burst),
+                )
+            connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            log.warning(f"Admission release failed: {e}")
+            try:
+                self._connection().execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        """Drops all buckets and in-flight matches."""
+        try:
+            connection = self._connection()
+            connection.execute("DELETE FROM buckets")
+            connection.execute("DELETE FROM inflight")
+        except sqlite3.Error as e:
+            log.warning(f"Admission clear failed: {e}")
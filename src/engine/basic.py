@@ -2,6 +2,7 @@ import traceback
 from abc import ABC, abstractmethod
 
 from project import Config, log
+from src.engine.manifest import manifest
 
 # pattern for sheet template
 _REGEX_CHEAT_SHEET_TEMPLATE = [
@@ -21,6 +22,9 @@ _REGEX_EXAMPLES_TEMPLATE = {
     "input_text": r"",
 }
 
+# Seconds an engine stopping its own matches gives up before the match timeout, its worker is then not killed
+ENGINE_TIMEOUT_MARGIN = 0.25
+
 
 class BasicRegexEngine(ABC):
     """Abstract base class for regex engines.
@@ -32,6 +36,9 @@ class BasicRegexEngine(ABC):
 
     regex_cheat_sheet = _REGEX_CHEAT_SHEET_TEMPLATE
     regex_examples = _REGEX_EXAMPLES_TEMPLATE
+    capabilities: dict = {}
+    # Unit of the match indices: "code_point" (Python str indices) or "utf16" (UTF-16 code units, e.g. Java, JS)
+    offset_unit: str = "code_point"
 
     def __init__(self):
         """Initializes the BasicRegexEngine.
@@ -50,7 +57,9 @@ class BasicRegexEngine(ABC):
         """
         return self.__class__.__name__
 
-    def match(self, pattern: str, text: str, flags: int = 0) -> tuple[list[dict], str]:
+    def match(
+        self, pattern: str, text: str, flags: int = 0, limit: int = 0, offset: int = 0, timeout: float | None = None
+    ) -> tuple[list[dict], str]:
         """Matches a pattern against a text using the engine's implementation.
 
         :param pattern: The regular expression pattern.
@@ -59,6 +68,12 @@ class BasicRegexEngine(ABC):
         :type text: str
         :param flags: Flags to control the matching behavior. Defaults to 0.
         :type flags: int, optional
+        :param limit: Maximum number of matches to return, 0 returns all of them. Defaults to 0.
+        :type limit: int, optional
+        :param offset: Number of leading matches to skip. Defaults to 0.
+        :type offset: int, optional
+        :param timeout: Seconds the caller waits for the match, None for `OPENREGEX_REGEX_TIMEOUT_S`. Defaults to None.
+        :type timeout: float | None, optional
         :raises Exception: If an error occurs during matching.
         :return: A tuple containing a list of match dictionaries and an error string.
                 The list of dictionaries represents the matches found. Each dictionary has the following structure:
@@ -108,7 +123,7 @@ class BasicRegexEngine(ABC):
         error: str = ""
         try:
             log.debug(f"{self.__class__.__name__} -> Matching pattern: {pattern} in text: {text}")
-            result: list[dict] = self._match(pattern, text, flags)
+            result: list[dict] = self._match(pattern, text, flags, limit, offset, timeout)
             log.debug(f"{self.__class__.__name__} -> Matched result: {result}")
         except Exception as e:
             result: list[dict] = []
@@ -118,6 +133,44 @@ class BasicRegexEngine(ABC):
                 log.error(detailed_error)
         return result, error
 
+    def close(self):
+        """Releases the resources of the engine held by this process, e.g. a daemon. The engine starts them again on
+        the next match."""
+
+    def match_chunks(self, pattern: str, text: str, flags: int = 0, chunk_size: int = 1000):
+        """Matches a pattern against a text and yields the matches in chunks while they are found.
+
+        :param pattern: The regular expression pattern.
+        :type pattern: str
+        :param text: The text to search.
+        :type text: str
+        :param flags: Flags to control the matching behavior. Defaults to 0.
+        :type flags: int, optional
+        :param chunk_size: Maximum number of matches per chunk. Defaults to 1000.
+        :type chunk_size: int, optional
+        :return: A generator of tuples containing a list of match dictionaries and an error string, like `match`.
+                 Matches found before an error are yielded first, the error ends the generator with a last
+                 `([], error)` tuple.
+        :rtype: Iterator[tuple[list[dict], str]]
+        """
+        chunk: list[dict] = []
+        try:
+            for match in self._iter_matches(pattern, text, flags):
+                chunk.append(match)
+                if len(chunk) >= chunk_size:
+                    yield chunk, ""
+                    chunk = []
+        except Exception as e:
+            if chunk:
+                yield chunk, ""
+            error = self._handle_exception(e)
+            if Config.log_level == "DEBUG":
+                log.error(f"{self.__class__.__name__} -> Matched result: {error}\n{traceback.format_exc()}")
+            yield [], error
+            return
+        if chunk:
+            yield chunk, ""
+
     @abstractmethod
     def _get_version(self) -> str:
         """Gets the version of the regex engine.
@@ -127,11 +180,42 @@ class BasicRegexEngine(ABC):
         """
         raise NotImplementedError("This method should be implemented in the child class.")
 
+    def _load_capabilities(self, binary: str) -> dict:
+        """Loads the capabilities of an external engine from the capability manifest.
+
+        The runtime is probed with `_probe_capabilities` only if the manifest has no entry for the current binary.
+
+        :param binary: Runtime binary of the engine, looked up in PATH.
+        :type binary: str
+        :return: Dictionary with the `version`, `flags` and `features` of the engine.
+        :rtype: dict
+        """
+        self.capabilities = manifest.get(self.name, binary, self._probe_capabilities)
+        return self.capabilities
+
+    def _probe_capabilities(self) -> dict:
+        """Probes the runtime of an external engine for its capabilities.
+
+        :return: Dictionary with the `version`, `flags` and `features` of the engine.
+        :rtype: dict
+        """
+        raise NotImplementedError("This method should be implemented in engines using the capability manifest.")
+
+    @staticmethod
+    def _engine_timeout(timeout: float | None) -> float:
+        """Seconds an engine which can stop its own matches lets one run, a margin below the `timeout` of the caller."""
+        timeout = Config.regex_timeout if timeout is None else timeout
+        return max(timeout / 2, timeout - ENGINE_TIMEOUT_MARGIN)
+
     @abstractmethod
-    def _match(self, pattern: str, text: str, flags: int) -> list[dict]:
+    def _match(
+        self, pattern: str, text: str, flags: int, limit: int = 0, offset: int = 0, timeout: float | None = None
+    ) -> list[dict]:
         """Performs the actual regex matching.
 
-        This method must be implemented by each subclass to provide the specific matching logic.
+        This method must be implemented by each subclass to provide the specific matching logic. Skipped matches
+        and matches beyond the limit should not be built at all, the engine stops searching after the limit. Engines
+        which can stop a match themselves stop it within `_engine_timeout(timeout)`.
 
         :param pattern: The regular expression pattern.
         :type pattern: str
@@ -139,11 +223,32 @@ class BasicRegexEngine(ABC):
         :type text: str
         :param flags: Flags to control the matching behavior.
         :type flags: int
+        :param limit: Maximum number of matches to return, 0 returns all of them.
+        :type limit: int
+        :param offset: Number of leading matches to skip.
+        :type offset: int
+        :param timeout: Seconds the caller waits for the match, None for `OPENREGEX_REGEX_TIMEOUT_S`.
+        :type timeout: float | None
         :return: A list of match dictionaries. See `match` method for the structure of the dictionaries.
         :rtype: list[dict]
         """
         raise NotImplementedError("This method should be implemented in the child class.")
 
+    def _iter_matches(self, pattern: str, text: str, flags: int):
+        """Yields the matches one by one. Engines which find matches incrementally override this, the default
+        yields the result of `_match`.
+
+        :param pattern: The regular expression pattern.
+        :type pattern: str
+        :param text: The text to search.
+        :type text: str
+        :param flags: Flags to control the matching behavior.
+        :type flags: int
+        :return: A generator of match dictionaries. See `match` method for the structure of the dictionaries.
+        :rtype: Iterator[dict]
+        """
+        yield from self._match(pattern, text, flags)
+
     @abstractmethod
     def get_available_flags(self) -> dict:
         """Gets the available flags for the regex engine.
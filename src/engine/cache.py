@@ -0,0 +1,134 @@
+"""
+This module provides a size-bounded LRU cache for compiled regex patterns.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from project import Config
+
+# Named caches of this process, their statistics are reported by the match workers
+_caches = {}
+
+
+@dataclass(frozen=True)
+class CompiledPattern:
+    """A compiled pattern together with the metadata derived from it once per pattern."""
+
+    regex: object
+    group_names: dict[int, str]
+    group_count: int
+
+    @classmethod
+    def from_regex(cls, regex):
+        """Builds the entry for a compiled `re` or `regex` pattern, inverting its `groupindex`."""
+        return cls(
+            regex=regex,
+            group_names={index: name for name, index in regex.groupindex.items()},
+            group_count=regex.groups,
+        )
+
+
+class PatternCache:
+    """
+    Size-bounded, least recently used cache of compiled patterns.
+
+    Patterns are compiled on a miss by the callable given to `get`. When the cache is full the least recently used
+    entry is dropped and passed to `on_evict`, which releases resources owned outside of Python (e.g. native handles).
+    A cache created with a `name` is registered for `cache_stats`.
+    """
+
+    def __init__(self, max_size: int, on_evict=None, name: str | None = None):
+        self.max_size = max(1, max_size)
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compile_time = 0.0
+        if name:
+            _caches[name] = self
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, compile_func):
+        """Gets the compiled pattern for the key, compiling it on a miss.
+
+        :param key: Hashable key of the pattern, e.g. `(pattern, flags)`.
+        :param compile_func: Callable without arguments returning the compiled pattern. Exceptions are propagated
+                             and nothing is cached.
+        :return: The compiled pattern.
+        """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        start_time = time.perf_counter()
+        compiled = compile_func()
+        compile_time = time.perf_counter() - start_time
+        evicted = []
+        with self._lock:
+            self.compile_time += compile_time
+            if key in self._entries:
+                # Compiled concurrently by another thread, keep the cached one
+                evicted.append(compiled)
+                compiled = self._entries[key]
+                self._entries.move_to_end(key)
+            else:
+                self._entries[key] = compiled
+                while len(self._entries) > self.max_size:
+                    evicted.append(self._entries.popitem(last=False)[1])
+                    self.evictions += 1
+
+        if self.on_evict:
+            for entry in evicted:
+                self.on_evict(entry)
+        return compiled
+
+    def stats(self) -> dict:
+        """Returns the size, hits, misses, evictions and total compile time in seconds of the cache."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "compile_time": self.compile_time,
+            }
+
+    def clear(self):
+        """Drops all entries of the cache."""
+        with self._lock:
+            evicted = list(self._entries.values())
+            self._entries.clear()
+        if self.on_evict:
+            for entry in evicted:
+                self.on_evict(entry)
+
+
+def cache_stats() -> dict:
+    """Returns the statistics of all named pattern caches of this process, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def compile_time_total() -> float:
+    """Returns the seconds spent compiling patterns in all named pattern caches of this process."""
+    return sum(cache.compile_time for cache in list(_caches.values()))
+
+
+def clear_caches():
+    """Drops the entries of all named pattern caches of this process."""
+    for cache in list(_caches.values()):
+        cache.clear()
+
+
+# Compiled `re` and `regex` patterns keyed by (engine, pattern, flags), shared by the Python engines
+python_pattern_cache = PatternCache(Config.pattern_cache_size, name="Python")
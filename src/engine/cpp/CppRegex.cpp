@@ -2,21 +2,39 @@
 #include <regex>
 #include <vector>
 #include <string>
+#include <sstream>
 #include <cstring>
+#include <cstdint>
+#include <algorithm>
+#include <chrono>
+#include <iterator>
+#include <new>
+
+#ifdef _WIN32
+#include <windows.h>
+#include <process.h>
+#else
+#include <pthread.h>
+#endif
 
 using namespace std;
 
-struct Match {
-    char *match;
-    size_t start;
-    size_t group_count;
-    char **groups;
-    size_t *group_positions;
-};
+// Marks both offsets of a group which did not participate in the match
+const size_t NO_MATCH = SIZE_MAX;
+
+// std::regex matches recursively, roughly one stack frame per character of a match, so long matches need far more
+// stack than the 1-8 MB of a default thread. The match thread gets a stack sized to the input, between the minimum
+// and the caller's maximum. The stack is only reserved, pages are committed when the recursion actually reaches them.
+const size_t STACK_BYTES_PER_CHAR = 1024;
+const size_t MIN_STACK_SIZE = 8 * 1024 * 1024;
+const size_t DEFAULT_MAX_STACK_SIZE = 1024 * 1024 * 1024;
 
+// Matches are returned as byte offsets into the text only, no strings are copied.
+// offsets holds match_count * (group_count + 1) pairs of (start, end): the whole match first, then every group.
 struct MatchResult {
-    Match *matches;
+    size_t *offsets;
     size_t match_count;
+    size_t group_count;
     char *error_message;
 };
 
@@ -27,88 +45,257 @@ char *copy_to_char_array(const std::string &str) {
     return cstr;
 }
 
-void free_match(Match &match) {
-    delete[] match.match;
-    for (size_t i = 0; i < match.group_count; ++i) {
-        delete[] match.groups[i];
-    }
-    delete[] match.groups;
-    delete[] match.group_positions;
-}
+// Compiled pattern handed to Python as an opaque handle
+struct CompiledPattern {
+    std::regex regex;
+};
 
-// Function to find matches
-MatchResult* find_matches_internal(const char *text_cstr, const char *pattern_cstr)
-{
-    std::string text = text_cstr;
-    std::string pattern = pattern_cstr;
+MatchResult *new_match_result() {
     MatchResult *result = new MatchResult();
-    result->matches = nullptr;
+    result->offsets = nullptr;
     result->match_count = 0;
+    result->group_count = 0;
     result->error_message = nullptr;
-    try {
-       std::regex regex_pattern(pattern);
-        std::vector<Match> matches;
-        std::sregex_iterator it(text.begin(), text.end(), regex_pattern);
-        std::sregex_iterator end;
-       while(it != end){
-         std::smatch sm = *it;
-             Match match;
-            match.match = copy_to_char_array(sm.str());
-            match.start = sm.position();
-             match.group_count = sm.size() - 1;
-
-            if (match.group_count > 0) {
-              match.groups = new char*[match.group_count];
-              match.group_positions = new size_t[match.group_count];
-
-               for (size_t i = 1; i < sm.size(); ++i) {
-                 match.groups[i-1] = copy_to_char_array(sm[i].str());
-                 match.group_positions[i-1] = sm.position(i);
-              }
-            }else{
-             match.groups = nullptr;
-             match.group_positions = nullptr;
-           }
-            matches.push_back(match);
-            ++it;
+    return result;
+}
+
+// Text position steps between two looks at the clock, small enough to notice the deadline within milliseconds
+const unsigned DEADLINE_CHECK_STEPS = 4096;
+
+struct DeadlineExceeded {};
+
+struct Deadline {
+    std::chrono::steady_clock::time_point at;
+    unsigned countdown;
+
+    void step() {
+        if (--countdown == 0) {
+            countdown = DEADLINE_CHECK_STEPS;
+            if (std::chrono::steady_clock::now() > at) {
+                throw DeadlineExceeded();
+            }
         }
-     if (!matches.empty()){
-      result->match_count = matches.size();
-      result->matches = new Match[matches.size()];
-      for (size_t i = 0; i < matches.size(); ++i){
-        result->matches[i] = matches[i];
-      }
+    }
+};
 
+// Iterator over the text which counts every step forward against the deadline. std::regex advances it while it scans
+// for a start position and while it matches, so a search which finds nothing and a single long match attempt are both
+// stopped, not only the time between two matches.
+struct DeadlineIterator {
+    using iterator_category = std::bidirectional_iterator_tag;
+    using value_type = char;
+    using difference_type = std::ptrdiff_t;
+    using pointer = const char *;
+    using reference = const char &;
+
+    const char *position;
+    Deadline *deadline;
+
+    reference operator*() const { return *position; }
+    DeadlineIterator &operator++() {
+        ++position;
+        deadline->step();
+        return *this;
+    }
+    DeadlineIterator operator++(int) {
+        DeadlineIterator previous = *this;
+        ++*this;
+        return previous;
+    }
+    DeadlineIterator &operator--() {
+        --position;
+        return *this;
     }
+    DeadlineIterator operator--(int) {
+        DeadlineIterator previous = *this;
+        --position;
+        return previous;
+    }
+    bool operator==(const DeadlineIterator &other) const { return position == other.position; }
+    bool operator!=(const DeadlineIterator &other) const { return position != other.position; }
+};
+
+// Function to find matches of a compiled pattern, the text is matched in place.
+// The first `offset` matches are skipped and the search stops after `limit` matches, a limit of 0 means no limit.
+// The deadline is checked while searching and matching, a timeout_seconds <= 0 disables it.
+MatchResult* match_compiled_internal(const CompiledPattern *compiled, const char *text, size_t text_length,
+                                     double timeout_seconds, size_t offset, size_t limit)
+{
+    MatchResult *result = new_match_result();
+    Deadline deadline = {std::chrono::steady_clock::time_point::max(), DEADLINE_CHECK_STEPS};
+    if (timeout_seconds > 0) {
+        deadline.at = std::chrono::steady_clock::now() + std::chrono::duration_cast<std::chrono::steady_clock::duration>(
+                                                              std::chrono::duration<double>(timeout_seconds));
+    }
+    try {
+        std::vector<size_t> offsets;
+        size_t group_count = compiled->regex.mark_count();
+        std::regex_iterator<DeadlineIterator> it({text, &deadline}, {text + text_length, &deadline}, compiled->regex);
+        std::regex_iterator<DeadlineIterator> end;
+        size_t skipped = 0;
+        while (it != end && (limit == 0 || result->match_count < limit)) {
+            if (skipped < offset) {
+                ++skipped;
+                ++it;
+                continue;
+            }
+            // Offsets are taken from the positions, std::distance would step through the text again
+            const std::match_results<DeadlineIterator> &cm = *it;
+            for (size_t i = 0; i <= group_count; ++i) {
+                if (cm[i].matched) {
+                    offsets.push_back(cm[i].first.position - text);
+                    offsets.push_back(cm[i].second.position - text);
+                } else {
+                    offsets.push_back(NO_MATCH);
+                    offsets.push_back(NO_MATCH);
+                }
+            }
+            ++result->match_count;
+            ++it;
+        }
+        result->group_count = group_count;
+        if (!offsets.empty()) {
+            result->offsets = new size_t[offsets.size()];
+            std::copy(offsets.begin(), offsets.end(), result->offsets);
+        }
+    } catch(const DeadlineExceeded &) {
+        std::ostringstream message;
+        message << "Timeout exceeded: " << timeout_seconds << " seconds";
+        result->error_message = copy_to_char_array(message.str());
     } catch(const std::regex_error & e) {
-     result->error_message = copy_to_char_array(e.what());
-
-    }  catch(const std::exception & e) {
-     result->error_message = copy_to_char_array(e.what());
-  }
-  catch(...){
-       result->error_message = copy_to_char_array("Unknown error");
-  }
+        if (e.code() == std::regex_constants::error_complexity || e.code() == std::regex_constants::error_stack) {
+            result->error_message = copy_to_char_array(std::string("Regex too complex for the input: ") + e.what());
+        } else {
+            result->error_message = copy_to_char_array(e.what());
+        }
+    } catch(const std::bad_alloc &) {
+        result->error_message = copy_to_char_array("Out of memory while matching");
+    } catch(const std::exception & e) {
+        result->error_message = copy_to_char_array(e.what());
+    } catch(...) {
+        result->error_message = copy_to_char_array("Unknown error");
+    }
+    if (result->error_message) {
+        result->match_count = 0;
+    }
     return result;
+}
+
+struct MatchJob {
+    const CompiledPattern *compiled;
+    const char *text;
+    size_t text_length;
+    double timeout_seconds;
+    size_t offset;
+    size_t limit;
+    MatchResult *result;
+};
 
+#ifdef _WIN32
+unsigned __stdcall run_match_job(void *arg) {
+#else
+void *run_match_job(void *arg) {
+#endif
+    MatchJob *job = static_cast<MatchJob *>(arg);
+    job->result = match_compiled_internal(job->compiled, job->text, job->text_length, job->timeout_seconds,
+                                          job->offset, job->limit);
+    return 0;
+}
+
+// Run the match on a dedicated thread with a stack sized to the text and wait for it
+MatchResult *match_on_thread(MatchJob &job, size_t max_stack_size) {
+    if (max_stack_size == 0) {
+        max_stack_size = DEFAULT_MAX_STACK_SIZE;
+    }
+    size_t stack_size = job.text_length < max_stack_size / STACK_BYTES_PER_CHAR
+                            ? job.text_length * STACK_BYTES_PER_CHAR
+                            : max_stack_size;
+    stack_size = std::max(stack_size, std::min(MIN_STACK_SIZE, max_stack_size));
+    job.result = nullptr;
+#ifdef _WIN32
+    HANDLE thread = (HANDLE)_beginthreadex(nullptr, (unsigned)stack_size, run_match_job, &job,
+                                           STACK_SIZE_PARAM_IS_A_RESERVATION, nullptr);
+    bool started = thread != nullptr;
+    if (started) {
+        WaitForSingleObject(thread, INFINITE);
+        CloseHandle(thread);
+    }
+#else
+    pthread_attr_t attr;
+    pthread_attr_init(&attr);
+    pthread_attr_setstacksize(&attr, stack_size);
+    pthread_t thread;
+    bool started = pthread_create(&thread, &attr, run_match_job, &job) == 0;
+    if (started) {
+        pthread_join(thread, nullptr);
+    }
+    pthread_attr_destroy(&attr);
+#endif
+    if (!started) {
+        MatchResult *result = new_match_result();
+        result->error_message = copy_to_char_array(
+            "Could not reserve " + std::to_string(stack_size / (1024 * 1024)) + " MB of stack for the match");
+        return result;
+    }
+    return job.result;
 }
 
 // Function to free memory
 extern "C" void free_match_result(MatchResult *result) {
     if (result) {
-         if (result->matches){
-            for (size_t i = 0; i < result->match_count; ++i) {
-             free_match(result->matches[i]);
-           }
-          delete [] result->matches;
-        }
-        if (result->error_message) {
-            delete[] result->error_message;
-        }
+        delete[] result->offsets;
+        delete[] result->error_message;
         delete result;
     }
 }
 
+// Compile a pattern into an opaque handle. On failure nullptr is returned and error_message is set,
+// the message must be released with free_error_message.
+extern "C" CompiledPattern *compile_pattern(const char *pattern_cstr, char **error_message) {
+    *error_message = nullptr;
+    try {
+        CompiledPattern *compiled = new CompiledPattern();
+        try {
+            compiled->regex = std::regex(pattern_cstr);
+        } catch(...) {
+            delete compiled;
+            throw;
+        }
+        return compiled;
+    } catch(const std::exception & e) {
+        *error_message = copy_to_char_array(e.what());
+    } catch(...) {
+        *error_message = copy_to_char_array("Unknown error");
+    }
+    return nullptr;
+}
+
+// Match on a dedicated thread with at most max_stack_size bytes of stack (0 for the default) and give up once
+// timeout_seconds have passed (0 for no limit). Returns at most `limit` matches (0 for all) after skipping `offset`.
+extern "C" MatchResult *match_compiled(const CompiledPattern *compiled, const char *text, size_t text_length,
+                                       double timeout_seconds, size_t max_stack_size, size_t offset, size_t limit) {
+    MatchJob job = {compiled, text, text_length, timeout_seconds, offset, limit, nullptr};
+    return match_on_thread(job, max_stack_size);
+}
+
+extern "C" void free_pattern(CompiledPattern *compiled) {
+    delete compiled;
+}
+
+extern "C" void free_error_message(char *error_message) {
+    delete[] error_message;
+}
+
 extern "C" MatchResult *find_matches(const char *text_cstr, const char *pattern_cstr) {
-    return find_matches_internal(text_cstr, pattern_cstr);
-}
\ No newline at end of file
+    char *error_message = nullptr;
+    CompiledPattern *compiled = compile_pattern(pattern_cstr, &error_message);
+    if (!compiled) {
+        MatchResult *result = new_match_result();
+        result->error_message = error_message;
+        return result;
+    }
+    MatchJob job = {compiled, text_cstr, strlen(text_cstr), 0, 0, 0, nullptr};
+    MatchResult *result = match_on_thread(job, 0);
+    free_pattern(compiled);
+    return result;
+}
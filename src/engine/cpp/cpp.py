@@ -3,13 +3,16 @@ Module for C++ regex engine integration using ctypes.
 """
 
 import ctypes
+import itertools
 import os
 import re
 import subprocess
-from ctypes import POINTER, Structure, c_char_p, c_size_t
+import threading
+from ctypes import POINTER, Structure, c_char_p, c_double, c_size_t, c_void_p
 
-from project import Path, log
+from project import Config, Path, log
 from src.engine.basic import BasicRegexEngine
+from src.engine.cache import PatternCache
 
 _REGEX_CHEAT_SHEET_TEMPLATE_CPP = [
     {
@@ -85,32 +88,61 @@ _REGEX_EXAMPLES_PYTHON_CPP = {
 }
 
 
-class Match(Structure):
-    """
-    Structure to hold a single regex match.
-    """
-
-    _fields_ = [
-        ("match", c_char_p),
-        ("start", c_size_t),
-        ("group_count", c_size_t),
-        ("groups", POINTER(c_char_p)),
-        ("group_positions", POINTER(c_size_t)),
-    ]
+# Offset of a group which did not participate in the match
+NO_MATCH = c_size_t(-1).value
 
 
 class MatchResult(Structure):
     """
     Structure to hold the result of regex matches.
+
+    `offsets` is a flat array of `match_count * (group_count + 1)` pairs of (start, end) byte offsets, the whole match
+    first and then every group. Groups which did not participate in a match have both offsets set to `NO_MATCH`.
     """
 
     _fields_ = [
-        ("matches", POINTER(Match)),
+        ("offsets", POINTER(c_size_t)),
         ("match_count", c_size_t),
+        ("group_count", c_size_t),
         ("error_message", c_char_p),
     ]
 
 
+# The shared library and the compiled pattern handles belong to the process, they are never pickled with the engine
+_libraries = {}
+_pattern_caches = {}
+_library_lock = threading.Lock()
+# Serializes use of the pattern handles, so a handle is never freed by an eviction while another thread matches with it
+_match_lock = threading.Lock()
+
+
+def _load_library(lib_path):
+    """Loads the shared library and binds its prototypes once per process."""
+    with _library_lock:
+        lib = _libraries.get(lib_path)
+        if lib is not None:
+            return lib
+        try:
+            lib = ctypes.CDLL(lib_path, winmode=0)
+        except OSError as e:
+            log.critical(f"Failed to load library {lib_path}: {str(e)}")
+            raise RuntimeError(f"Failed to load library {lib_path}: {str(e)}") from e
+
+        lib.compile_pattern.argtypes = [c_char_p, POINTER(c_void_p)]
+        lib.compile_pattern.restype = c_void_p
+        lib.match_compiled.argtypes = [c_void_p, c_char_p, c_size_t, c_double, c_size_t, c_size_t, c_size_t]
+        lib.match_compiled.restype = POINTER(MatchResult)
+        lib.free_pattern.argtypes = [c_void_p]
+        lib.free_pattern.restype = None
+        lib.free_error_message.argtypes = [c_void_p]
+        lib.free_error_message.restype = None
+        lib.free_match_result.argtypes = [POINTER(MatchResult)]
+        lib.free_match_result.restype = None
+        _libraries[lib_path] = lib
+        _pattern_caches[lib_path] = PatternCache(Config.pattern_cache_size, on_evict=lib.free_pattern, name="C++")
+        return lib
+
+
 class CppRegex(BasicRegexEngine):
     """
     C++ Regex engine class.
@@ -125,11 +157,15 @@ class CppRegex(BasicRegexEngine):
         self.lib_path = os.path.join(Path.ENGINE_CPP, lib_name)
         self._compile_dll_if_not_compiled()
         super().__init__()
+        # Matching runs on a native thread with a stack sized to the text, std::regex recurses for every character
+        self.max_stack_size = Config.cpp_max_stack_mb * 1024 * 1024
+        # Give up inside the library before the worker pool kills the whole worker
+        self.match_timeout = max(0.1, Config.regex_timeout - 0.25)
         self.regex_cheat_sheet = _REGEX_CHEAT_SHEET_TEMPLATE_CPP
         self.regex_examples = _REGEX_EXAMPLES_PYTHON_CPP
 
     def _compile_dll_if_not_compiled(self):
-        if not os.path.exists(self.lib_path):
+        if not os.path.exists(self.lib_path) or os.path.getmtime(self.cpp_path) > os.path.getmtime(self.lib_path):
             if os.name == "nt":
                 compiler = "g++"
                 compile_cmd = [
@@ -151,6 +187,7 @@ class CppRegex(BasicRegexEngine):
                     self.lib_path,
                     self.cpp_path,
                     "-fPIC",
+                    "-pthread",
                 ]
             try:
                 log.info(f"Compiling {self.cpp_path} for {os.name}...")
@@ -166,65 +203,86 @@ class CppRegex(BasicRegexEngine):
 
     def _get_version(self) -> str:
         try:
-            result = subprocess.run(["g++", "--version"], capture_output=True, text=True, check=True)
-            output = result.stdout
-            version_match = re.search(r"g\+\+.*?(\d+\.\d+\.\d+)", output)
-            if version_match:
-                version = version_match.group(1)
-                return f"g++ - {version}"
-            return "g++ version not found"
-        except subprocess.CalledProcessError as e:
+            return self._load_capabilities("g++")["version"]
+        except (OSError, subprocess.CalledProcessError) as e:
             return f"Error retrieving G++ version: {str(e)}"
 
-    def _load_library(self):
-        try:
-            return ctypes.CDLL(self.lib_path, winmode=0)
-        except OSError as e:
-            log.critical(f"Failed to load library {self.lib_path}: {str(e)}")
-            raise RuntimeError(f"Failed to load library {self.lib_path}: {str(e)}") from e
+    def _probe_capabilities(self) -> dict:
+        result = subprocess.run(["g++", "--version"], capture_output=True, text=True, check=True)
+        output = result.stdout
+        version_match = re.search(r"g\+\+.*?(\d+\.\d+\.\d+)", output)
+        version = f"g++ - {version_match.group(1)}" if version_match else "g++ version not found"
+        return {"version": version, "flags": {}, "features": {}}
 
-    def _match(self, pattern, text, flags):
-        lib = self._load_library()
-        lib.find_matches.argtypes = [c_char_p, c_char_p]
-        lib.find_matches.restype = POINTER(MatchResult)
-        lib.free_match_result.argtypes = [POINTER(MatchResult)]
+    @staticmethod
+    def _compile_pattern(lib, pattern):
+        error_message = c_void_p()
+        handle = lib.compile_pattern(pattern.encode(), ctypes.byref(error_message))
+        if not handle:
+            error = ctypes.string_at(error_message).decode()
+            lib.free_error_message(error_message)
+            raise RuntimeError(error)
+        return handle
 
-        result = lib.find_matches(text.encode(), pattern.encode())
-        if not result:
-            raise RuntimeError("Regex timeout")
+    def _match(self, pattern, text, flags, limit=0, offset=0, timeout=None):
+        lib = _load_library(self.lib_path)
+        pattern_cache = _pattern_caches[self.lib_path]
+        encoded_text = text.encode()
+        # A shorter timeout of the match, e.g. the ReDoS budget, stops the library instead of killing the worker
+        match_timeout = min(self.match_timeout, self._engine_timeout(timeout))
 
-        if result.contents.error_message:
-            error = result.contents.error_message.decode()
+        with _match_lock:
+            handle = pattern_cache.get(pattern, lambda: self._compile_pattern(lib, pattern))
+            result = lib.match_compiled(
+                handle, encoded_text, len(encoded_text), match_timeout, self.max_stack_size, offset, limit
+            )
+            if not result:
+                # Timeouts come back as an error message, no result at all means the library failed
+                raise RuntimeError("The C++ engine returned no result")
+
+            if result.contents.error_message:
+                error = result.contents.error_message.decode()
+                lib.free_match_result(result)
+                if error.startswith("Timeout exceeded"):
+                    raise TimeoutError(error)
+                raise RuntimeError(error)
+
+            match_count = result.contents.match_count
+            group_count = result.contents.group_count
+            offsets = result.contents.offsets[: match_count * (group_count + 1) * 2] if match_count else []
             lib.free_match_result(result)
-            raise RuntimeError(error)
 
-        matches = []
-        for i in range(result.contents.match_count):
-            match = result.contents.matches[i]
-            full_match = match.match.decode()
-            start = match.start
-            groups = [(match.groups[j].decode(), match.group_positions[j]) for j in range(match.group_count)]
-            matches.append((full_match, start, groups))
+        char_offsets = None if text.isascii() else self._char_offset_table(encoded_text)
+        return self._process_matches(text, offsets, group_count, char_offsets)
 
-        lib.free_match_result(result)
-        final_matches = self._process_matches(matches)
-        return final_matches
+    @staticmethod
+    def _char_offset_table(encoded_text: bytes) -> list[int]:
+        """Maps UTF-8 byte offsets to character offsets: table[byte_offset] is the index of the character there.
+
+        Every byte which is not a continuation byte (0b10xxxxxx) starts a new character, so the character index is the
+        running count of those bytes.
+        """
+        return list(itertools.accumulate((byte & 0xC0 != 0x80 for byte in encoded_text), initial=0))
 
     @staticmethod
-    def _process_matches(matches: list) -> list:
+    def _process_matches(text: str, offsets: list[int], group_count: int, char_offsets: list[int] | None) -> list:
         output_matches = []
-        for match in matches:
-            full_match = match[0]
-            index_start = match[1]
-            index_end = match[1] + len(match[0])
+        if char_offsets is not None:
+            offsets = [offset if offset == NO_MATCH else char_offsets[offset] for offset in offsets]
+
+        stride = (group_count + 1) * 2
+        for match_offset in range(0, len(offsets), stride):
+            index_start, index_end = offsets[match_offset], offsets[match_offset + 1]
             groups = []
-            for group in match[2]:
-                group_start = group[1]
-                group_end = group[1] + len(group[0])
-                groups.append({"name": "", "value": group[0], "index": [group_start, group_end]})
+            for group_offset in range(match_offset + 2, match_offset + stride, 2):
+                group_start, group_end = offsets[group_offset], offsets[group_offset + 1]
+                if group_start == NO_MATCH:
+                    groups.append({"name": "", "value": "", "index": []})
+                else:
+                    groups.append({"name": "", "value": text[group_start:group_end], "index": [group_start, group_end]})
             output_matches.append(
                 {
-                    "match": full_match,
+                    "match": text[index_start:index_end],
                     "index": [index_start, index_end],
                     "groups": groups,
                 }
@@ -0,0 +1,129 @@
+"""
+This module provides clients for long-lived helper processes of the external regex engines.
+"""
+
+import json
+import os
+import struct
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+
+from project import log
+
+
+class EngineDaemon(ABC):
+    """Long-lived engine process that receives JSON requests on stdin and answers on stdout.
+
+    The process is started lazily and restarted when it dies. It is bound to the process which started it, so a
+    forked match worker starts its own daemon instead of sharing the pipes of its parent.
+    """
+
+    def __init__(self, name: str, args: list[str]):
+        self.name = name
+        self.args = args
+        self._process = None
+        self._owner_pid = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_process"] = None
+        state["_owner_pid"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _is_running(self) -> bool:
+        return self._process is not None and self._owner_pid == os.getpid() and self._process.poll() is None
+
+    def _start(self):
+        log.debug(f"Starting {self.name} daemon: {' '.join(self.args)}")
+        self._process = subprocess.Popen(self.args, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._owner_pid = os.getpid()
+
+    def request(self, payload: dict) -> dict:
+        """Sends one request to the daemon and waits for its response.
+
+        :param payload: JSON serializable request.
+        :type payload: dict
+        :raises RuntimeError: If the daemon could not be reached or exited without answering.
+        :return: The decoded response.
+        :rtype: dict
+        """
+        with self._lock:
+            if not self._is_running():
+                self._start()
+            try:
+                self._write_message(self._process.stdin, json.dumps(payload).encode("utf-8"))
+                self._process.stdin.flush()
+                response = self._read_message(self._process.stdout)
+            except OSError as e:
+                self._stop()
+                raise RuntimeError(f"{self.name} daemon failed: {e}") from e
+            if response is None:
+                self._stop()
+                raise RuntimeError(f"{self.name} daemon exited without a response")
+        return json.loads(response)
+
+    def _stop(self):
+        if self._process is None or self._owner_pid != os.getpid():
+            self._process = None
+            return
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+
+    def close(self):
+        """Stops the daemon if it is running in this process."""
+        with self._lock:
+            self._stop()
+
+    @abstractmethod
+    def _write_message(self, stream, data: bytes):
+        """Writes one framed message to the daemon."""
+        raise NotImplementedError("This method should be implemented in the child class.")
+
+    @abstractmethod
+    def _read_message(self, stream) -> bytes | None:
+        """Reads one framed message from the daemon, returns None at end of stream."""
+        raise NotImplementedError("This method should be implemented in the child class.")
+
+
+class LengthPrefixedDaemon(EngineDaemon):
+    """Daemon with messages framed by a 4-byte big-endian length prefix."""
+
+    def _write_message(self, stream, data: bytes):
+        stream.write(struct.pack(">I", len(data)))
+        stream.write(data)
+
+    def _read_message(self, stream) -> bytes | None:
+        header = stream.read(4)
+        if len(header) < 4:
+            return None
+        (length,) = struct.unpack(">I", header)
+        data = stream.read(length)
+        if len(data) < length:
+            return None
+        return data
+
+
+class LineDelimitedDaemon(EngineDaemon):
+    """Daemon with one JSON document per line (NDJSON)."""
+
+    def _write_message(self, stream, data: bytes):
+        stream.write(data)
+        stream.write(b"\n")
+
+    def _read_message(self, stream) -> bytes | None:
+        line = stream.readline()
+        if not line:
+            return None
+        return line
@@ -1,21 +1,47 @@
 // JavaRegexCLI.java
 import com.google.gson.Gson;
+import com.google.gson.JsonObject;
+import com.google.gson.JsonParser;
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.IOException;
+import java.nio.charset.StandardCharsets;
 import java.util.regex.*;
 import java.util.ArrayList;
+import java.util.LinkedHashMap;
 import java.util.List;
 import java.util.HashMap;
 import java.lang.reflect.Field;
+import java.lang.reflect.Modifier;
 import java.util.Map;
 
 public class JavaRegexCLI {
+    private static final int PATTERN_CACHE_SIZE = 256;
+    // Check the deadline every N character reads, System.nanoTime() is too expensive to call on each one
+    private static final int DEADLINE_CHECK_INTERVAL = 4096;
+
+    // Compiled patterns keyed by flags and pattern, least recently used entry is evicted first
+    private static final Map<String, Pattern> patternCache = new LinkedHashMap<String, Pattern>(16, 0.75f, true) {
+        @Override
+        protected boolean removeEldestEntry(Map.Entry<String, Pattern> eldest) {
+            return size() > PATTERN_CACHE_SIZE;
+        }
+    };
+
     public static void main(String[] args) {
-        if (args.length == 4 && "getFlag".equals(args[0])) {
-            String flagName = args[1];
-            System.out.println(getFlagValue(flagName));
-             System.exit(0);
+        if (args.length == 1 && "--server".equals(args[0])) {
+            runServer();
+            System.exit(0);
+        }
+        if (args.length == 1 && "--capabilities".equals(args[0])) {
+            System.out.println(new Gson().toJson(getCapabilities()));
+            System.exit(0);
         }
         if (args.length != 3) {
-            System.err.println("Usage: JavaRegexCLI <pattern> <text> <flags>");
+            System.err.println("Usage: JavaRegexCLI <pattern> <text> <flags> | --server | --capabilities");
             System.exit(1);
         }
         String pattern = args[0];
@@ -29,36 +55,103 @@ public class JavaRegexCLI {
         result.put("matches", matches);
         System.out.println(gson.toJson(result));
     }
-    // Method to get a flag value by name
-    public static int getFlagValue(String flagName) {
-          try {
-                Field field = Pattern.class.getField(flagName);
-                 return field.getInt(null);
-          } catch (NoSuchFieldException | IllegalAccessException e){
-            System.err.println("Invalid flag name: " + flagName);
-           return 0;
-           }
+    // Server mode: read length-prefixed JSON requests from stdin and write length-prefixed JSON responses to stdout.
+    // Every message is a 4-byte big-endian length followed by the UTF-8 encoded JSON document.
+    private static void runServer() {
+        Gson gson = new Gson();
+        try (DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+             DataOutputStream out = new DataOutputStream(new BufferedOutputStream(System.out))) {
+            while (true) {
+                int length;
+                try {
+                    length = in.readInt();
+                } catch (EOFException e) {
+                    break; // Parent closed the pipe
+                }
+                byte[] payload = new byte[length];
+                in.readFully(payload);
 
+                Map<String, Object> response = handleRequest(new String(payload, StandardCharsets.UTF_8));
+                byte[] body = gson.toJson(response).getBytes(StandardCharsets.UTF_8);
+                out.writeInt(body.length);
+                out.write(body);
+                out.flush();
+            }
+        } catch (IOException e) {
+            System.err.println("JavaRegexCLI server stopped: " + e.getMessage());
+        }
     }
-    private static List<Map<String, Object>> performRegexMatch(String pattern, String text, int flags) {
-        List<Map<String, Object>> matches = new ArrayList<>();
+
+    private static Map<String, Object> handleRequest(String json) {
+        Map<String, Object> response = new HashMap<>();
         try {
-            Pattern regexPattern = Pattern.compile(pattern, flags);
-            Matcher matcher = regexPattern.matcher(text);
-             Map<Integer,String> groupNames=  getGroupNames(regexPattern);
-
-            while (matcher.find()) {
-                Map<String, Object> match = new HashMap<>();
-                match.put("match", matcher.group(0));
-                match.put("index", new int[]{matcher.start(), matcher.end()});
-
-                List<Map<String, Object>> groups = new ArrayList<>();
-                for (int i = 1; i <= matcher.groupCount(); i++) {
-                    groups.add(getGroupData(matcher, i, groupNames));
+            JsonObject request = JsonParser.parseString(json).getAsJsonObject();
+            String pattern = request.get("pattern").getAsString();
+            String text = request.get("text").getAsString();
+            int flags = request.get("flags").getAsInt();
+            long timeoutMs = request.get("timeout_ms").getAsLong();
+            int offset = request.has("offset") ? request.get("offset").getAsInt() : 0;
+            int limit = request.has("limit") ? request.get("limit").getAsInt() : 0;
+
+            Pattern regexPattern = getPattern(pattern, flags);
+            long deadline = System.nanoTime() + timeoutMs * 1_000_000L;
+            response.put("matches", findMatches(regexPattern, new DeadlineCharSequence(text, deadline), offset, limit));
+            response.put("error", "");
+        } catch (PatternSyntaxException e) {
+            response.put("matches", new ArrayList<>());
+            response.put("error", "Error during regex match: " + e.getMessage() + System.lineSeparator());
+        } catch (MatchTimeoutException e) {
+            response.put("matches", new ArrayList<>());
+            response.put("error", "");
+            response.put("timeout", true);
+        } catch (RuntimeException e) {
+            response.put("matches", new ArrayList<>());
+            response.put("error", "Error during request: " + e);
+        } catch (StackOverflowError e) {
+            response.put("matches", new ArrayList<>());
+            response.put("error", "Error during regex match: stack overflow");
+        }
+        return response;
+    }
+
+    private static Pattern getPattern(String pattern, int flags) {
+        String key = flags + ":" + pattern;
+        Pattern compiled = patternCache.get(key);
+        if (compiled == null) {
+            compiled = Pattern.compile(pattern, flags);
+            patternCache.put(key, compiled);
+        }
+        return compiled;
+    }
+
+    // Version, flag table and feature bits of this JVM, stored by the Python side in the engine capability manifest
+    private static Map<String, Object> getCapabilities() {
+        Map<String, Integer> flags = new LinkedHashMap<>();
+        for (Field field : Pattern.class.getFields()) {
+            if (field.getType() == int.class && Modifier.isStatic(field.getModifiers())) {
+                try {
+                    flags.put(field.getName(), field.getInt(null));
+                } catch (IllegalAccessException e) {
+                    System.err.println("Invalid flag name: " + field.getName());
                 }
-                match.put("groups", groups);
-                matches.add(match);
             }
+        }
+
+        Map<String, Object> features = new LinkedHashMap<>();
+        features.put("named_groups_api", Runtime.version().feature() >= 20);
+        features.put("server_mode", true);
+
+        Map<String, Object> capabilities = new LinkedHashMap<>();
+        capabilities.put("version", System.getProperty("java.version"));
+        capabilities.put("flags", flags);
+        capabilities.put("features", features);
+        return capabilities;
+    }
+
+    private static List<Map<String, Object>> performRegexMatch(String pattern, String text, int flags) {
+        List<Map<String, Object>> matches = new ArrayList<>();
+        try {
+            matches = findMatches(Pattern.compile(pattern, flags), text);
         } catch (PatternSyntaxException e) {
              System.err.println("Error during regex match: " + e.getMessage());
         }
@@ -66,6 +159,36 @@ public class JavaRegexCLI {
         return matches;
     }
 
+    private static List<Map<String, Object>> findMatches(Pattern regexPattern, CharSequence text) {
+        return findMatches(regexPattern, text, 0, 0);
+    }
+
+    // Skip the first `offset` matches without building them and stop after `limit` matches, 0 means no limit
+    private static List<Map<String, Object>> findMatches(Pattern regexPattern, CharSequence text, int offset, int limit) {
+        List<Map<String, Object>> matches = new ArrayList<>();
+        Matcher matcher = regexPattern.matcher(text);
+        Map<Integer,String> groupNames = getGroupNames(regexPattern);
+
+        int skipped = 0;
+        while ((limit <= 0 || matches.size() < limit) && matcher.find()) {
+            if (skipped < offset) {
+                skipped++;
+                continue;
+            }
+            Map<String, Object> match = new HashMap<>();
+            match.put("match", matcher.group(0));
+            match.put("index", new int[]{matcher.start(), matcher.end()});
+
+            List<Map<String, Object>> groups = new ArrayList<>();
+            for (int i = 1; i <= matcher.groupCount(); i++) {
+                groups.add(getGroupData(matcher, i, groupNames));
+            }
+            match.put("groups", groups);
+            matches.add(match);
+        }
+        return matches;
+    }
+
     private static Map<Integer, String> getGroupNames(Pattern pattern) {
        Map<Integer, String> groupNames = new HashMap<>();
            try {
@@ -126,4 +249,49 @@ public class JavaRegexCLI {
            }
         return group;
     }
-}
\ No newline at end of file
+
+    private static final class MatchTimeoutException extends RuntimeException {
+        MatchTimeoutException() {
+            super("Regex match exceeded its deadline", null, false, false);
+        }
+    }
+
+    // Text wrapper which aborts the running match once the deadline has passed. java.util.regex reads the input
+    // only through charAt, so even a catastrophically backtracking pattern keeps passing through this check.
+    private static final class DeadlineCharSequence implements CharSequence {
+        private final CharSequence text;
+        private final long deadline;
+        private int reads;
+
+        DeadlineCharSequence(CharSequence text, long deadline) {
+            this.text = text;
+            this.deadline = deadline;
+        }
+
+        @Override
+        public char charAt(int index) {
+            if (++reads >= DEADLINE_CHECK_INTERVAL) {
+                reads = 0;
+                if (System.nanoTime() > deadline) {
+                    throw new MatchTimeoutException();
+                }
+            }
+            return text.charAt(index);
+        }
+
+        @Override
+        public int length() {
+            return text.length();
+        }
+
+        @Override
+        public CharSequence subSequence(int start, int end) {
+            return new DeadlineCharSequence(text.subSequence(start, end), deadline);
+        }
+
+        @Override
+        public String toString() {
+            return text.toString();
+        }
+    }
+}
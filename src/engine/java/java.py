@@ -10,8 +10,9 @@ import subprocess
 
 import requests
 
-from project import Path, log
+from project import Config, Path, log
 from src.engine.basic import BasicRegexEngine
+from src.engine.daemon import LengthPrefixedDaemon
 
 _REGEX_CHEAT_SHEET_TEMPLATE_JAVA = [
     {
@@ -124,15 +125,31 @@ _REGEX_EXAMPLES_PYTHON_JAVA = {
 class JavaRegex(BasicRegexEngine):
     """Class to handle Java-based regex operations."""
 
+    offset_unit = "utf16"
+
     def __init__(self):
-        super().__init__()
-        self.regex_cheat_sheet = _REGEX_CHEAT_SHEET_TEMPLATE_JAVA
-        self.regex_examples = _REGEX_EXAMPLES_PYTHON_JAVA
         self.java_cli_path = os.path.join(Path.ENGINE_JAVA, "JavaRegexCLI.class")
         self.gson_jar_path = os.path.join(Path.ENGINE_JAVA, "gson-2.8.9.jar")
         self.java_cli_source = os.path.join(Path.ENGINE_JAVA, "JavaRegexCLI.java")
+        self.classpath = f"{os.path.dirname(self.java_cli_path)}{os.pathsep}{self.gson_jar_path}"
         self._download_gson_if_not_exists()
         self._compile_java_if_not_compiled()
+        super().__init__()
+        self.regex_cheat_sheet = _REGEX_CHEAT_SHEET_TEMPLATE_JAVA
+        self.regex_examples = _REGEX_EXAMPLES_PYTHON_JAVA
+        # Leave a margin below the match timeout, so the JVM gives up before the worker running it is killed
+        self.match_timeout_ms = max(100, Config.regex_timeout * 1000 - 250)
+        self._daemon = LengthPrefixedDaemon(
+            "Java",
+            [
+                "java",
+                "--add-opens=java.base/java.util.regex=ALL-UNNAMED",
+                "-cp",
+                self.classpath,
+                "JavaRegexCLI",
+                "--server",
+            ],
+        )
 
     def _download_gson_if_not_exists(self):
         """Downloads gson jar if not exists."""
@@ -178,9 +195,11 @@ class JavaRegex(BasicRegexEngine):
                 log.error("Failed to download Gson jar from all provided URLs.")
 
     def _compile_java_if_not_compiled(self):
-        """Compiles Java code if .class files are not present."""
-        if not os.path.exists(self.java_cli_path):
-            log.warning("Java class not found. Compiling now.")
+        """Compiles Java code if .class files are not present or older than the source."""
+        if not os.path.exists(self.java_cli_path) or os.path.getmtime(self.java_cli_source) > os.path.getmtime(
+            self.java_cli_path
+        ):
+            log.warning("Java class not found or outdated. Compiling now.")
             try:
                 classpath = f".{os.pathsep}{self.gson_jar_path}"
                 subprocess.check_call(["javac", "-cp", classpath, self.java_cli_source])
@@ -193,62 +212,54 @@ class JavaRegex(BasicRegexEngine):
 
     def _get_version(self) -> str:
         try:
-            result = subprocess.run(["java", "-version"], capture_output=True, text=True, check=True)
-            version_line = result.stderr.splitlines()[0]
-            version = version_line.split('"')[1]
-            return f"JDK - {version}"
-        except subprocess.CalledProcessError as e:
+            return self._load_capabilities("java")["version"]
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
             return f"Error retrieving JDK version: {str(e)}"
 
-    def _match(self, pattern, text, flags) -> list[dict]:
-        java_flags = self._convert_flags_to_java(flags)
-        classpath = f"{os.path.dirname(self.java_cli_path)}{os.pathsep}{self.gson_jar_path}"
-        java_args = [
-            "java",
-            "--add-opens=java.base/java.util.regex=ALL-UNNAMED",
-            "-cp",
-            classpath,
-            "JavaRegexCLI",
-            pattern,
-            text,
-            str(java_flags),
-        ]
+    def _probe_capabilities(self) -> dict:
+        result = subprocess.run(
+            ["java", "-cp", self.classpath, "JavaRegexCLI", "--capabilities"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        capabilities = json.loads(result.stdout)
+        capabilities["version"] = f"JDK - {capabilities['version']}"
+        return capabilities
+
+    def close(self):
+        """Stops the daemon, its compiled patterns are dropped with it."""
+        self._daemon.close()
 
-        with subprocess.Popen(java_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as process:
-            stdout, stderr = process.communicate()
-            if stderr:
-                raise RuntimeError(f"Error from java CLI {stderr}")
-            result = json.loads(stdout)
-            matches = result.get("matches", [])
-            return matches
+    def _match(self, pattern, text, flags, limit=0, offset=0, timeout=None) -> list[dict]:
+        java_flags = self._convert_flags_to_java(flags)
+        # A shorter timeout of the match, e.g. the ReDoS budget, is enforced by the JVM instead of killing the worker
+        timeout_ms = int(min(self.match_timeout_ms, self._engine_timeout(timeout) * 1000))
+        result = self._daemon.request(
+            {
+                "pattern": pattern,
+                "text": text,
+                "flags": java_flags,
+                "timeout_ms": timeout_ms,
+                "limit": limit,
+                "offset": offset,
+            }
+        )
+        if result.get("timeout"):
+            raise TimeoutError(f"Timeout exceeded: {timeout_ms / 1000} seconds")
+        if result.get("error"):
+            raise RuntimeError(f"Error from java CLI {result['error']}")
+        return result.get("matches", [])
 
     def _convert_flags_to_java(self, flags):
         """Convert flags from python to java"""
         java_flags = 0
+        java_flag_table = self.capabilities.get("flags", {})
         for flag_name, flag_value in self.get_available_flags().items():
             if flags & flag_value:
-                java_flags |= self._get_java_flag(flag_name)
+                java_flags |= java_flag_table.get(flag_name, flag_value)
         return java_flags
 
-    def _get_java_flag(self, flag_name):
-        with subprocess.Popen(
-            [
-                "java",
-                "-cp",
-                os.path.dirname(self.java_cli_path),
-                "JavaRegexCLI",
-                "getFlag",
-                flag_name,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        ) as process:
-            stdout, stderr = process.communicate()
-            if stderr:
-                log.error(f"Error from java CLI {stderr}")
-            return int(stdout)
-
     def get_available_flags(self) -> dict:
         return {
             "CASE_INSENSITIVE": 2,
@@ -2,13 +2,16 @@
 Module for JavaScript (Node.js) regex engine integration.
 """
 
+import itertools
 import json
 import os
 import re
+import shutil
 import subprocess
 
 from project import Config, Path, log
 from src.engine.basic import BasicRegexEngine
+from src.engine.daemon import LineDelimitedDaemon
 
 # Basic Cheat Sheet - JS Regex has differences (e.g., lookbehind support varies)
 _REGEX_CHEAT_SHEET_TEMPLATE_JS = [
@@ -95,6 +98,8 @@ class JavaScriptRegex(BasicRegexEngine):
     Requires Node.js to be installed and in the system PATH.
     """
 
+    offset_unit = "utf16"
+
     FLAG_MAP = {
         re.IGNORECASE: "i",
         re.MULTILINE: "m",
@@ -110,40 +115,48 @@ class JavaScriptRegex(BasicRegexEngine):
     }
 
     def __init__(self):
-        self.regex_time_out = Config.regex_timeout + 5
+        # Leave a margin below the match timeout, so the worker thread is stopped before the match worker is killed
+        self.match_timeout_ms = max(100, Config.regex_timeout * 1000 - 250)
         self.node_path = "node"  # Assumes node is in PATH
         self.script_path = os.path.join(Path.ENGINE_JAVASCRIPT, "node_regex_cli.js")
         self._check_node_exists()
+        self._daemon = LineDelimitedDaemon("Node.js", [self.node_path, self.script_path, "--server"])
+        self._job_ids = itertools.count()
         super().__init__()
         self.regex_cheat_sheet = _REGEX_CHEAT_SHEET_TEMPLATE_JS
         self.regex_examples = _REGEX_EXAMPLES_JS
 
     def _check_node_exists(self):
-        try:
-            subprocess.run([self.node_path, "--version"], capture_output=True, check=True, text=True, encoding="utf-8")
-            log.info(f"Node.js found at: {self.node_path}")
-        except FileNotFoundError:
+        node = shutil.which(self.node_path)
+        if node is None:
             log.error(
                 f"Error: '{self.node_path}' command not found. Please install Node.js and ensure it's in your PATH."
             )
             raise EnvironmentError("Node.js not found. Please install it.")
-        except subprocess.CalledProcessError as e:
-            log.error(f"Error checking Node.js version: {e}")
+        log.info(f"Node.js found at: {node}")
 
     def _set_name(self):
         return "JavaScript"
 
     def _get_version(self) -> str:
         try:
-            result = subprocess.run(
-                [self.node_path, "--version"], capture_output=True, text=True, check=True, encoding="utf-8"
-            )
-            version = result.stdout.strip()
-            return f"Node.js - {version[1:]}"
+            return self._load_capabilities(self.node_path)["version"]
         except Exception as e:
             log.error(f"Could not get Node.js version: {e}")
             return "Node.js version unknown"
 
+    def _probe_capabilities(self) -> dict:
+        result = subprocess.run(
+            [self.node_path, self.script_path, "--capabilities"],
+            capture_output=True,
+            text=True,
+            check=True,
+            encoding="utf-8",
+        )
+        capabilities = json.loads(result.stdout)
+        capabilities["version"] = f"Node.js - {capabilities['version']}"
+        return capabilities
+
     def _convert_flags_to_js(self, flags: int) -> str:
         js_flags = ""
         for py_flag, js_char in self.FLAG_MAP.items():
@@ -151,41 +164,33 @@ class JavaScriptRegex(BasicRegexEngine):
                 js_flags += js_char
         return js_flags
 
-    def _match(self, pattern: str, text: str, flags: int) -> list[dict]:
-        js_flags_str = self._convert_flags_to_js(flags)
-        cmd = [self.node_path, self.script_path, pattern, text, js_flags_str]
+    def close(self):
+        """Stops the daemon, its compiled patterns are dropped with it."""
+        self._daemon.close()
 
-        try:
-            process = subprocess.run(
-                cmd, capture_output=True, text=True, check=True, encoding="utf-8", timeout=self.regex_time_out
-            )
-            output = process.stdout
-            stderr = process.stderr
-            if stderr:
-                log.warning(f"Node.js stderr: {stderr.strip()}")
-            result = json.loads(output)
-            if result.get("error"):
-                raise ValueError(f"Node.js Regex Error: {result['error']}")
-            processed_matches = []
-            for match in result.get("matches", []):
-                for group in match.get("groups", []):
-                    if group.get("value") is None:
-                        group["value"] = ""
-                processed_matches.append(match)
-
-            return processed_matches
-
-        except subprocess.TimeoutExpired:
-            log.error(f"Node.js script timed out after {self.regex_time_out} seconds.")
+    def _match(
+        self, pattern: str, text: str, flags: int, limit: int = 0, offset: int = 0, timeout: float | None = None
+    ) -> list[dict]:
+        js_flags_str = self._convert_flags_to_js(flags)
+        # A shorter timeout of the match, e.g. the ReDoS budget, stops the Node.js worker thread instead of the worker
+        timeout_ms = int(min(self.match_timeout_ms, self._engine_timeout(timeout) * 1000))
+        result = self._daemon.request(
+            {
+                "id": next(self._job_ids),
+                "pattern": pattern,
+                "text": text,
+                "flags": js_flags_str,
+                "timeout_ms": timeout_ms,
+                "limit": limit,
+                "offset": offset,
+            }
+        )
+        if result.get("timeout"):
+            log.error(f"Node.js regex timed out after {timeout_ms} ms.")
             raise TimeoutError("JavaScript regex execution timed out.")
-        except subprocess.CalledProcessError as e:
-            log.error(f"Node.js script execution failed with exit code {e.returncode}")
-            log.error(f"Command: {' '.join(cmd)}")
-            log.error(f"Stderr: {e.stderr.strip()}")
-            log.error(f"Stdout: {e.stdout.strip()}")
-        except Exception as e:
-            log.error(f"An unexpected error occurred during JavaScript matching: {e}")
-            raise e
+        if result.get("error"):
+            raise ValueError(f"Node.js Regex Error: {result['error']}")
+        return result.get("matches", [])
 
     def get_available_flags(self) -> dict:
         """Returns a dictionary of available flags mappable from Python's re."""
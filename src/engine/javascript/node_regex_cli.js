@@ -1,18 +1,23 @@
 // node_regex_cli.js
 // Usage: node node_regex_cli.js <pattern> <text> <flags_string>
 // Example: node node_regex_cli.js "a(b)c" "xx abc yy abc zz" "gi"
+//
+// Capabilities: node node_regex_cli.js --capabilities
+// Prints the version, flag table and feature bits of this Node.js runtime as JSON.
+//
+// Server mode: node node_regex_cli.js --server
+// Reads newline-delimited JSON jobs {"id", "pattern", "text", "flags", "timeout_ms", "limit", "offset"} from stdin
+// and writes one JSON result line {"id", "matches", "error", "timeout"} per job to stdout. "limit" and "offset" are
+// optional. Each match runs in a worker thread, which is terminated and replaced when the job exceeds its timeout.
 
-const patternStr = process.argv[2];
-const text = process.argv[3];
-const flagsStr = process.argv[4] || ''; // e.g., "gi" includes global and ignoreCase
+const { Worker, isMainThread, parentPort, workerData } = require('worker_threads');
 
-let result = {
-    matches: [],
-    error: ""
-};
+const PATTERN_CACHE_SIZE = 256;
+
+// Compiled RegExp objects keyed by flags and pattern, a Map keeps insertion order so the first key is the oldest
+const patternCache = new Map();
 
-try {
-    // Ensure 'd' flag is included if supported and available for indices
+const compileRegex = (patternStr, flagsStr) => {
     // Ensure 'g' flag is always included for finditer-like behavior
     let effectiveFlags = flagsStr;
     if (!effectiveFlags.includes('g')) {
@@ -24,103 +29,249 @@ try {
         effectiveFlags += 'd';
     }
 
-    let regex;
     try {
-         regex = new RegExp(patternStr, effectiveFlags);
+        return new RegExp(patternStr, effectiveFlags);
     } catch (e) {
         // If creating with 'd' flag failed, try without it (older Node versions)
-        if (effectiveFlags.includes('d') && e instanceof SyntaxError) {
-            effectiveFlags = effectiveFlags.replace('d', '');
-            regex = new RegExp(patternStr, effectiveFlags);
-        } else {
-            throw e;
+        if (e instanceof SyntaxError) {
+            return new RegExp(patternStr, effectiveFlags.replace('d', ''));
         }
+        throw e;
     }
+};
 
+// Names of the capture groups in pattern order, used for groups which did not take part in a match and therefore
+// have no indices to compare. names[i] is the name of group i, or undefined for an unnamed group.
+const scanGroupNames = (patternStr) => {
+    const names = [];
+    let group = 0;
+    let inClass = false;
+    for (let i = 0; i < patternStr.length; i++) {
+        const char = patternStr[i];
+        if (char === '\\') {
+            i++; // Skip the escaped character
+        } else if (inClass) {
+            inClass = char !== ']';
+        } else if (char === '[') {
+            inClass = true;
+        } else if (char === '(') {
+            if (patternStr[i + 1] !== '?') {
+                group++;
+            } else if (patternStr[i + 2] === '<' && patternStr[i + 3] !== '=' && patternStr[i + 3] !== '!') {
+                group++;
+                const end = patternStr.indexOf('>', i + 3);
+                names[group] = patternStr.slice(i + 3, end);
+            }
+        }
+    }
+    return names;
+};
 
-    let match;
-    while ((match = regex.exec(text)) !== null) {
-        // If the regex is empty (like //g), it might loop infinitely
-        if (match[0].length === 0 && regex.lastIndex === match.index) {
-            regex.lastIndex++;
+const getCachedRegex = (patternStr, flagsStr) => {
+    const key = `${flagsStr}/${patternStr}`;
+    let entry = patternCache.get(key);
+    if (entry) {
+        // Move the entry to the end, it is now the most recently used one
+        patternCache.delete(key);
+    } else {
+        entry = { regex: compileRegex(patternStr, flagsStr), names: scanGroupNames(patternStr) };
+        if (patternCache.size >= PATTERN_CACHE_SIZE) {
+            patternCache.delete(patternCache.keys().next().value);
         }
+    }
+    patternCache.set(key, entry);
+    return entry;
+};
 
-        const matchData = {
-            match: match[0],
-            index: [match.index, regex.lastIndex],
-            groups: []
-        };
+// Map named groups to their numbers. With the 'd' flag indices.groups[name] is the very same array object as
+// indices[i] of the group, so the mapping is exact even if several groups capture the same value.
+const learnGroupNames = (match, names) => {
+    if (!match.indices || !match.indices.groups) {
+        return;
+    }
+    for (const name in match.indices.groups) {
+        const pair = match.indices.groups[name];
+        if (pair === undefined) {
+            continue;
+        }
+        for (let i = 1; i < match.indices.length; i++) {
+            if (match.indices[i] === pair) {
+                names[i] = name;
+                break;
+            }
+        }
+    }
+};
 
-        // Check if indices ('d' flag) are available
-        const hasIndices = match.indices !== undefined && match.indices !== null;
+// Skip the first `offset` matches without building them and stop after `limit` matches, 0 means no limit
+const findMatches = (regex, names, text, offset = 0, limit = 0) => {
+    const matches = [];
+    regex.lastIndex = 0;
+    let skipped = 0;
+    let match;
+    while ((limit <= 0 || matches.length < limit) && (match = regex.exec(text)) !== null) {
+        const matchEnd = match.index + match[0].length;
+        // If the match is empty (like //g), advance manually to avoid an infinite loop
+        if (match[0].length === 0) {
+            const code = text.codePointAt(regex.lastIndex);
+            regex.lastIndex += (regex.unicode || regex.unicodeSets) && code > 0xffff ? 2 : 1;
+        }
+        if (skipped < offset) {
+            skipped++;
+            continue;
+        }
 
+        learnGroupNames(match, names);
+        const hasIndices = match.indices !== undefined && match.indices !== null;
+        const groups = [];
         // Process groups (skip the full match at index 0)
         for (let i = 1; i < match.length; i++) {
             const groupValue = match[i];
-            let groupIndex = [];
-            let groupName = ""; // JavaScript doesn't easily expose numbered group names
-
-            if (groupValue !== undefined) {
-                 if (hasIndices && match.indices[i]) {
-                    groupIndex = [match.indices[i][0], match.indices[i][1]];
-                 } else {
-                    groupIndex = [];
-                 }
-            } else {
-                 groupIndex = [];
-            }
+            groups.push({
+                name: names[i] || '',
+                // Ensure null/undefined becomes empty string to match Python structure
+                value: groupValue === undefined || groupValue === null ? '' : groupValue,
+                index: groupValue !== undefined && hasIndices && match.indices[i] ? [match.indices[i][0], match.indices[i][1]] : [],
+            });
+        }
+
+        matches.push({
+            match: match[0],
+            index: [match.index, matchEnd],
+            groups: groups,
+        });
+    }
+    return matches;
+};
+
+const runJob = (job) => {
+    const result = { id: job.id, matches: [], error: '' };
+    try {
+        const entry = getCachedRegex(job.pattern, job.flags || '');
+        result.matches = findMatches(entry.regex, entry.names, job.text, job.offset || 0, job.limit || 0);
+    } catch (e) {
+        result.error = e.message || String(e);
+    }
+    return result;
+};
+
+const runServer = () => {
+    const readline = require('readline');
+    const queue = [];
+    let worker = null;
+    let current = null;
+    let inputClosed = false;
+
+    const respond = (result) => {
+        process.stdout.write(JSON.stringify(result) + '\n');
+    };
 
-             // Handle named groups
-             if (match.groups) {
-                for (const name in match.groups) {
-                    // Find which numbered group corresponds to this named group
-                    // This relies on the assumption that named groups also appear in the numbered match array
-                    if (match.groups[name] === groupValue) {
-                         // Heuristic: If we find a match by value, assume it's the correct name.
-                         // This isn't perfect if multiple groups capture the same value.
-                         // A more robust approach might require parsing the pattern, which is complex.
-                         // Check if the index matches as well if available
-                         if (hasIndices && match.indices.groups && match.indices.groups[name] && match.indices.groups[name][0] === groupIndex[0]) {
-                            groupName = name;
-                            break; // Found the name for this group index
-                         } else if (!hasIndices) {
-                            // Without indices, rely solely on value match
-                            groupName = name;
-                            // Don't break immediately, another named group might have the same value
-                         }
-                    }
-                }
+    const finish = (result) => {
+        clearTimeout(current.timer);
+        current = null;
+        respond(result);
+        runNext();
+    };
+
+    const startWorker = () => {
+        worker = new Worker(__filename, { workerData: { role: 'matcher' } });
+        worker.on('message', (result) => {
+            if (current && result.id === current.job.id) {
+                finish(result);
+            }
+        });
+        worker.on('error', (e) => {
+            worker = null;
+            if (current) {
+                finish({ id: current.job.id, matches: [], error: e.message || String(e) });
             }
+        });
+    };
 
-            matchData.groups.push({
-                name: groupName,
-                // Ensure null/undefined becomes empty string to match Python structure
-                value: groupValue === undefined || groupValue === null ? "" : groupValue,
-                index: groupIndex
-            });
+    const runNext = () => {
+        if (current) {
+            return;
         }
-         // Add named groups that might not have been matched if not captured by value check
-         if (hasIndices && match.indices.groups) {
-            for (const name in match.indices.groups) {
-                let found = matchData.groups.some(g => g.name === name);
-                if (!found) {
-                     const namedGroupValue = match.groups[name];
-                     const namedGroupIndex = match.indices.groups[name] ? [match.indices.groups[name][0], match.indices.groups[name][1]] : [];
-                     matchData.groups.push({
-                        name: name,
-                        value: namedGroupValue === undefined || namedGroupValue === null ? "" : namedGroupValue,
-                        index: namedGroupIndex,
-                    });
-                }
+        if (queue.length === 0) {
+            if (inputClosed) {
+                process.exit(0);
             }
+            return;
+        }
+        const job = queue.shift();
+        if (!worker) {
+            startWorker();
         }
+        current = { job: job };
+        current.timer = setTimeout(() => {
+            // The match is still running, the only way to stop a RegExp is to terminate its thread
+            worker.terminate();
+            worker = null;
+            finish({ id: job.id, matches: [], error: '', timeout: true });
+        }, job.timeout_ms);
+        worker.postMessage(job);
+    };
 
+    const input = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+    input.on('line', (line) => {
+        if (line.trim() === '') {
+            return;
+        }
+        try {
+            queue.push(JSON.parse(line));
+        } catch (e) {
+            respond({ id: null, matches: [], error: `Invalid job: ${e.message}` });
+            return;
+        }
+        runNext();
+    });
+    input.on('close', () => {
+        inputClosed = true;
+        if (!current && queue.length === 0) {
+            process.exit(0);
+        }
+    });
+};
 
-        result.matches.push(matchData);
+const getCapabilities = () => {
+    const supportsFlag = (flag) => {
+        try {
+            new RegExp('', flag);
+            return true;
+        } catch (e) {
+            return false;
+        }
+    };
+    const flags = {};
+    for (const flag of ['d', 'g', 'i', 'm', 's', 'u', 'v', 'y']) {
+        flags[flag] = supportsFlag(flag);
     }
+    return {
+        version: process.versions.node,
+        flags: flags,
+        features: {
+            has_indices: flags.d,
+            unicode_sets: flags.v,
+            worker_threads: true,
+        },
+    };
+};
 
-} catch (e) {
-    result.error = e.message || String(e);
+if (!isMainThread && workerData && workerData.role === 'matcher') {
+    parentPort.on('message', (job) => {
+        parentPort.postMessage(runJob(job));
+    });
+} else if (process.argv[2] === '--capabilities') {
+    console.log(JSON.stringify(getCapabilities()));
+} else if (process.argv[2] === '--server') {
+    runServer();
+} else {
+    const result = runJob({
+        id: null,
+        pattern: process.argv[2],
+        text: process.argv[3],
+        flags: process.argv[4] || '', // e.g., "gi" includes global and ignoreCase
+    });
+    delete result.id;
+    console.log(JSON.stringify(result));
 }
-
-console.log(JSON.stringify(result));
\ No newline at end of file
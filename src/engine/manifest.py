@@ -0,0 +1,98 @@
+"""
+This module provides the engine capability manifest.
+
+Versions, flag tables and feature bits of the external engines are probed once and stored on disk, keyed by the path
+and modification time of the runtime binary. Engines load their entry from the manifest instead of starting a
+subprocess in every worker. Run `python -m src.engine.manifest` to generate it at build time.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from project import Path, log
+
+MANIFEST_PATH = os.path.join(Path.CACHE, "engine_manifest.json")
+
+
+def _binary_signature(binary: str) -> dict | None:
+    """Returns the resolved path and modification time of a binary from PATH, None if it is not installed."""
+    path = shutil.which(binary)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    return {"binary": path, "mtime": os.path.getmtime(path)}
+
+
+class CapabilityManifest:
+    """
+    Capabilities of the engines stored in a JSON file shared by all processes of the host.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning(f"Could not read engine manifest {self.path}: {e}")
+            return {}
+
+    def _save(self, data: dict):
+        """Writes the manifest atomically, so concurrent readers never see a partial file."""
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, delete=False) as file:
+                json.dump(data, file, indent=2)
+            os.replace(file.name, self.path)
+        except OSError as e:
+            log.warning(f"Could not write engine manifest {self.path}: {e}")
+
+    def get(self, engine: str, binary: str, probe) -> dict:
+        """Gets the capabilities of an engine, probing the runtime only if the stored entry is missing or stale.
+
+        :param engine: Name of the engine entry.
+        :type engine: str
+        :param binary: Runtime binary of the engine, looked up in PATH.
+        :type binary: str
+        :param probe: Callable returning the capabilities dictionary of the engine.
+        :type probe: callable
+        :raises FileNotFoundError: If the binary is not installed.
+        :return: The capabilities dictionary.
+        :rtype: dict
+        """
+        signature = _binary_signature(binary)
+        if signature is None:
+            raise FileNotFoundError(f"'{binary}' command not found")
+
+        with self._lock:
+            entry = self._load().get(engine)
+            if entry and entry.get("binary") == signature["binary"] and entry.get("mtime") == signature["mtime"]:
+                return entry["capabilities"]
+
+            log.info(f"Probing capabilities of {engine} ({signature['binary']})")
+            capabilities = probe()
+            data = self._load()  # Re-read, another process may have added its engines meanwhile
+            data[engine] = {**signature, "capabilities": capabilities}
+            self._save(data)
+            return capabilities
+
+
+manifest = CapabilityManifest()
+
+
+if __name__ == "__main__":
+    # Generate the manifest, e.g. while building the Docker image
+    from src.engine import CppRegex, JavaRegex, JavaScriptRegex
+
+    for engine_class in (CppRegex, JavaRegex, JavaScriptRegex):
+        engine_instance = engine_class()
+        print(f"{engine_instance.name}: {engine_instance.version}")
@@ -0,0 +1,652 @@
+"""
+This module provides a backtracking profiler for the Python dialects.
+
+The pattern is parsed with the positions of its parts and compiled into a small backtracking program: character tests,
+choice points, jumps and captures. The program is run like the `re` engine runs a search, trying every starting
+position of the text in turn. Every executed instruction is a step; it is counted for the starting position and for
+the part of the pattern that produced it. Every return to a choice point is counted as a backtrack of that part.
+
+Single characters, classes and `.` are tested with the `re` or `regex` module itself, so they behave exactly like in
+the engine. The profiler stops after `max_steps` steps, so profiling a pattern costs a bounded amount of time whatever
+the pattern and the text are.
+"""
+
+import math
+import re
+import time
+
+import regex
+
+from project import Config
+
+# Python engines with their module, the profiler understands their common syntax
+PROFILED_ENGINES = {"Python - re": re, "Python - regex": regex}
+MAX_PROGRAM_SIZE = 100_000
+HOTSPOTS = 5
+
+_CHAR, _SPLIT, _JUMP, _SAVE, _ASSERT, _BACKREF, _LOOK, _ATOMIC, _PROGRESS, _MATCH = range(10)
+_UNDO, _RESTORE, _CHOICE = range(3)
+_QUANTIFIER = re.compile(r"\{(\d*)(?:(,)(\d*))?\}")
+_NAMED_GROUP = re.compile(r"\?P?<(\w+)>")
+_UNSUPPORTED_GROUPS = ("?(", "?|", "?R", "?&", "?P>")
+_UNSUPPORTED_ESCAPES = set("GKXLmM")
+
+
+class UnsupportedPatternError(ValueError):
+    """The pattern uses syntax which the profiler does not model, e.g. conditionals or recursion."""
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class _Node:
+    """A part of the pattern: `start` and `end` index the pattern, `value` depends on the `kind`."""
+
+    __slots__ = ("id", "kind", "start", "end", "children", "value")
+
+    def __init__(self, node_id, kind, start, end, children=(), value=None):
+        self.id = node_id
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.children = children
+        self.value = value
+
+    def width(self) -> tuple[float, float]:
+        """Returns the minimum and the maximum number of characters matched by the node."""
+        if self.kind in ("literal", "class"):
+            return 1, 1
+        if self.kind in ("assertion", "lookaround"):
+            return 0, 0
+        if self.kind == "backreference":
+            return 0, math.inf
+        widths = [child.width() for child in self.children]
+        if self.kind == "alternation":
+            return min(low for low, _ in widths), max(high for _, high in widths)
+        low, high = sum(low for low, _ in widths), sum(high for _, high in widths)
+        if self.kind == "repeat":
+            repeat_low, repeat_high, _ = self.value
+            return low * repeat_low, high * repeat_high if high else 0
+        return low, high
+
+
+class _Parser:
+    """Parses the syntax of `re` and the common syntax of `regex` into nodes with their positions in the pattern."""
+
+    def __init__(self, pattern: str, flags: int, module):
+        self.pattern = pattern
+        self.position = 0
+        self.flags = flags
+        self.module = module
+        self.groups = 0
+        self.names = {}
+        self.nodes = []
+        self._testers = {}
+
+    def _peek(self, offset: int = 0) -> str:
+        index = self.position + offset
+        return self.pattern[index] if index < len(self.pattern) else ""
+
+    def _node(self, kind: str, start: int, children=(), value=None) -> _Node:
+        node = _Node(len(self.nodes), kind, start, self.position, tuple(children), value)
+        self.nodes.append(node)
+        return node
+
+    def _skip_verbose(self):
+        while self.flags & self.module.VERBOSE and self.position < len(self.pattern):
+            if self._peek().isspace():
+                self.position += 1
+            elif self._peek() == "#":
+                newline = self.pattern.find("\n", self.position)
+                self.position = len(self.pattern) if newline < 0 else newline + 1
+            else:
+                break
+
+    def _tester(self, source: str):
+        """Returns a test of one character against a character, class or `.`, compiled with the engine's module."""
+        key = source, self.flags
+        if key not in self._testers:
+            try:
+                compiled = self.module.compile(source, self.flags & ~self.module.VERBOSE)
+            except self.module.error as e:
+                raise UnsupportedPatternError(f"'{source}' cannot be profiled: {e}") from e
+            results = {}
+
+            def test(char):
+                found = results.get(char)
+                if found is None:
+                    found = results[char] = compiled.fullmatch(char) is not None
+                return found
+
+            self._testers[key] = test
+        return self._testers[key]
+
+    def parse(self) -> _Node:
+        node = self._alternation()
+        if self.position < len(self.pattern):
+            raise UnsupportedPatternError(f"unexpected '{self._peek()}' at position {self.position}")
+        return node
+
+    def _alternation(self) -> _Node:
+        start = self.position
+        branches = [self._sequence()]
+        while self._peek() == "|":
+            self.position += 1
+            branches.append(self._sequence())
+        return branches[0] if len(branches) == 1 else self._node("alternation", start, branches)
+
+    def _sequence(self) -> _Node:
+        start = self.position
+        items = []
+        while True:
+            self._skip_verbose()
+            if self._peek() in ("", "|", ")"):
+                break
+            items.append(self._quantified(self._atom()))
+        return items[0] if len(items) == 1 else self._node("sequence", start, items)
+
+    def _quantified(self, node: _Node) -> _Node:
+        self._skip_verbose()
+        char = self._peek()
+        quantifier = _QUANTIFIER.match(self.pattern, self.position) if char == "{" else None
+        if char in ("*", "+", "?"):
+            low, high = {"*": (0, math.inf), "+": (1, math.inf), "?": (0, 1)}[char]
+            self.position += 1
+        elif quantifier and (quantifier.group(1) or quantifier.group(2)):
+            low = int(quantifier.group(1) or 0)
+            if quantifier.group(2) is None:
+                high = low
+            else:
+                high = int(quantifier.group(3)) if quantifier.group(3) else math.inf
+            self.position = quantifier.end()
+        else:
+            return node
+
+        mode = "greedy"
+        if self._peek() in ("?", "+"):
+            mode = "lazy" if self._peek() == "?" else "possessive"
+            self.position += 1
+        return self._quantified(self._node("repeat", node.start, [node], (low, high, mode)))
+
+    def _atom(self) -> _Node:
+        start = self.position
+        char = self._peek()
+        self.position += 1
+        if char == "(":
+            return self._group(start)
+        if char == "[":
+            self._skip_class()
+            return self._node("class", start, value=self._tester(self._source(start)))
+        if char == "\\":
+            return self._escape(start)
+        if char in ("^", "$"):
+            return self._node("assertion", start, value=char)
+        return self._node("class" if char == "." else "literal", start, value=self._tester(char))
+
+    def _skip_class(self):
+        """Moves after the `]` closing a character class."""
+        if self._peek() == "^":
+            self.position += 1
+        if self._peek() == "]":
+            self.position += 1
+        while self.position < len(self.pattern) and self._peek() != "]":
+            if self._peek() == "[" and self._peek(1) == ":":
+                end = self.pattern.find(":]", self.position)
+                self.position = self.position + 1 if end < 0 else end + 2
+            else:
+                self.position += 2 if self._peek() == "\\" else 1
+        self.position += 1
+
+    def _group(self, start: int) -> _Node:
+        if self.pattern.startswith(_UNSUPPORTED_GROUPS, self.position):
+            raise UnsupportedPatternError(f"the group at position {start} is not supported by the profiler")
+        if self._peek() != "?" or (named := _NAMED_GROUP.match(self.pattern, self.position)):
+            self.groups += 1
+            index = self.groups
+            if self._peek() == "?":
+                self.names[named.group(1)] = index
+                self.position = named.end()
+            return self._group_body(start, "group", index)
+
+        self.position += 1
+        marker = self._peek()
+        if marker == "#":
+            self.position = self.pattern.index(")", self.position) + 1
+            return self._node("sequence", start)
+        if marker == "P" and self._peek(1) == "=":
+            self.position += 1
+            return self._node("backreference", start, value=self.names.get(self._read_name(")")))
+        for prefix, lookaround in (
+            ("=", (False, False)),
+            ("!", (False, True)),
+            ("<=", (True, False)),
+            ("<!", (True, True)),
+        ):
+            if self.pattern.startswith(prefix, self.position):
+                self.position += len(prefix)
+                return self._group_body(start, "lookaround", lookaround)
+        if marker == ">":
+            self.position += 1
+            return self._group_body(start, "atomic")
+        return self._inline_flags(start)
+
+    def _group_body(self, start: int, kind: str, value=None) -> _Node:
+        body = self._alternation()
+        self.position += 1
+        return self._node(kind, start, [body], value)
+
+    def _inline_flags(self, start: int) -> _Node:
+        """Parses `(?flags)`, which applies to the whole pattern, and `(?flags-flags:...)`, which applies to a group."""
+        end = min(
+            index
+            for index in (self.pattern.find(":", self.position), self.pattern.find(")", self.position))
+            if index >= 0
+        )
+        letters_start = self.position
+        letters = self.pattern[letters_start:end]
+        enabled, _, disabled = letters.partition("-")
+        if not set(letters) <= set("aiLmsux-"):
+            raise UnsupportedPatternError(
+                f"the flags '{letters}' at position {start} are not supported by the profiler"
+            )
+        flags = self.flags
+        for letter in enabled:
+            flags |= getattr(self.module, letter.upper())
+        for letter in disabled:
+            flags &= ~getattr(self.module, letter.upper())
+        self.position = end + 1
+        if self.pattern[end] == ")":
+            self.flags = flags
+            return self._node("sequence", start)
+
+        saved, self.flags = self.flags, flags
+        body = self._alternation()
+        self.flags = saved
+        self.position += 1
+        return self._node("group", start, [body])
+
+    def _source(self, start: int) -> str:
+        """Returns the pattern from `start` to the current position."""
+        end = self.position
+        return self.pattern[start:end]
+
+    def _read_name(self, closing: str) -> str:
+        """Returns the text from after the current character to `closing` and moves after `closing`."""
+        name_start = self.position + 1
+        end = self.pattern.index(closing, name_start)
+        self.position = end + 1
+        return self.pattern[name_start:end]
+
+    def _escape(self, start: int) -> _Node:
+        char = self._peek()
+        self.position += 1
+        if char in _UNSUPPORTED_ESCAPES:
+            raise UnsupportedPatternError(f"'\\{char}' at position {start} is not supported by the profiler")
+        if char in "bBAZ":
+            return self._node("assertion", start, value="\\" + char)
+        if char == "g" and self._peek() == "<":
+            name = self._read_name(">")
+            return self._node("backreference", start, value=int(name) if name.isdigit() else self.names.get(name))
+        if char.isdigit():
+            return self._numeric_escape(start, char)
+        if char in ("x", "u", "U"):
+            self.position += {"x": 2, "u": 4, "U": 8}[char]
+        elif char in ("N", "p", "P") and self._peek() == "{":
+            self.position = self.pattern.index("}", self.position) + 1
+        elif char in ("p", "P"):
+            self.position += 1
+        return self._node("class", start, value=self._tester(self._source(start)))
+
+    def _numeric_escape(self, start: int, char: str) -> _Node:
+        """Parses an octal escape like `\\0` or `\\101`, or a backreference like `\\1` or `\\12`."""
+        digits = self.pattern[start:][1:4]
+        if char == "0":
+            while self.position - start < 4 and self._peek() and self._peek() in "01234567":
+                self.position += 1
+        elif len(digits) == 3 and set(digits) <= set("01234567"):
+            self.position = start + 4
+        else:
+            if self._peek().isdigit():
+                self.position += 1
+            return self._node("backreference", start, value=int(self._source(start)[1:]))
+        return self._node("class", start, value=self._tester(self._source(start)))
+
+
+class _Compiler:
+    """Compiles nodes into a backtracking program, a list of `(operation, argument, argument, node id)` tuples."""
+
+    def __init__(self, groups: int, flags: int, module):
+        self.registers = 2 * (groups + 1)
+        self.ignore_case = bool(flags & module.IGNORECASE)
+        self.multiline = bool(flags & module.MULTILINE)
+        self.word = module.compile(r"\w", flags & ~module.VERBOSE)
+
+    def program(self, node: _Node) -> list:
+        code = []
+        self._emit(node, code)
+        code.append((_MATCH, None, None, node.id))
+        return code
+
+    def _append(self, code: list, operation: int, first, second, node: _Node) -> int:
+        if len(code) >= MAX_PROGRAM_SIZE:
+            raise UnsupportedPatternError("the pattern is too large to profile")
+        code.append((operation, first, second, node.id))
+        return len(code) - 1
+
+    def _patch(self, code: list, index: int, first=None, second=None):
+        operation, old_first, old_second, node_id = code[index]
+        code[index] = (
+            operation,
+            old_first if first is None else first,
+            old_second if second is None else second,
+            node_id,
+        )
+
+    def _emit(self, node: _Node, code: list):
+        getattr(self, f"_emit_{node.kind}")(node, code)
+
+    def _emit_literal(self, node: _Node, code: list):
+        self._append(code, _CHAR, node.value, None, node)
+
+    _emit_class = _emit_literal
+
+    def _emit_sequence(self, node: _Node, code: list):
+        for child in node.children:
+            self._emit(child, code)
+
+    def _emit_alternation(self, node: _Node, code: list):
+        jumps = []
+        for branch in node.children[:-1]:
+            split = self._append(code, _SPLIT, len(code) + 1, None, node)
+            self._emit(branch, code)
+            jumps.append(self._append(code, _JUMP, None, None, node))
+            self._patch(code, split, second=len(code))
+        self._emit(node.children[-1], code)
+        for jump in jumps:
+            self._patch(code, jump, first=len(code))
+
+    def _emit_group(self, node: _Node, code: list):
+        if node.value is None:
+            self._emit(node.children[0], code)
+            return
+        self._append(code, _SAVE, 2 * node.value, None, node)
+        self._emit(node.children[0], code)
+        self._append(code, _SAVE, 2 * node.value + 1, None, node)
+
+    def _emit_repeat(self, node: _Node, code: list):
+        low, high, mode = node.value
+        if mode == "possessive":
+            greedy = _Node(node.id, "repeat", node.start, node.end, node.children, (low, high, "greedy"))
+            self._append(code, _ATOMIC, self.program(greedy), None, node)
+            return
+        body = node.children[0]
+        for _ in range(low):
+            self._emit(body, code)
+        if high == math.inf:
+            # The register holds the position of the iteration start, an iteration matching nothing ends the loop
+            register = self.registers
+            self.registers += 1
+            loop = self._append(code, _SPLIT, None, None, node)
+            self._append(code, _SAVE, register, None, node)
+            self._emit(body, code)
+            self._append(code, _PROGRESS, register, None, node)
+            self._append(code, _JUMP, loop, None, node)
+            branches = (loop + 1, len(code)) if mode == "greedy" else (len(code), loop + 1)
+            self._patch(code, loop, *branches)
+            return
+        splits = []
+        for _ in range(int(high - low)):
+            splits.append(self._append(code, _SPLIT, None, None, node))
+            self._emit(body, code)
+        for split in splits:
+            branches = (split + 1, len(code)) if mode == "greedy" else (len(code), split + 1)
+            self._patch(code, split, *branches)
+
+    def _emit_assertion(self, node: _Node, code: list):
+        self._append(code, _ASSERT, node.value, None, node)
+
+    def _emit_backreference(self, node: _Node, code: list):
+        self._append(code, _BACKREF, node.value, None, node)
+
+    def _emit_lookaround(self, node: _Node, code: list):
+        behind, negative = node.value
+        low, high = node.children[0].width()
+        if behind and high == math.inf:
+            raise UnsupportedPatternError("a lookbehind without a maximum width is not supported by the profiler")
+        widths = range(int(low), int(high) + 1) if behind else ()
+        self._append(code, _LOOK, self.program(node.children[0]), (behind, negative, widths), node)
+
+    def _emit_atomic(self, node: _Node, code: list):
+        self._append(code, _ATOMIC, self.program(node.children[0]), None, node)
+
+
+class _Profiler:
+    """Runs a compiled program over a text and counts the steps and backtracks."""
+
+    def __init__(self, compiler: _Compiler, nodes: list, text: str, max_steps: int):
+        self.compiler = compiler
+        self.text = text
+        self.length = len(text)
+        self.max_steps = max_steps
+        self.steps = 0
+        self.node_steps = [0] * len(nodes)
+        self.node_backtracks = [0] * len(nodes)
+        self._operations = {
+            _CHAR: self._char,
+            _SPLIT: self._split,
+            _JUMP: self._jump,
+            _SAVE: self._save,
+            _ASSERT: self._assert,
+            _BACKREF: self._backref,
+            _LOOK: self._look,
+            _ATOMIC: self._atomic,
+            _PROGRESS: self._progress,
+        }
+
+    def search(self, program: list):
+        """Searches the text like `finditer`, counting the steps of every starting position and the matches.
+
+        :raises _BudgetExceeded: When the step budget runs out, the counts up to that point are kept.
+        """
+        self.position_steps = []
+        self.match_count = 0
+        position = 0
+        while position <= self.length:
+            self.position_steps.append(0)
+            before = self.steps
+            try:
+                end = self.run(program, position, [None] * self.compiler.registers)
+            finally:
+                self.position_steps[-1] = min(self.steps, self.max_steps) - before
+            if end is None:
+                position += 1
+                continue
+            self.match_count += 1
+            self.position_steps.extend([0] * (end - position - 1))
+            position = max(end, position + 1)
+
+    def run(self, program: list, position: int, slots: list, end: int | None = None) -> int | None:
+        """Runs a program from a position, returns the end of the first match or None if there is none.
+
+        :param end: Position the match has to end at, used by lookbehinds.
+        """
+        stack = []
+        counter = 0
+        while True:
+            operation, first, second, node_id = program[counter]
+            self.steps += 1
+            if self.steps > self.max_steps:
+                raise _BudgetExceeded()
+            self.node_steps[node_id] += 1
+            if operation == _MATCH:
+                if end is None or position == end:
+                    return position
+                result = None
+            else:
+                result = self._operations[operation](counter, first, second, node_id, position, slots, stack)
+            if result is None:
+                result = self._backtrack(stack, slots)
+                if result is None:
+                    return None
+            counter, position = result
+
+    def _backtrack(self, stack: list, slots: list) -> tuple[int, int] | None:
+        while stack:
+            entry = stack.pop()
+            if entry[0] == _UNDO:
+                slots[entry[1]] = entry[2]
+            elif entry[0] == _RESTORE:
+                slots[:] = entry[1]
+            else:
+                _, counter, position, node_id = entry
+                self.node_backtracks[node_id] += 1
+                return counter, position
+        return None
+
+    def _char(self, counter, test, _, node_id, position, slots, stack):
+        if position < self.length and test(self.text[position]):
+            return counter + 1, position + 1
+        return None
+
+    def _split(self, counter, first, second, node_id, position, slots, stack):
+        stack.append((_CHOICE, second, position, node_id))
+        return first, position
+
+    def _jump(self, counter, target, _, node_id, position, slots, stack):
+        return target, position
+
+    def _save(self, counter, slot, _, node_id, position, slots, stack):
+        stack.append((_UNDO, slot, slots[slot]))
+        slots[slot] = position
+        return counter + 1, position
+
+    def _progress(self, counter, register, _, node_id, position, slots, stack):
+        return None if slots[register] == position else (counter + 1, position)
+
+    def _is_word(self, position: int) -> bool:
+        return 0 <= position < self.length and self.compiler.word.fullmatch(self.text[position]) is not None
+
+    def _assert(self, counter, kind, _, node_id, position, slots, stack):
+        text, length, multiline = self.text, self.length, self.compiler.multiline
+        if kind == "^":
+            found = position == 0 or multiline and text[position - 1] == "\n"
+        elif kind == "$":
+            found = position == length or position == length - 1 and text[position] == "\n"
+            found = found or multiline and position < length and text[position] == "\n"
+        elif kind in ("\\b", "\\B"):
+            found = (self._is_word(position - 1) != self._is_word(position)) == (kind == "\\b")
+        else:
+            found = position == (0 if kind == "\\A" else length)
+        return (counter + 1, position) if found else None
+
+    def _backref(self, counter, group, _, node_id, position, slots, stack):
+        start, end = (slots[2 * group], slots[2 * group + 1]) if group is not None else (None, None)
+        if start is None or end is None:
+            return None
+        stop = position + end - start
+        captured, candidate = self.text[start:end], self.text[position:stop]
+        if self.compiler.ignore_case:
+            captured, candidate = captured.lower(), candidate.lower()
+        return (counter + 1, stop) if captured == candidate else None
+
+    def _look(self, counter, program, options, node_id, position, slots, stack):
+        behind, negative, widths = options
+        saved = slots[:]
+        if behind:
+            # A lookbehind has to end where it starts, the regex module allows it to have several widths
+            starts = [position - width for width in widths if width <= position]
+            found = any(self.run(program, start, slots, position) is not None for start in starts)
+        else:
+            found = self.run(program, position, slots) is not None
+        if found == negative:
+            slots[:] = saved
+            return None
+        stack.append((_RESTORE, saved))
+        return counter + 1, position
+
+    def _atomic(self, counter, program, _, node_id, position, slots, stack):
+        saved = slots[:]
+        end = self.run(program, position, slots)
+        if end is None:
+            return None
+        stack.append((_RESTORE, saved))
+        return counter + 1, end
+
+
+def _pattern_steps(pattern: str, nodes: list, node_steps: list) -> list[int]:
+    """Spreads the steps of the nodes over the characters of the pattern, each character gets its innermost node."""
+    steps = [0] * len(pattern)
+    for node in sorted(nodes, key=lambda node: node.start - node.end):
+        for index in range(node.start, min(node.end, len(pattern))):
+            steps[index] = node_steps[node.id]
+    return steps
+
+
+def profile(pattern: str, text: str, engine_name: str, flags: int = 0, max_steps: int | None = None) -> dict:
+    """Profiles the backtracking of a search of the pattern in the text.
+
+    :param pattern: The regex pattern.
+    :type pattern: str
+    :param text: The text to search.
+    :type text: str
+    :param engine_name: Name of a Python engine from `PROFILED_ENGINES`.
+    :type engine_name: str
+    :param flags: Flags of the `re` or `regex` module.
+    :type flags: int
+    :param max_steps: Step budget, `OPENREGEX_PROFILE_MAX_STEPS` by default.
+    :type max_steps: int | None
+    :return: Dictionary with the total `steps`, `exhausted` if the budget ran out, the number of `matches`, the steps
+             per starting position (`text_steps`) and per character of the pattern (`pattern_steps`), and the
+             `hotspots`, the parts of the pattern with the most backtracks. `error` is set instead if the pattern
+             cannot be profiled.
+    :rtype: dict
+    """
+    module = PROFILED_ENGINES.get(engine_name)
+    if module is None:
+        return {"error": f"Profiling is available for the {' and '.join(PROFILED_ENGINES)} engines."}
+    max_steps = max_steps or Config.profile_max_steps
+    start_time = time.perf_counter()
+    try:
+        module.compile(pattern, flags)
+        parser = _Parser(pattern, flags, module)
+        root = parser.parse()
+        compiler = _Compiler(parser.groups, parser.flags, module)
+        program = compiler.program(root)
+    except module.error as e:
+        return {"error": str(e)}
+    except (UnsupportedPatternError, RecursionError, ValueError) as e:
+        return {"error": f"The pattern cannot be profiled: {e}"}
+
+    profiler = _Profiler(compiler, parser.nodes, text, max_steps)
+    exhausted = False
+    try:
+        profiler.search(program)
+    except _BudgetExceeded:
+        exhausted = True
+    except RecursionError:
+        return {"error": "The pattern cannot be profiled: too deeply nested lookarounds or atomic groups."}
+
+    ranked = sorted(parser.nodes, key=lambda node: profiler.node_backtracks[node.id], reverse=True)
+    hotspots = [
+        {
+            "start": node.start,
+            "end": node.end,
+            "kind": node.kind,
+            "steps": profiler.node_steps[node.id],
+            "backtracks": profiler.node_backtracks[node.id],
+        }
+        for node in ranked[:HOTSPOTS]
+        if profiler.node_backtracks[node.id]
+    ]
+    return {
+        "error": "",
+        "steps": min(profiler.steps, max_steps),
+        "max_steps": max_steps,
+        "exhausted": exhausted,
+        "matches": profiler.match_count,
+        "text_steps": profiler.position_steps,
+        "pattern_steps": _pattern_steps(pattern, parser.nodes, profiler.node_steps),
+        "hotspots": hotspots,
+        "duration": time.perf_counter() - start_time,
+    }
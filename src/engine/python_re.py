@@ -4,9 +4,11 @@ functionality with a custom regex engine.
 """
 
 import inspect
+import itertools
 import re
 
 from src.engine.basic import BasicRegexEngine
+from src.engine.cache import CompiledPattern, python_pattern_cache
 
 _REGEX_CHEAT_SHEET_TEMPLATE_PYTHON_RE = [
     {
@@ -99,39 +101,38 @@ class PythonRe(BasicRegexEngine):
     def _get_version(self) -> str:
         return re.__version__
 
-    def _match(self, pattern, text, flags):
-        regex = re.compile(pattern, flags)
-        matches = []
-        for match in regex.finditer(text):
+    def _match(self, pattern, text, flags, limit=0, offset=0, timeout=None):
+        # The worker pool stops a Python match, `re` and `regex` cannot interrupt it
+        return list(self._iter_matches(pattern, text, flags, limit, offset))
+
+    def _iter_matches(self, pattern, text, flags, limit=0, offset=0):
+        compiled = python_pattern_cache.get(
+            (self.name, pattern, flags), lambda: CompiledPattern.from_regex(re.compile(pattern, flags))
+        )
+        # Skipped match objects are dropped without building their dicts, finditer stops after the limit
+        for match in itertools.islice(compiled.regex.finditer(text), offset, offset + limit if limit else None):
             # Get groups, including unnamed ones
             groups = match.groups()
 
-            # Get named group dict
-            named_group_dict = regex.groupindex
-
             # build all groups dict
             group_list = []
 
             for i, group_val in enumerate(groups):
-                group_list.append(self._get_group_data(match, i + 1, group_val, named_group_dict))
+                group_list.append(self._get_group_data(match, i + 1, group_val, compiled.group_names))
 
-            matches.append(
-                {
-                    "match": match.group(0),
-                    "index": [match.start(), match.end()],
-                    "groups": group_list,
-                }
-            )
-        return matches
+            yield {
+                "match": match.group(0),
+                "index": [match.start(), match.end()],
+                "groups": group_list,
+            }
 
     @staticmethod
-    def _get_group_data(match, group_index, group_val, named_group_dict):
+    def _get_group_data(match, group_index, group_val, group_names):
         group_start = match.start(group_index)
         group_end = match.end(group_index)
-        group_name = [name for name, index in named_group_dict.items() if index == group_index]
 
         return {
-            "name": group_name[0] if group_name else "",
+            "name": group_names.get(group_index, ""),
             "value": group_val if group_val else "",
             "index": [group_start, group_end] if group_val else [],
         }
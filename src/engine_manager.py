@@ -2,12 +2,13 @@
 This module manages different regex engines and provides functionality to match patterns with a timeout.
 """
 
-import multiprocessing
-import signal
-import time
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from project import Config, log
+from project import Config
 from src.engine import CppRegex, JavaRegex, JavaScriptRegex, PythonRe, PythonRegex
+from src.worker_pool import MatchWorkerPool
 
 
 class EngineManager:
@@ -18,6 +19,8 @@ class EngineManager:
     def __init__(self):
         self.timeout = Config.regex_timeout
         self.engine = {}
+        self._pool = None
+        self._pool_lock = threading.Lock()
         self._init_engine()
 
     def _init_engine(self):
@@ -41,67 +44,111 @@ class EngineManager:
         """Get the engine instance by its name."""
         return self.engine.get(engine_name, None)
 
-    @staticmethod
-    def _run_match_with_timeout(engine, pattern, text, flags, result_queue):
-        """Helper function to run match in a separate process with a timeout."""
-        matches, error = [], ""
-        start_time = time.time()
-
-        def signal_handler(signum, _):
-            """Signal handler to gracefully exit."""
-            log.info(f"Received signal {signum}, shutting down gracefully.")
-            raise TimeoutError(f"Process for engine '{engine.name}' was terminated by signal")
-
-        signal.signal(signal.SIGTERM, signal_handler)
-
-        try:
-            # Instantiate the engine inside the separate process
-            if engine:
-                matches, error = engine.match(pattern, text, flags)
-            else:
-                error = f"Engine {engine.name} not found"
-        except TimeoutError as e:
-            error = str(e)
-            log.warning(error)
-        except (ValueError, TypeError) as e:
-            error = f"Exception in engine {engine.name}: {str(e)}"
-            log.error(error)
-        finally:
-            execution_time = time.time() - start_time
-            result_queue.put((matches, error, execution_time))
-
-    def match(self, engine_name, pattern, text, flags=0):
+    def start(self):
+        """Start the match worker pool ahead of the first request."""
+        self._get_pool()
+
+    def _get_pool(self):
+        """Start the match worker pool on first use."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # At least one worker per engine, so a comparison runs every engine at the same time
+                    self._pool = MatchWorkerPool(
+                        self.engine,
+                        size=max(Config.pool_size, len(self.engine)),
+                        max_tasks=Config.pool_max_tasks,
+                        start_method=Config.pool_start_method,
+                    )
+        return self._pool
+
+    def match(self, engine_name, pattern, text, flags=0, limit=0, offset=0):
         """Match the pattern with the text using the selected engine with a timeout."""
-        time_start = time.time()
-        result_queue = multiprocessing.Queue()
-        engine = self.get_engine(engine_name)  # Queue for inter-process communication
-        process = multiprocessing.Process(
-            target=self._run_match_with_timeout,
-            args=(engine, pattern, text, flags, result_queue),
-            name=f"Engine-{engine_name}",
+        result = self.match_page(engine_name, pattern, text, flags, limit, offset)
+        return result["matches"], result["error"], result["execution_time"]
+
+    def match_page(self, engine_name, pattern, text, flags=0, limit=0, offset=0, timeout=None):
+        """Match the pattern with the text and return one page of at most `limit` matches starting at `offset`.
+
+        The result dictionary holds the `matches`, the `error`, the `execution_time` and `has_more`, which tells if
+        there are matches after this page. A `timeout` in seconds can only shorten the timeout of the manager.
+        """
+        timeout = min(timeout or self.timeout, self.timeout)
+        return self._get_pool().match(engine_name, pattern, text, flags, timeout=timeout, limit=limit, offset=offset)
+
+    async def match_async(self, engine_name, pattern, text, flags=0, limit=0, offset=0, timeout=None):
+        """Coroutine matching like `match_page`, it waits for the match worker in the running event loop.
+
+        The calling thread is free while the match runs, so one thread can have many matches in flight.
+        """
+        timeout = min(timeout or self.timeout, self.timeout)
+        return await self._get_pool().match_async(
+            engine_name, pattern, text, flags, timeout=timeout, limit=limit, offset=offset
         )
 
-        process.start()
-        start_time = time.time()
-        while process.is_alive() and (time.time() - start_time) < self.timeout:
-            time.sleep(0.05)
-        execution_time = time.time() - time_start
-
-        if process.is_alive():
-            log.warning(f"Process for engine '{engine_name}' timed out after {self.timeout} seconds")
-            process.terminate()
-            process.join(timeout=1)  # Wait for a short time to allow termination
-
-            if process.is_alive():
-                log.warning(f"Process for engine '{engine_name}' did not terminate, killing it")
-                process.kill()
-                process.join()
-
-            return [], f"Timeout exceeded: {self.timeout} seconds", execution_time
-
-        if not result_queue.empty():
-            matches, error, _ = result_queue.get()
-            return matches, error, execution_time
-
-        log.error(f"Process for engine '{engine_name}' finished without returning a result")
-        return [], "No result returned from engine", execution_time
+    def parallelism(self, job_count):
+        """Number of jobs of a batch of `job_count` jobs `match_many` runs at the same time, one per match worker."""
+        return max(1, min(job_count, self._get_pool().size))
+
+    def match_many(self, jobs, parallelism=None):
+        """Match a batch of jobs spread over the match workers, return the results in the order of the jobs.
+
+        Each job is a dictionary with `engine`, `pattern` and `text`, and optionally `flags`, `limit`, `offset` and a
+        `timeout` in seconds, which can only shorten the timeout of the manager. Each result is a dictionary like the
+        one from `match_page`, a failing or timed out job does not affect the others. At most `parallelism` jobs run
+        at the same time, one per match worker for None.
+        """
+        pool = self._get_pool()
+        if not jobs:
+            return []
+        parallelism = min(parallelism or len(jobs), self.parallelism(len(jobs)))
+        # Every job waits for a worker at most as long as all jobs before it could take
+        wait = self.timeout * math.ceil(len(jobs) / parallelism)
+
+        def run(job):
+            timeout = min(job.get("timeout") or self.timeout, self.timeout)
+            return pool.match(
+                job["engine"],
+                job["pattern"],
+                job["text"],
+                job.get("flags", 0),
+                timeout=timeout,
+                limit=job.get("limit", 0),
+                offset=job.get("offset", 0),
+                wait=wait,
+            )
+
+        # The timeout of a job only starts once it has a worker, so a job never times out because of the jobs before
+        # it, e.g. while other requests hold some of the workers
+        with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="MatchMany") as executor:
+            return list(executor.map(run, jobs))
+
+    def compare(self, pattern, text, flags=0, limit=0, offset=0):
+        """Match the pattern with the text on every engine at the same time.
+
+        Returns a dictionary of engine name to a result like the one from `match_page`, with the indices in the
+        `offset_unit` of each engine.
+        """
+        jobs = [
+            {"engine": name, "pattern": pattern, "text": text, "flags": flags, "limit": limit, "offset": offset}
+            for name in self.engine
+        ]
+        return dict(zip(self.engine, self.match_many(jobs)))
+
+    def stream(self, engine_name, pattern, text, flags=0, chunk_size=1000, timeout=None):
+        """Match the pattern with the text and yield the matches in chunks while the engine finds them.
+
+        A `timeout` in seconds can only shorten the timeout of the manager.
+        """
+        timeout = min(timeout or self.timeout, self.timeout)
+        return self._get_pool().stream(engine_name, pattern, text, flags, timeout=timeout, chunk_size=chunk_size)
+
+    def get_cache_stats(self):
+        """Get the pattern cache statistics of the match workers, keyed by cache name."""
+        return self._get_pool().cache_stats()
+
+    def close(self):
+        """Stop the match worker pool."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
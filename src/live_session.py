@@ -0,0 +1,64 @@
+"""
+This module provides the state of a live session, a persistent connection of the web page for interactive matching.
+
+The page sends the whole state once and then only what changed with each edit: the pattern, the engine, the page of
+matches, and the text as a splice replacing a range of the previous text. Splices count code points, the text is
+checked against its expected length after every splice and the page resends it whole when they disagree.
+"""
+
+
+class ResyncRequired(ValueError):
+    """The text of the session does not match the edit, the page has to send the whole text again."""
+
+
+class LiveSession:
+    """
+    The pattern, text, engine and options of a live session, updated by the edit messages of the page.
+
+    An edit message is a dictionary with the sequence number `seq` of the edit and the changed fields: `regex`,
+    `engine`, `offset`, `profile` and either `text` with the whole text or `splice` with `[start, end, insert]` and the
+    `length` of the text after the splice.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.regex = ""
+        self.text = ""
+        self.engine = ""
+        self.offset = 0
+        self.profile = False
+        self.synced = False
+
+    def apply(self, message: dict):
+        """Applies an edit message to the session.
+
+        :param message: The edit message.
+        :type message: dict
+        :raises ResyncRequired: If the splice does not fit the text of the session.
+        :raises KeyError: If the message has no `seq`.
+        :raises TypeError, ValueError: If a field has the wrong type.
+        """
+        # Every field is checked before the session changes, a rejected edit leaves it as it was
+        seq = int(message["seq"])
+        offset = max(0, int(message.get("offset", self.offset)))
+        text = self.text
+        if "text" in message:
+            text = str(message["text"])
+        elif "splice" in message:
+            text = self._splice(message["splice"], int(message["length"]))
+        self.synced = self.synced or "text" in message
+        self.seq, self.text, self.offset = seq, text, offset
+        self.regex = str(message.get("regex", self.regex))
+        self.engine = str(message.get("engine", self.engine))
+        self.profile = bool(message.get("profile", self.profile))
+
+    def _splice(self, splice: list, length: int) -> str:
+        """Returns the text with the range `[start, end)` replaced by `insert`."""
+        start, end, insert = splice
+        start, end = int(start), int(end)
+        if not self.synced or not 0 <= start <= end <= len(self.text):
+            raise ResyncRequired(f"Splice {start}-{end} does not fit a text of {len(self.text)} characters.")
+        text = self.text[:start] + str(insert) + self.text[end:]
+        if len(text) != length:
+            raise ResyncRequired(f"The spliced text has {len(text)} characters instead of {length}.")
+        return text
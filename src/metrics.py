@@ -0,0 +1,290 @@
+"""
+This module provides application metrics shared by all application processes of a host.
+
+Counters and histograms are buffered in the recording process and added to a SQLite database in `OPENREGEX_CACHE_DIR`
+by a background timer `flush_interval` seconds after the first unflushed value. Every gunicorn worker contributes to
+the same totals and a scrape of any worker returns them. Gauges are stored per process and summed over the processes
+which are still alive. `render` formats the totals in the Prometheus text exposition format.
+"""
+
+import atexit
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+
+from project import Path, log
+
+METRICS_PATH = os.path.join(Path.CACHE, "metrics.sqlite3")
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# Name, type and help text of every metric, only registered metrics are rendered
+METRICS = {
+    "openregex_match_duration_seconds": ("histogram", "Duration of matches including the wait for a worker."),
+    "openregex_match_timeouts_total": ("counter", "Matches stopped by the timeout."),
+    "openregex_match_errors_total": ("counter", "Matches which returned an error, timeouts included."),
+    "openregex_pool_exhausted_total": ("counter", "Matches which found no free match worker within the timeout."),
+    "openregex_inflight_matches": ("gauge", "Matches currently running in the match workers."),
+    "openregex_worker_spawns_total": ("counter", "Match worker processes started."),
+    "openregex_worker_kills_total": (
+        "counter",
+        "Match worker processes killed: on timeout, on a broken pipe or as orphans of abandoned streams and cancelled "
+        "matches, e.g. superseded by a newer request of the same session.",
+    ),
+    "openregex_worker_recycles_total": ("counter", "Match worker processes stopped after serving their tasks."),
+    "openregex_worker_deaths_total": ("counter", "Match worker processes found dead, e.g. killed by the OOM killer."),
+    "openregex_pattern_cache_lookups_total": ("counter", "Compiled pattern cache lookups of the match workers."),
+    "openregex_result_cache_lookups_total": ("counter", "Result cache lookups."),
+    "openregex_request_size_bytes": ("histogram", "Size of the request bodies."),
+    "openregex_redos_patterns_total": ("counter", "Risky patterns found by the ReDoS analyzer, by risk and action."),
+    "openregex_admission_rejections_total": ("counter", "Match requests refused with 429, by reason."),
+    "openregex_coalesced_matches_total": (
+        "counter",
+        "Matches served from an identical concurrent match of this process or of another process of the host.",
+    ),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels)
+);
+CREATE TABLE IF NOT EXISTS gauges (
+    pid INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (pid, name, labels)
+);
+"""
+
+
+def _labels_key(labels: dict | None) -> str:
+    return json.dumps(sorted((labels or {}).items()))
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(labels: list) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _histogram_order(row: tuple) -> tuple:
+    """Orders the series of a histogram by their labels, then buckets by ascending bound, the sum and the count."""
+    name, labels, _ = row
+    other_labels = [label for label in labels if label[0] != "le"]
+    bound = float(dict(labels).get("le", "inf").replace("+Inf", "inf"))
+    return other_labels, not name.endswith("_bucket"), name.endswith("_count"), bound
+
+
+class Metrics:
+    """
+    Counters, histograms and gauges aggregated over all processes sharing a SQLite database.
+
+    Recording only buffers the values and never fails a request. Database errors are logged and the buffered values
+    are dropped.
+    """
+
+    def __init__(self, path: str = METRICS_PATH, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = defaultdict(float)
+        self._gauges = defaultdict(float)
+        self._gauges_changed = False
+        self._timer = None
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        """Drops the values buffered by the parent of a forked process, they are flushed by the parent."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._counters.clear()
+            self._gauges.clear()
+            self._timer = None
+
+    def _schedule_flush(self):
+        """Starts the flush timer of this process unless it is already waiting, called with the lock held."""
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def inc(self, name: str, labels: dict | None = None, value: float = 1.0):
+        """Increments a counter.
+
+        :param name: Name of a counter from `METRICS`.
+        :type name: str
+        :param labels: Labels of the series.
+        :type labels: dict | None
+        :param value: Increment, must not be negative.
+        :type value: float
+        """
+        with self._lock:
+            self._check_pid()
+            self._counters[(name, _labels_key(labels))] += value
+            self._schedule_flush()
+
+    def observe(self, name: str, value: float, labels: dict | None = None, buckets: tuple = LATENCY_BUCKETS):
+        """Records a value in a histogram with cumulative buckets.
+
+        :param name: Name of a histogram from `METRICS`.
+        :type name: str
+        :param value: The observed value.
+        :type value: float
+        :param labels: Labels of the series.
+        :type labels: dict | None
+        :param buckets: Upper bounds of the buckets, the same for every observation of the histogram.
+        :type buckets: tuple
+        """
+        labels = dict(labels or {})
+        with self._lock:
+            self._check_pid()
+            for bound in (*buckets, math.inf):
+                # Empty buckets are stored as well, every series of the histogram has all of its buckets
+                key = (f"{name}_bucket", _labels_key({**labels, "le": _format_value(bound)}))
+                self._counters[key] += value <= bound
+            self._counters[(f"{name}_sum", _labels_key(labels))] += value
+            self._counters[(f"{name}_count", _labels_key(labels))] += 1
+            self._schedule_flush()
+
+    def add(self, name: str, value: float, labels: dict | None = None):
+        """Adds to a gauge of this process, e.g. +1 when a match starts and -1 when it ends."""
+        with self._lock:
+            self._check_pid()
+            self._gauges[(name, _labels_key(labels))] += value
+            self._gauges_changed = True
+            self._schedule_flush()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def flush(self):
+        """Adds the buffered counters to the database and stores the gauges of this process."""
+        with self._lock:
+            self._check_pid()
+            self._timer = None
+            counters = list(self._counters.items())
+            self._counters.clear()
+            gauges = list(self._gauges.items()) if self._gauges_changed else []
+            self._gauges_changed = False
+        if not counters and not gauges:
+            return
+
+        pid = os.getpid()
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT INTO counters (name, labels, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                [(name, labels, value) for (name, labels), value in counters],
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO gauges (pid, name, labels, value) VALUES (?, ?, ?, ?)",
+                [(pid, name, labels, value) for (name, labels), value in gauges],
+            )
+            connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            log.warning(f"Metrics flush failed: {e}")
+            try:
+                self._connection().execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+
+    def collect(self) -> dict:
+        """Returns the totals of all processes keyed by series name and labels.
+
+        Gauges of processes which are no longer running are deleted.
+        """
+        self.flush()
+        totals = defaultdict(float)
+        try:
+            connection = self._connection()
+            for name, labels, value in connection.execute("SELECT name, labels, value FROM counters"):
+                totals[(name, labels)] += value
+            dead = set()
+            for pid, name, labels, value in connection.execute("SELECT pid, name, labels, value FROM gauges"):
+                if pid in dead or not _process_alive(pid):
+                    dead.add(pid)
+                    continue
+                totals[(name, labels)] += value
+            if dead:
+                connection.executemany("DELETE FROM gauges WHERE pid = ?", [(pid,) for pid in dead])
+        except sqlite3.Error as e:
+            log.warning(f"Metrics collection failed: {e}")
+        return dict(totals)
+
+    def render(self) -> str:
+        """Formats the totals of all processes in the Prometheus text exposition format."""
+        series = defaultdict(list)
+        for (name, labels), value in sorted(self.collect().items()):
+            base = name
+            for suffix in ("_bucket", "_sum", "_count"):
+                if name.endswith(suffix) and name[: -len(suffix)] in METRICS:
+                    base = name[: -len(suffix)]
+            series[base].append((name, json.loads(labels), value))
+
+        lines = []
+        for base, (metric_type, help_text) in METRICS.items():
+            lines.append(f"# HELP {base} {help_text}")
+            lines.append(f"# TYPE {base} {metric_type}")
+            rows = series.get(base, [])
+            if metric_type == "histogram":
+                rows.sort(key=_histogram_order)
+            for name, labels, value in rows:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        """Drops all recorded values."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+        try:
+            connection = self._connection()
+            connection.execute("DELETE FROM counters")
+            connection.execute("DELETE FROM gauges")
+        except sqlite3.Error as e:
+            log.warning(f"Metrics clear failed: {e}")
+
+
+metrics = Metrics()
+atexit.register(metrics.flush)
@@ -0,0 +1,722 @@
+"""
+This module provides a static analyzer of regex patterns for catastrophic backtracking (ReDoS).
+
+Every engine of OpenRegex backtracks, and some patterns take time exponential or polynomial in the length of the text
+when a match fails. The analyzer parses the pattern without running it and reports the shapes which cause it:
+
+* nested quantifiers - a repeated group with a variable quantifier inside which can match the same text as the rest
+  of the group, e.g. `(a+)+`, `(\\w+\\s?)*` or `(a{1,5})+`,
+* overlapping repetitions - a repeated group whose end can match the same text as its start on the next repetition,
+  e.g. `(\\s*,\\s*)*`,
+* ambiguous alternations under repetition - alternatives which can match the same text, or one of them a prefix of
+  the other followed by what comes after the alternation, e.g. `(a|aa)*` or `(\\w|\\d)+`,
+* overlapping quantifiers - unbounded quantifiers in a sequence, separated only by optional items, where the text at
+  the split between them could go to either, e.g. `\\d+\\.?\\d+` or `.*.*`.
+
+Possessive quantifiers and atomic groups do not backtrack and are not reported in the dialects supporting them. The
+analysis is a heuristic: it is linear in the length of the pattern, the results are cached and it is cheap enough to
+run before every match.
+"""
+
+import math
+import re
+import sys
+import unicodedata
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+
+RISK_NONE = "none"
+RISK_POLYNOMIAL = "polynomial"
+RISK_EXPONENTIAL = "exponential"
+_RISK_ORDER = {RISK_NONE: 0, RISK_POLYNOMIAL: 1, RISK_EXPONENTIAL: 2}
+
+# Syntax which differs between the engines, engines missing here use the defaults
+DIALECTS = {
+    "Python - re": {"possessive": sys.version_info >= (3, 11)},
+    "Python - regex": {"possessive": True},
+    "Java": {"possessive": True},
+    "JavaScript": {"possessive": False},
+    "C++": {"possessive": False},
+}
+_DEFAULT_DIALECT = {"possessive": False}
+
+# Characters tried when comparing character sets, together with the characters and range bounds of the sets
+_SAMPLE = "aZz09_ \t\n.,;:-/@!\"'()[]{}<>=+*?#$%&|\\^~éßΩж中🙂\x00"
+_POSIX = {
+    "alpha": str.isalpha,
+    "digit": str.isdigit,
+    "alnum": str.isalnum,
+    "upper": str.isupper,
+    "lower": str.islower,
+    "space": str.isspace,
+    "punct": lambda char: not char.isalnum() and not char.isspace() and char.isprintable(),
+}
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "f": "\f", "v": "\v", "a": "\a", "e": "\x1b"}
+_ANCHORS = set("bBAZzG")
+_QUANTIFIER = re.compile(r"\{(\d*)(?:(,)(\d*))?\}")
+_PROPERTY = re.compile(r"\\[pP](?:\{\^?([^}]*)\}|(\w))")
+# A bounded repeat of more iterations than this splits the text in as many ways as an unbounded one
+_EXPONENTIAL_REPEATS = 10
+
+
+@dataclass(frozen=True)
+class Finding:
+    """A part of the pattern which may backtrack catastrophically, `start` and `end` index the pattern."""
+
+    risk: str
+    kind: str
+    start: int
+    end: int
+    message: str
+
+
+@dataclass(frozen=True)
+class RedosReport:
+    """Risk of the whole pattern, the highest risk of its findings."""
+
+    risk: str = RISK_NONE
+    findings: tuple[Finding, ...] = field(default_factory=tuple)
+
+    def to_dict(self) -> dict:
+        return {"risk": self.risk, "findings": [asdict(finding) for finding in self.findings]}
+
+
+class _CharSet:
+    """Characters matched by one atom: literal characters, ranges and shorthand classes, possibly negated."""
+
+    __slots__ = ("chars", "ranges", "classes", "negated", "ignore_case", "_sample")
+
+    def __init__(self, chars="", ranges=(), classes=(), negated=False, ignore_case=False):
+        self.chars = frozenset(chars)
+        self.ranges = tuple(ranges)
+        self.classes = tuple(classes)
+        self.negated = negated
+        self.ignore_case = ignore_case
+        self._sample = None
+
+    def _contains(self, char: str) -> bool:
+        found = char in self.chars or any(low <= char <= high for low, high in self.ranges)
+        found = found or any(_class_contains(name, char) for name in self.classes)
+        return found != self.negated
+
+    def __contains__(self, char: str) -> bool:
+        if self.ignore_case:
+            return any(self._contains(variant) for variant in {char, char.lower(), char.upper()})
+        return self._contains(char)
+
+    def candidates(self) -> set:
+        return set(self.chars).union(*self.ranges)
+
+    def sample(self) -> frozenset:
+        """The characters of `_SAMPLE` in the set, computed once."""
+        if self._sample is None:
+            self._sample = frozenset(char for char in _SAMPLE if char in self)
+        return self._sample
+
+
+ANY = _CharSet(negated=True)
+
+
+@lru_cache(maxsize=4096)
+def _make_charset(chars: frozenset, ranges: tuple, classes: tuple, negated: bool, ignore_case: bool) -> _CharSet:
+    """Shares equal character sets between patterns, so their samples are computed once."""
+    return _CharSet(chars, ranges, classes, negated, ignore_case)
+
+
+def _class_contains(name: str, char: str) -> bool:
+    """Membership of a character in a shorthand, POSIX or Unicode property class."""
+    if name in "dws":
+        return {"d": char.isdigit(), "w": char.isalnum() or char == "_", "s": char.isspace()}[name]
+    if name in "DWS":
+        return not _class_contains(name.lower(), char)
+    if name == "h":
+        return char in " \t\xa0" or unicodedata.category(char) == "Zs"
+    if name in "vR":
+        return char in "\n\x0b\f\r\x85\u2028\u2029"
+    if name == ".":
+        return char != "\n"
+    if name.startswith("posix:"):
+        test = _POSIX.get(name[6:])
+        return test(char) if test else True
+    if name.startswith("property:"):
+        category = name[9:]
+        # General categories like L, Lu or N, unknown properties and scripts match everything
+        if 0 < len(category) <= 2 and category[0].isupper():
+            return unicodedata.category(char).startswith(category)
+        return True
+    return True
+
+
+def _overlap(first: tuple, second: tuple) -> bool:
+    """Tells if two unions of character sets have a character in common."""
+    if not first or not second:
+        return False
+    first_sample = frozenset().union(*(charset.sample() for charset in first))
+    if not first_sample.isdisjoint(frozenset().union(*(charset.sample() for charset in second))):
+        return True
+    candidates = set()
+    for charset in (*first, *second):
+        candidates |= charset.candidates()
+    return any(
+        any(char in charset for charset in first) and any(char in charset for charset in second) for char in candidates
+    )
+
+
+class _Node:
+    """A parsed part of the pattern with the properties used by the checks.
+
+    `backtracks` tells if the node holds a variable quantifier which can give back characters, `first`, `chars` and
+    `last` are unions of the character sets of its first, of all and of its last characters, `last` defaults to `first`.
+    """
+
+    __slots__ = ("kind", "start", "end", "min_length", "max_length", "first", "chars", "backtracks", "children", "last")
+
+    def __init__(
+        self,
+        kind,
+        start,
+        end,
+        min_length=0,
+        max_length=0,
+        first=(),
+        chars=(),
+        backtracks=False,
+        children=(),
+        last=None,
+    ):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.min_length = min_length
+        self.max_length = max_length
+        self.first = first
+        self.chars = chars
+        self.backtracks = backtracks
+        self.children = children
+        self.last = first if last is None else last
+
+
+def _leading(items, follow: tuple = ()) -> tuple:
+    """Union of the character sets the items can start with, `follow` when they can all match nothing."""
+    first = ()
+    for item in items:
+        first += item.first
+        if item.min_length:
+            return first
+    return first + follow
+
+
+def _atom(charset: _CharSet, start: int, end: int) -> _Node:
+    return _Node("atom", start, end, 1, 1, (charset,), (charset,))
+
+
+def _sequence(items: list, start: int, end: int) -> _Node:
+    if len(items) == 1:
+        return items[0]
+    return _Node(
+        "sequence",
+        start,
+        end,
+        sum(item.min_length for item in items),
+        sum(item.max_length for item in items),
+        _leading(items),
+        tuple(charset for item in items for charset in item.chars),
+        any(item.backtracks for item in items),
+        tuple(items),
+        _leading(reversed(items)),
+    )
+
+
+def _alternation(branches: list, start: int, end: int) -> _Node:
+    if len(branches) == 1:
+        return branches[0]
+    return _Node(
+        "alternation",
+        start,
+        end,
+        min(branch.min_length for branch in branches),
+        max(branch.max_length for branch in branches),
+        tuple(charset for branch in branches for charset in branch.first),
+        tuple(charset for branch in branches for charset in branch.chars),
+        any(branch.backtracks for branch in branches),
+        tuple(branches),
+        tuple(charset for branch in branches for charset in branch.last),
+    )
+
+
+def _direct_items(node: _Node) -> tuple:
+    """Items matched one after another by a node, looking through groups."""
+    while node.kind == "group":
+        node = node.children[0]
+    return node.children if node.kind == "sequence" else (node,)
+
+
+def _alternations(node: _Node, follow: tuple):
+    """Yields the alternations of a node which are not inside a quantifier or an atomic group, with the union of the
+    character sets which can follow them, `follow` after the end of the node."""
+    if node.kind == "alternation":
+        yield node, follow
+    if node.kind in ("alternation", "group"):
+        for child in node.children:
+            yield from _alternations(child, follow)
+    elif node.kind == "sequence":
+        for index, child in enumerate(node.children, start=1):
+            yield from _alternations(child, _leading(node.children[index:], follow))
+
+
+def _fixed_prefix(node: _Node) -> tuple[list, bool]:
+    """Character sets of the single characters a node starts with, and whether they are all it matches."""
+    prefix = []
+    for item in _direct_items(node):
+        if item.kind == "atom":
+            prefix.append(item.first[0])
+            continue
+        if item.kind in ("group", "sequence"):
+            item_prefix, complete = _fixed_prefix(item)
+            prefix += item_prefix
+            if complete:
+                continue
+        elif item.kind == "empty":
+            continue
+        return prefix, False
+    return prefix, True
+
+
+def _ambiguous(first: _Node, second: _Node, follow: tuple) -> bool:
+    """Tells if two alternatives can match the same text, or one of them a prefix of the other and `follow` the rest.
+
+    The alternatives are compared character by character as far as both start with single characters, anything else
+    after that is taken as ambiguous.
+    """
+    first_prefix, first_complete = _fixed_prefix(first)
+    second_prefix, second_complete = _fixed_prefix(second)
+    length = min(len(first_prefix), len(second_prefix))
+    if any(not _overlap((first_prefix[i],), (second_prefix[i],)) for i in range(length)):
+        return False
+    first_ends = first_complete and len(first_prefix) == length
+    second_ends = second_complete and len(second_prefix) == length
+    if first_ends and second_ends:
+        return True
+    if first_ends and len(second_prefix) > length:
+        return _overlap((second_prefix[length],), follow)
+    if second_ends and len(first_prefix) > length:
+        return _overlap((first_prefix[length],), follow)
+    return True
+
+
+def _overlapping(items) -> list:
+    """Indices of the pairs of unbounded quantifiers in a sequence of items which are separated only by optional items
+    and can both match a character at the split between them."""
+    pairs = []
+    unbounded = []
+    for index, item in enumerate(items):
+        if item.backtracks and item.max_length == math.inf:
+            pairs += [
+                (previous, index)
+                for previous in unbounded
+                if _overlap(items[previous].chars, item.first) and _overlap(items[previous].last, item.chars)
+            ]
+            # A mandatory quantifier separates the quantifiers before it from the ones after it
+            unbounded = [*unbounded, index] if not item.min_length else [index]
+        elif item.min_length:
+            unbounded = []
+    return pairs
+
+
+class _Parser:
+    """Recursive descent parser of the syntax shared by the engines, collecting the findings while it parses."""
+
+    def __init__(self, pattern: str, flags: int, dialect: dict):
+        self.pattern = pattern
+        self.position = 0
+        self.ignore_case = bool(flags & re.IGNORECASE)
+        self.verbose = bool(flags & re.VERBOSE)
+        self.dot_all = bool(flags & re.DOTALL)
+        self.possessive = dialect["possessive"]
+        self.findings = []
+
+    def _peek(self, offset: int = 0) -> str:
+        index = self.position + offset
+        return self.pattern[index] if index < len(self.pattern) else ""
+
+    def _skip_verbose(self):
+        while self.verbose and self.position < len(self.pattern):
+            if self._peek().isspace():
+                self.position += 1
+            elif self._peek() == "#":
+                newline = self.pattern.find("\n", self.position)
+                self.position = len(self.pattern) if newline < 0 else newline + 1
+            else:
+                break
+
+    def _charset(self, chars="", ranges=(), classes=(), negated=False) -> _CharSet:
+        return _make_charset(frozenset(chars), tuple(ranges), tuple(classes), negated, self.ignore_case)
+
+    def parse(self) -> _Node:
+        node = self._alternation()
+        while self.position < len(self.pattern):
+            # An unbalanced closing parenthesis, the engine reports the error, the rest is analyzed on its own
+            self.position += 1
+            node = _sequence([node, self._alternation()], 0, self.position)
+        return node
+
+    def _alternation(self) -> _Node:
+        start = self.position
+        branches = [self._sequence()]
+        while self._peek() == "|":
+            self.position += 1
+            branches.append(self._sequence())
+        return _alternation(branches, start, self.position)
+
+    def _sequence(self) -> _Node:
+        start = self.position
+        items = []
+        while True:
+            self._skip_verbose()
+            if self._peek() in ("", "|", ")"):
+                break
+            items.append(self._quantified(self._atom()))
+        self._check_overlapping(items)
+        if not items:
+            return _Node("empty", start, start)
+        return _sequence(items, start, self.position)
+
+    def _quantified(self, node: _Node) -> _Node:
+        self._skip_verbose()
+        char = self._peek()
+        if char in ("*", "+", "?"):
+            low, high = {"*": (0, math.inf), "+": (1, math.inf), "?": (0, 1)}[char]
+            self.position += 1
+        elif char == "{" and (quantifier := _QUANTIFIER.match(self.pattern, self.position)):
+            low = int(quantifier.group(1) or 0)
+            if quantifier.group(2) is None:
+                high = low
+            else:
+                high = int(quantifier.group(3)) if quantifier.group(3) else math.inf
+            self.position = quantifier.end()
+        else:
+            return node
+
+        possessive = False
+        if self._peek() == "?":
+            self.position += 1
+        elif self._peek() == "+" and self.possessive:
+            possessive = True
+            self.position += 1
+
+        repeat = _Node(
+            "repeat",
+            node.start,
+            self.position,
+            node.min_length * low,
+            node.max_length * high if node.max_length else 0,
+            node.first,
+            node.chars,
+            not possessive and (node.backtracks or (low < high and node.max_length > 0)),
+            (node,),
+            node.last,
+        )
+        if not possessive and high > 1 and node.max_length > 0:
+            self._check_repeat(repeat, node, high)
+        return self._quantified(repeat)
+
+    def _add(self, risk: str, kind: str, node: _Node, message: str):
+        self.findings.append(Finding(risk, kind, node.start, node.end, message))
+
+    def _check_repeat(self, repeat: _Node, body: _Node, high: float):
+        """Reports a repeated body which can match the same text in more than one way."""
+        # A bounded repeat tries at most `high` splits, the time is polynomial in the length of the text
+        risk = RISK_EXPONENTIAL if high > _EXPONENTIAL_REPEATS else RISK_POLYNOMIAL
+        items = _direct_items(body)
+        for item in items:
+            if not item.backtracks:
+                continue
+            others = [other for other in items if other is not item]
+            if all(not other.min_length or _overlap(other.chars, item.chars) for other in others):
+                self._add(
+                    risk,
+                    "nested_quantifier",
+                    repeat,
+                    "A quantifier inside a repeated group can match the same text as the repetition of the group.",
+                )
+                return
+
+        # The items at the end of one iteration are followed by the items at the start of the next one
+        if any(previous < len(items) <= index for previous, index in _overlapping(items + items)):
+            self._add(
+                risk,
+                "overlapping_repetitions",
+                repeat,
+                "The end of a repeated group can match the same text as its start on the next repetition.",
+            )
+            return
+
+        # After the last alternative of an iteration comes the next iteration
+        for alternation, follow in _alternations(body, body.first):
+            branches = [branch for branch in alternation.children if branch.first]
+            for index, branch in enumerate(branches):
+                if any(
+                    _overlap(branch.first, other.first) and _ambiguous(other, branch, follow)
+                    for other in branches[:index]
+                ):
+                    self._add(
+                        risk,
+                        "ambiguous_alternation",
+                        repeat,
+                        "Alternatives inside a repeated group can match the same text.",
+                    )
+                    return
+
+    def _check_overlapping(self, items: list):
+        """Reports unbounded quantifiers separated only by optional items where the characters the first one can give
+        back can be taken by the second one: both can match a character at the split."""
+        for previous, index in _overlapping(items):
+            self._add(
+                RISK_POLYNOMIAL,
+                "overlapping_quantifiers",
+                _Node("span", items[previous].start, items[index].end),
+                "Adjacent quantifiers can match the same characters, the split between them is ambiguous.",
+            )
+            return
+
+    def _atom(self) -> _Node:
+        start = self.position
+        char = self._peek()
+        self.position += 1
+        if char == "(":
+            return self._group(start)
+        if char == "[":
+            return _atom(self._class(), start, self.position)
+        if char == "\\":
+            return self._escape(start)
+        if char in ("^", "$"):
+            return _Node("anchor", start, self.position)
+        if char == ".":
+            charset = ANY if self.dot_all else self._charset(classes=(".",))
+            return _atom(charset, start, self.position)
+        return _atom(self._charset(chars=char), start, self.position)
+
+    def _skip_past(self, closing: str, offset: int = 0):
+        """Moves after the next `closing` string, to the end of the pattern if there is none."""
+        end = self.pattern.find(closing, self.position + offset)
+        self.position = len(self.pattern) if end < 0 else end + len(closing)
+
+    def _group_kind(self, start: int):
+        """Parses the `?` prefix of a group and returns its kind, or the whole node of groups matching no pattern."""
+        self.position += 1
+        marker = self._peek()
+        if marker == "#":
+            self._skip_past(")")
+            return _Node("empty", start, self.position)
+        if marker in ("=", "!") or self.pattern.startswith(("<=", "<!"), self.position):
+            self.position += 1 if marker in ("=", "!") else 2
+            return "lookaround"
+        if marker in (">", "|"):
+            self.position += 1
+            return "atomic" if marker == ">" and self.possessive else "group"
+        if marker == "P" and self._peek(1) in ("=", ">"):
+            # A backreference or a call of a named group
+            self._skip_past(")")
+            return _Node("reference", start, self.position, 0, math.inf, (ANY,), (ANY,))
+        if marker in ("P", "<", "'"):
+            self._skip_past({"P": ">", "<": ">", "'": "'"}[marker], offset=1)
+            return "group"
+        if marker in ("R", "&") or marker.isdigit() or marker in ("+", "-") and self._peek(1).isdigit():
+            # Recursion, the analyzer cannot tell what it matches
+            self._skip_past(")")
+            return _Node("reference", start, self.position, 0, math.inf, (ANY,), (ANY,), True)
+        return self._inline_flags(start)
+
+    def _group(self, start: int) -> _Node:
+        kind = self._group_kind(start) if self._peek() == "?" else "group"
+        if isinstance(kind, _Node):
+            return kind
+
+        node = self._alternation()
+        if self._peek() == ")":
+            self.position += 1
+        if kind == "lookaround":
+            return _Node("anchor", start, self.position)
+        # An atomic group gives back nothing, the checks do not look into it
+        atomic = kind == "atomic"
+        return _Node(
+            kind,
+            start,
+            self.position,
+            node.min_length,
+            node.max_length,
+            node.first,
+            node.chars,
+            node.backtracks and not atomic,
+            () if atomic else (node,),
+            node.last,
+        )
+
+    def _inline_flags(self, start: int) -> _Node:
+        """Parses `(?flags)`, which applies to the rest of the pattern, and `(?flags:...)`, which applies to a group."""
+        flags = ""
+        while self._peek() and self._peek() not in (":", ")"):
+            flags += self._peek()
+            self.position += 1
+        enabled = flags.split("-")[0]
+        disabled = flags.split("-")[1] if "-" in flags else ""
+        saved = self.ignore_case, self.verbose, self.dot_all
+        for letter, value in [(letter, True) for letter in enabled] + [(letter, False) for letter in disabled]:
+            if letter == "i":
+                self.ignore_case = value
+            elif letter == "x":
+                self.verbose = value
+            elif letter == "s":
+                self.dot_all = value
+        closing = self._peek()
+        self.position += 1
+        if closing != ":":
+            return _Node("empty", start, self.position)
+
+        node = self._alternation()
+        if self._peek() == ")":
+            self.position += 1
+        self.ignore_case, self.verbose, self.dot_all = saved
+        return _Node(
+            "group",
+            start,
+            self.position,
+            node.min_length,
+            node.max_length,
+            node.first,
+            node.chars,
+            node.backtracks,
+            (node,),
+            node.last,
+        )
+
+    def _escape(self, start: int) -> _Node:
+        char = self._peek()
+        self.position += 1
+        if char in "dwsDWShvR":
+            return _atom(self._charset(classes=(char,)), start, self.position)
+        if char in "pP" and (prop := self._property(start)):
+            return _atom(self._charset(classes=(prop[0],), negated=prop[1]), start, self.position)
+        if char in _ANCHORS:
+            return _Node("anchor", start, self.position)
+        if char.isdigit() and char != "0" or char in ("k", "g"):
+            # A backreference matches the text of its group, which can be anything
+            while self._peek().isdigit() or self._peek() in ("<", "{", "'") and char in ("k", "g"):
+                if self._peek() in ("<", "{", "'"):
+                    closing = {"<": ">", "{": "}", "'": "'"}[self._peek()]
+                    end = self.pattern.find(closing, self.position + 1)
+                    self.position = len(self.pattern) if end < 0 else end + 1
+                    break
+                self.position += 1
+            return _Node("reference", start, self.position, 0, math.inf, (ANY,), (ANY,))
+        if char == "Q":
+            literal_start = self.position
+            self._skip_past("\\E")
+            literal = self.pattern[literal_start:].split("\\E", 1)[0]
+            items = [_atom(self._charset(chars=letter), start, self.position) for letter in literal]
+            return _sequence(items, start, self.position) if items else _Node("empty", start, self.position)
+        return _atom(self._charset(chars=self._escaped_char(char)), start, self.position)
+
+    def _escaped_char(self, char: str) -> str:
+        """Reads the character of an escape like `\\x41`, `\\u0041` or `\\n`, the escaped character otherwise."""
+        if char in ("x", "u"):
+            digits_start = self.position
+            if self._peek() == "{":
+                self._skip_past("}")
+            else:
+                self.position = min(digits_start + (2 if char == "x" else 4), len(self.pattern))
+            end = self.position
+            digits = self.pattern[digits_start:end].strip("{}")
+            try:
+                return chr(int(digits, 16))
+            except (ValueError, OverflowError):
+                return char
+        if char == "c" and self._peek():
+            self.position += 1
+            return chr(ord(self.pattern[self.position - 1]) % 32)
+        return _ESCAPES.get(char, char)
+
+    def _property(self, start: int) -> tuple[str, bool] | None:
+        """Reads a Unicode property like `\\p{L}` or `\\PL` starting at `start`, returns its class and negation."""
+        prop = _PROPERTY.match(self.pattern, start)
+        if prop is None:
+            return None
+        self.position = prop.end()
+        name = prop.group(1) if prop.group(1) is not None else prop.group(2)
+        negated = prop.group(0).startswith("\\P") != ("{^" in prop.group(0))
+        return f"property:{name}", negated
+
+    def _class(self) -> _CharSet:
+        """Parses a character class after its `[`, nested classes and set operations are merged into a union."""
+        negated = self._peek() == "^"
+        if negated:
+            self.position += 1
+        members = {"chars": set(), "ranges": [], "classes": []}
+        first = True
+        while self.position < len(self.pattern):
+            if self._peek() == "]" and not first:
+                self.position += 1
+                break
+            first = False
+            self._class_member(members)
+        return self._charset(negated=negated, **members)
+
+    def _class_member(self, members: dict):
+        """Parses one character, range, shorthand or nested class of a character class into `members`."""
+        char = self._peek()
+        if char == "[" and self._peek(1) == ":" and (end := self.pattern.find(":]", self.position)) > 0:
+            name_start = self.position + 2
+            members["classes"].append(f"posix:{self.pattern[name_start:end]}")
+            self.position = end + 2
+            return
+        self.position += 1
+        if char == "[":
+            # A nested class of Java or the regex module, a negated one may match anything
+            nested = self._class()
+            members["chars"] |= nested.chars
+            members["ranges"] += nested.ranges
+            members["classes"] += (*nested.classes, "any") if nested.negated else nested.classes
+            return
+        if char == "\\":
+            escaped = self._peek()
+            self.position += 1
+            if escaped in "dwsDWShv":
+                members["classes"].append(escaped)
+                return
+            if escaped in "pP" and (prop := self._property(self.position - 2)):
+                members["classes"].append("any" if prop[1] else prop[0])
+                return
+            char = self._escaped_char(escaped) if escaped != "b" else "\b"
+        if self._peek() == "-" and self._peek(1) not in ("]", ""):
+            high = self._peek(1)
+            self.position += 2
+            if high == "\\":
+                self.position += 1
+                high = self._escaped_char(self.pattern[self.position - 1])
+            members["ranges"].append((char, high))
+        else:
+            members["chars"].add(char)
+
+
+@lru_cache(maxsize=4096)
+def analyze(pattern: str, engine: str = "", flags: int = 0) -> RedosReport:
+    """Analyzes a pattern for catastrophic backtracking without running it.
+
+    :param pattern: The regex pattern.
+    :type pattern: str
+    :param engine: Name of the engine whose dialect the pattern is written in.
+    :type engine: str
+    :param flags: Python flags of the match, `IGNORECASE`, `VERBOSE` and `DOTALL` are taken into account.
+    :type flags: int
+    :return: The risk of the pattern and the findings, ordered by their position in the pattern.
+    :rtype: RedosReport
+    """
+    parser = _Parser(pattern, flags, DIALECTS.get(engine, _DEFAULT_DIALECT))
+    try:
+        parser.parse()
+    except RecursionError:
+        # Too deeply nested to analyze, the engines are likely to refuse it as well
+        return RedosReport()
+    findings = tuple(sorted(parser.findings, key=lambda finding: (finding.start, finding.end)))
+    risk = max((finding.risk for finding in findings), key=_RISK_ORDER.get, default=RISK_NONE)
+    return RedosReport(risk, findings)
@@ -0,0 +1,196 @@
+"""
+This module provides a result cache shared by all application processes of a host.
+
+Results are stored in a local SQLite database keyed by a hash of the engine, its version, the pattern, the flags and
+the text. The database is bounded by the total size of the stored results, the least recently used ones are evicted.
+Triggers keep a running total of the size, so a store only looks at the oldest results when it goes over the budget.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from project import Config, Path, log
+from src.text_store import TextHandle
+
+RESULT_CACHE_PATH = os.path.join(Path.CACHE, "results.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS total (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    size INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results BEGIN
+    UPDATE total SET size = size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results BEGIN
+    UPDATE total SET size = size - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS results_update AFTER UPDATE OF size ON results BEGIN
+    UPDATE total SET size = size - OLD.size + NEW.size;
+END;
+INSERT OR IGNORE INTO total (id, size) SELECT 0, COALESCE(SUM(size), 0) FROM results;
+COMMIT;
+"""
+
+_PUT = """
+INSERT INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, accessed = excluded.accessed
+"""
+
+# Seconds a hit does not move the access time of a result again, most hits are then only reads
+ACCESS_INTERVAL = 5.0
+
+
+class ResultCache:
+    """
+    Size-bounded, least recently used cache of match results in a SQLite database.
+
+    Every thread gets its own connection, a connection is never shared with a forked child. Database errors are
+    logged and treated as a miss, the cache never fails a request.
+    """
+
+    def __init__(
+        self,
+        path: str = RESULT_CACHE_PATH,
+        max_bytes: int = Config.result_cache_mb * 1024 * 1024,
+        access_interval: float = ACCESS_INTERVAL,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.access_interval = access_interval
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether results are cached at all."""
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(
+        engine: str, version: str, pattern: str, flags: int, text: str | TextHandle, limit: int = 0, offset: int = 0
+    ) -> str:
+        """Hashes the inputs of a match into a cache key.
+
+        An uploaded text is keyed by its handle, the SHA-256 of its content, so a large text is not hashed again.
+
+        :param engine: Name of the engine.
+        :type engine: str
+        :param version: Version of the engine, results of another version are never reused.
+        :type version: str
+        :param pattern: The regex pattern.
+        :type pattern: str
+        :param flags: The regex flags.
+        :type flags: int
+        :param text: The matched text or the handle of an uploaded text.
+        :type text: str | TextHandle
+        :param limit: Page size of the result, 0 for all matches.
+        :type limit: int
+        :param offset: Number of skipped matches.
+        :type offset: int
+        :return: Hex digest of the inputs.
+        :rtype: str
+        """
+        kind = "text"
+        if isinstance(text, TextHandle):
+            kind, text = "handle", text.handle
+        digest = hashlib.sha256()
+        for part in (engine, version, pattern, str(flags), str(limit), str(offset), kind, text):
+            data = part.encode("utf-8", "surrogatepass")
+            # Length prefixes keep the parts apart, ("ab", "c") and ("a", "bc") never collide
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: str) -> dict | None:
+        """Gets a cached result and marks it as recently used, unless it was within `access_interval` seconds.
+
+        :param key: Key from `make_key`.
+        :type key: str
+        :return: The cached result, None on a miss.
+        :rtype: dict | None
+        """
+        if not self.enabled:
+            return None
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT value, accessed FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] >= self.access_interval:
+                connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            log.warning(f"Result cache lookup failed: {e}")
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        """Stores a result and evicts the least recently used results beyond the byte budget.
+
+        :param key: Key from `make_key`.
+        :type key: str
+        :param value: JSON serializable result.
+        :type value: dict
+        """
+        if not self.enabled:
+            return
+        data = json.dumps(value).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(_PUT, (key, data, len(data), time.time()))
+                excess = connection.execute("SELECT size FROM total").fetchone()[0] - self.max_bytes
+                if excess > 0:
+                    self._evict(connection, excess)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        except sqlite3.Error as e:
+            log.warning(f"Result cache store failed: {e}")
+
+    @staticmethod
+    def _evict(connection: sqlite3.Connection, excess: int):
+        """Deletes the least recently used results until at least `excess` bytes are freed."""
+        keys = []
+        for key, size in connection.execute("SELECT key, size FROM results ORDER BY accessed, key"):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany("DELETE FROM results WHERE key = ?", keys)
+
+    def clear(self):
+        """Drops all cached results."""
+        try:
+            self._connection().execute("DELETE FROM results")
+        except sqlite3.Error as e:
+            log.warning(f"Result cache clear failed: {e}")
@@ -0,0 +1,211 @@
+"""
+This module tracks the latest match request of every browser session, shared by all application processes of a host.
+
+The web page sends a session id and a sequence number which grows with every match request. The highest sequence
+number of each session is stored in a SQLite database in `OPENREGEX_CACHE_DIR`. A running match of a session is
+cancelled as soon as a newer request of the session arrives, whichever process serves it, so the match worker stops
+working on a result nobody waits for. A newer request in the same process wakes the running match directly, requests
+served by other processes are noticed by one watcher thread per process, which reads the sessions of its running
+matches only when `PRAGMA data_version` shows that another connection changed the database.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from project import Path, log
+
+SESSIONS_PATH = os.path.join(Path.CACHE, "sessions.sqlite3")
+# Sessions without a request for this many seconds are forgotten
+SESSION_TTL = 3600
+POLL_INTERVAL = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+"""
+
+
+class Superseded(Exception):
+    """A newer request of the same session arrived, the result of this one is no longer wanted."""
+
+
+class MatchSessions:
+    """
+    Latest request sequence number of every session in a SQLite database.
+
+    Database errors are logged and the request is treated as the latest one, a request is never refused by mistake.
+    """
+
+    def __init__(self, path: str = SESSIONS_PATH, poll_interval: float = POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        # Running matches of this process by session, each with its sequence number, event loop and wake-up event
+        self._waiters = {}
+        self._waiters_lock = threading.Lock()
+        self._watcher = None
+        self._pid = os.getpid()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def begin(self, session: str, seq: int):
+        """Registers a request of the session, it supersedes the requests with lower sequence numbers.
+
+        :param session: Id of the browser session.
+        :type session: str
+        :param seq: Sequence number of the request within the session.
+        :type seq: int
+        :raises Superseded: If a newer request of the session arrived first.
+        """
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT INTO sessions (session, seq, updated) VALUES (?, ?, ?) ON CONFLICT (session) DO UPDATE SET "
+                "seq = excluded.seq, updated = excluded.updated WHERE excluded.seq > sessions.seq",
+                (session, seq, now),
+            )
+            connection.execute("DELETE FROM sessions WHERE updated < ?", (now - SESSION_TTL,))
+        except sqlite3.Error as e:
+            log.warning(f"Session registration failed: {e}")
+            return
+        self._wake(session, seq)
+        if self.is_superseded(session, seq):
+            raise Superseded(f"Request {seq} of the session was superseded before it started.")
+
+    def is_superseded(self, session: str, seq: int) -> bool:
+        """Whether a request with a higher sequence number of the session arrived."""
+        try:
+            row = self._connection().execute("SELECT seq FROM sessions WHERE session = ?", (session,)).fetchone()
+        except sqlite3.Error as e:
+            log.warning(f"Session lookup failed: {e}")
+            return False
+        return row is not None and row[0] > seq
+
+    async def run(self, session: str, seq: int, awaitable):
+        """Awaits the awaitable, cancelling it when a newer request of the session arrives.
+
+        :param session: Id of the browser session.
+        :type session: str
+        :param seq: Sequence number of the request within the session.
+        :type seq: int
+        :param awaitable: The match, e.g. `EngineManager.match_async`.
+        :type awaitable: Awaitable
+        :return: The result of the awaitable.
+        :raises Superseded: If the awaitable was cancelled for a newer request.
+        """
+        task = asyncio.ensure_future(awaitable)
+        superseded = asyncio.Event()
+        waiter = (seq, asyncio.get_running_loop(), superseded)
+        self._watch(session, waiter)
+        try:
+            # A newer request which arrived before the watcher knew about this match
+            if self.is_superseded(session, seq):
+                superseded.set()
+            notified = asyncio.ensure_future(superseded.wait())
+            try:
+                await asyncio.wait({task, notified}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                notified.cancel()
+            if task.done():
+                return task.result()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            raise Superseded(f"Request {seq} of the session was superseded while it was running.")
+        finally:
+            self._unwatch(session, waiter)
+            # The request itself was cancelled
+            if not task.done():
+                task.cancel()
+
+    def _watch(self, session: str, waiter: tuple):
+        """Registers a running match and starts the watcher thread of the process if it is not running."""
+        with self._waiters_lock:
+            if self._pid != os.getpid():
+                # A forked child has neither the running matches nor the watcher thread of its parent
+                self._waiters, self._watcher, self._pid = {}, None, os.getpid()
+            self._waiters.setdefault(session, []).append(waiter)
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch_database, name="SessionWatcher", daemon=True)
+                self._watcher.start()
+
+    def _unwatch(self, session: str, waiter: tuple):
+        with self._waiters_lock:
+            waiters = self._waiters.get(session, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(session, None)
+
+    def _wake(self, session: str, latest: int):
+        """Wakes the running matches of the session with a sequence number lower than `latest`."""
+        with self._waiters_lock:
+            waiters = list(self._waiters.get(session, []))
+        for seq, loop, superseded in waiters:
+            if seq < latest:
+                try:
+                    loop.call_soon_threadsafe(superseded.set)
+                except RuntimeError:
+                    # The loop of the match closed, it has ended
+                    pass
+
+    def _watch_database(self):
+        """Wakes running matches superseded by requests of other processes, while this process has running matches.
+
+        The data version of the connection changes only when another connection commits, so the sessions are read
+        only after a request or a cleanup of another connection.
+        """
+        data_version = None
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                connection = self._connection()
+                # The version is read before the running matches, a match registered later checks the database itself
+                version = connection.execute("PRAGMA data_version").fetchone()[0]
+                with self._waiters_lock:
+                    if not self._waiters:
+                        self._watcher = None
+                        return
+                    sessions = list(self._waiters)
+                if version == data_version:
+                    continue
+                data_version = version
+                for session, latest in self._latest(connection, sessions):
+                    self._wake(session, latest)
+            except sqlite3.Error as e:
+                log.warning(f"Session watch failed: {e}")
+
+    @staticmethod
+    def _latest(connection: sqlite3.Connection, sessions: list) -> list:
+        """Returns the latest sequence number of each of the sessions."""
+        placeholders = ", ".join("?" * len(sessions))
+        query = f"SELECT session, seq FROM sessions WHERE session IN ({placeholders})"
+        return connection.execute(query, sessions).fetchall()
+
+    def clear(self):
+        """Forgets all sessions."""
+        try:
+            self._connection().execute("DELETE FROM sessions")
+        except sqlite3.Error as e:
+            log.warning(f"Session clear failed: {e}")
@@ -0,0 +1,165 @@
+"""
+This module provides single-flight coalescing of identical concurrent computations, e.g. matches of the same pattern
+and text requested by many clients following the same link.
+
+Within a process the first caller of a key runs the computation and the callers arriving while it runs wait for its
+result. Across the processes of a host, the running computation holds a lock on one byte of a lock file in
+`OPENREGEX_CACHE_DIR`, at an offset derived from the key. A process finding the byte locked waits for the lock and then
+looks the result up, e.g. in the result cache, before computing it itself.
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, computations are only coalesced within a process
+    fcntl = None
+
+from project import Config, Path, log
+
+LOCK_PATH = os.path.join(Path.CACHE, "single_flight.lock")
+
+# Coalescing modes: nothing, callers within one process, callers in all processes of the host
+MODE_OFF = "off"
+MODE_PROCESS = "process"
+MODE_HOST = "host"
+
+# Origins of a result: computed by this caller, by another caller in this process, found after another process
+ORIGIN_LEADER = "leader"
+ORIGIN_PROCESS = "process"
+ORIGIN_HOST = "host"
+
+_FAILED = object()
+_POLL_INTERVALS = (0.002, 0.005, 0.01, 0.02, 0.05)
+
+
+def _lock_offset(key: str) -> int:
+    """Byte of the lock file locked for a key, 56 bits keep collisions of different keys negligible."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8", "surrogatepass"), digest_size=7).digest(), "big")
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time and shares its result with the callers waiting for it.
+
+    Results are shared, not copied, callers must not modify them. If the computation fails the waiting callers run
+    it themselves, so an error specific to one caller is never handed to the others.
+    """
+
+    def __init__(self, lock_path: str = LOCK_PATH, mode: str = Config.single_flight):
+        self.lock_path = lock_path
+        self.mode = mode if mode in (MODE_PROCESS, MODE_HOST) else MODE_OFF
+        if self.mode == MODE_HOST and fcntl is None:
+            log.warning("File locks are not available, identical matches are only coalesced within a process")
+            self.mode = MODE_PROCESS
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._fd = None
+        self._fd_pid = None
+
+    async def run(self, key: str, compute, lookup=None, wait: float = Config.regex_timeout) -> tuple:
+        """Returns the result of `compute` for the key, shared with the concurrent callers of the same key.
+
+        :param key: Identity of the computation.
+        :type key: str
+        :param compute: Function without arguments returning an awaitable of the result.
+        :type compute: Callable[[], Awaitable]
+        :param lookup: Function without arguments returning the stored result of another process or None, without
+                       it computations are only coalesced within the process.
+        :type lookup: Callable[[], Any] | None
+        :param wait: Seconds to wait for the computation of another process before computing anyway.
+        :type wait: float
+        :return: The result and its origin: `leader`, `process` or `host`.
+        :rtype: tuple
+        """
+        if self.mode == MODE_OFF:
+            return await compute(), ORIGIN_LEADER
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = concurrent.futures.Future()
+        if not leader:
+            result = await asyncio.wrap_future(flight)
+            if result is _FAILED:
+                return await compute(), ORIGIN_LEADER
+            return result, ORIGIN_PROCESS
+
+        result = _FAILED
+        try:
+            result, origin = await self._run_locked(key, compute, lookup, wait)
+            return result, origin
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.set_result(result)
+
+    async def _run_locked(self, key: str, compute, lookup, wait: float) -> tuple:
+        """Runs the computation holding the lock of the key in the lock file of the host."""
+        if self.mode != MODE_HOST or lookup is None:
+            # Another process has no way to share its result, waiting for it would only delay this one
+            return await compute(), ORIGIN_LEADER
+        offset = _lock_offset(key)
+        fd = self._lock_file()
+        if fd is None:
+            return await compute(), ORIGIN_LEADER
+        if not self._try_lock(fd, offset):
+            locked = await self._wait_lock(fd, offset, wait)
+            result = lookup()
+            if result is not None:
+                if locked:
+                    self._unlock(fd, offset)
+                return result, ORIGIN_HOST
+            if not locked:
+                return await compute(), ORIGIN_LEADER
+        try:
+            return await compute(), ORIGIN_LEADER
+        finally:
+            self._unlock(fd, offset)
+
+    def _lock_file(self) -> int | None:
+        """Returns the descriptor of the lock file of this process.
+
+        It stays open: closing any descriptor of the file releases all locks the process holds on it.
+        """
+        with self._lock:
+            if self._fd is None or self._fd_pid != os.getpid():
+                try:
+                    os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+                    self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+                    self._fd_pid = os.getpid()
+                except OSError as e:
+                    log.warning(f"Single-flight lock file is not available: {e}")
+                    return None
+            return self._fd
+
+    @staticmethod
+    def _try_lock(fd: int, offset: int) -> bool:
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset, os.SEEK_SET)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _unlock(fd: int, offset: int):
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset, os.SEEK_SET)
+        except OSError as e:
+            log.warning(f"Single-flight unlock failed: {e}")
+
+    async def _wait_lock(self, fd: int, offset: int, wait: float) -> bool:
+        """Polls the lock of another process until it is released or `wait` seconds passed, returns if it is held."""
+        deadline = time.monotonic() + wait
+        attempt = 0
+        while time.monotonic() < deadline:
+            await asyncio.sleep(_POLL_INTERVALS[min(attempt, len(_POLL_INTERVALS) - 1)])
+            attempt += 1
+            if self._try_lock(fd, offset):
+                return True
+        return False
@@ -0,0 +1,170 @@
+"""
+This module provides a local store for large input texts, so they are uploaded once and matched many times.
+
+Texts are spooled to files named by the SHA-256 of their content in `OPENREGEX_CACHE_DIR`, shared by all application
+and match worker processes of a host. A request carries only the handle, the match worker maps the file itself instead
+of receiving the text through its pipe. The store is bounded by the total size of the texts, the least recently used
+ones are deleted first.
+"""
+
+import codecs
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from project import Config, Path, log
+
+TEXT_STORE_PATH = os.path.join(Path.CACHE, "texts")
+
+_HANDLE_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class TextTooLargeError(ValueError):
+    """Raised when an uploaded text exceeds the upload limit."""
+
+
+@dataclass(frozen=True)
+class TextHandle:
+    """Reference to a stored text, sent to the match workers in place of the text."""
+
+    handle: str
+
+
+class TextStore:
+    """
+    Content-addressed, size-bounded store of UTF-8 texts on disk.
+
+    The last `recent_size` decoded texts are kept in memory, consecutive matches against the same text decode it once.
+    """
+
+    def __init__(
+        self,
+        path: str = TEXT_STORE_PATH,
+        max_bytes: int = Config.text_store_mb * 1024 * 1024,
+        recent_size: int = 2,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.recent_size = recent_size
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _file_path(self, handle: str) -> str:
+        if not isinstance(handle, str) or not _HANDLE_PATTERN.match(handle):
+            raise KeyError(handle)
+        return os.path.join(self.path, f"{handle}.txt")
+
+    def put_stream(self, chunks, max_size: int = 0) -> str:
+        """Spools a UTF-8 encoded text to the store while it is received.
+
+        :param chunks: Iterable of byte chunks of the text.
+        :type chunks: Iterable[bytes]
+        :param max_size: Maximum size of the text in bytes, 0 for no limit.
+        :type max_size: int
+        :raises TextTooLargeError: If the text is larger than `max_size`.
+        :raises UnicodeDecodeError: If the text is not valid UTF-8.
+        :return: Handle of the stored text.
+        :rtype: str
+        """
+        os.makedirs(self.path, exist_ok=True)
+        digest = hashlib.sha256()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        size = 0
+        with tempfile.NamedTemporaryFile("wb", dir=self.path, suffix=".tmp", delete=False) as file:
+            try:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if max_size and size > max_size:
+                        raise TextTooLargeError(f"Text exceeds the upload limit of {max_size} bytes")
+                    decoder.decode(chunk)
+                    digest.update(chunk)
+                    file.write(chunk)
+                decoder.decode(b"", final=True)
+            except BaseException:
+                file.close()
+                os.unlink(file.name)
+                raise
+
+        handle = digest.hexdigest()
+        os.replace(file.name, self._file_path(handle))
+        log.debug(f"Stored text {handle} ({size} bytes)")
+        self._evict()
+        return handle
+
+    def put(self, text: str) -> str:
+        """Stores a text and returns its handle."""
+        return self.put_stream([text.encode("utf-8")])
+
+    def read(self, handle: str) -> str:
+        """Reads a stored text through a memory map of its file and marks it as recently used.
+
+        :param handle: Handle returned by `put_stream` or `put`.
+        :type handle: str
+        :raises KeyError: If the handle is unknown or the text has been evicted.
+        :return: The text.
+        :rtype: str
+        """
+        with self._lock:
+            if handle in self._recent:
+                self._recent.move_to_end(handle)
+                return self._recent[handle]
+
+        file_path = self._file_path(handle)
+        try:
+            os.utime(file_path)
+            with open(file_path, "rb") as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    text = ""
+                else:
+                    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        text = str(mapped, "utf-8")
+        except FileNotFoundError:
+            raise KeyError(handle) from None
+
+        with self._lock:
+            self._recent[handle] = text
+            while len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+        return text
+
+    def touch(self, handle: str):
+        """Marks a stored text as recently used without reading it.
+
+        :param handle: Handle returned by `put_stream` or `put`.
+        :type handle: str
+        :raises KeyError: If the handle is unknown or the text has been evicted.
+        """
+        try:
+            os.utime(self._file_path(handle))
+        except FileNotFoundError:
+            raise KeyError(handle) from None
+
+    def _evict(self):
+        """Deletes the least recently used texts beyond the byte budget."""
+        entries = []
+        with os.scandir(self.path) as directory:
+            for entry in directory:
+                if entry.name.endswith(".txt"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # Evicted concurrently by another process
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, file_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(file_path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+text_store = TextStore()
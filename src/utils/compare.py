@@ -0,0 +1,85 @@
+"""
+This module provides utilities for comparing the results of several engines, converting their match offsets to code
+points and diffing their matches.
+"""
+
+import itertools
+
+OFFSET_UNIT_CODE_POINT = "code_point"
+OFFSET_UNIT_UTF16 = "utf16"
+
+
+def utf16_to_code_point_table(text: str) -> list[int] | None:
+    """Maps UTF-16 code unit offsets of the text to code point offsets, None if they are the same.
+
+    Code points above U+FFFF take two UTF-16 code units, the offset between the two units maps to the code point.
+    """
+    if all(ord(char) <= 0xFFFF for char in text):
+        return None
+    units = [2 if ord(char) > 0xFFFF else 1 for char in text]
+    table = []
+    for code_point, width in enumerate(units):
+        table.extend([code_point] * width)
+    table.append(len(text))
+    return table
+
+
+def normalize_offsets(matches: list[dict], table: list[int] | None) -> list[dict]:
+    """Converts the match and group indices from UTF-16 code units to code points with a table from
+    `utf16_to_code_point_table`."""
+    if table is None:
+        return matches
+
+    def convert(index):
+        return [table[offset] for offset in index]
+
+    return [
+        {
+            **match,
+            "index": convert(match["index"]),
+            "groups": [{**group, "index": convert(group["index"])} for group in match["groups"]],
+        }
+        for match in matches
+    ]
+
+
+def _match_key(match: dict) -> tuple:
+    return tuple(match["index"])
+
+
+def _groups_key(match: dict) -> tuple:
+    # Group names are not compared, not every engine reports them
+    return tuple((group["value"], tuple(group["index"])) for group in match["groups"])
+
+
+def diff_results(results: dict) -> dict:
+    """Compares the matches of several engines by their spans and groups.
+
+    :param results: Dictionary of engine name to a result with `matches` and `error`, all indices in code points.
+    :type results: dict
+    :return: Dictionary with `consistent`, the `reference` engine (the first engine without an error), the engines
+             with `errors` and per engine the match spans `missing` compared to the reference, the `extra` spans and
+             the spans whose groups differ (`groups`).
+    :rtype: dict
+    """
+    errors = [name for name, result in results.items() if result["error"]]
+    compared = {name: result["matches"] for name, result in results.items() if not result["error"]}
+    reference = next(iter(compared), None)
+    diff = {"consistent": not errors, "reference": reference, "errors": errors, "engines": {}}
+    if reference is None:
+        return diff
+
+    reference_matches = {_match_key(match): match for match in compared[reference]}
+    for name, matches in itertools.islice(compared.items(), 1, None):
+        engine_matches = {_match_key(match): match for match in matches}
+        missing = [list(key) for key in reference_matches if key not in engine_matches]
+        extra = [list(key) for key in engine_matches if key not in reference_matches]
+        groups = [
+            list(key)
+            for key, match in engine_matches.items()
+            if key in reference_matches and _groups_key(match) != _groups_key(reference_matches[key])
+        ]
+        diff["engines"][name] = {"missing": missing, "extra": extra, "groups": groups}
+        if missing or extra or groups:
+            diff["consistent"] = False
+    return diff
@@ -0,0 +1,78 @@
+"""
+This module provides utilities for streaming matches as NDJSON and exporting them as JSONL or CSV records.
+"""
+
+import csv
+import io
+import json
+
+EXPORT_FORMATS = ("ndjson", "jsonl", "csv")
+MATCH_COLUMNS = ("match", "start", "end")
+
+
+def group_columns(match: dict) -> list[str]:
+    """Returns the column names of the groups of a match, the group name or `group_<number>` for unnamed groups.
+
+    A name taken by a match column or an earlier group, e.g. a group named `start`, is prefixed with `group_` until it
+    is unique.
+    """
+    columns = []
+    taken = set(MATCH_COLUMNS)
+    for i, group in enumerate(match["groups"], start=1):
+        column = group["name"] or f"group_{i}"
+        while column in taken:
+            column = f"group_{column}"
+        taken.add(column)
+        columns.append(column)
+    return columns
+
+
+def match_record(match: dict, columns: list[str]) -> dict:
+    """Flattens a match into one record with its value, start, end and the values of its groups."""
+    record = {"match": match["match"], "start": match["index"][0], "end": match["index"][1]}
+    for column, group in zip(columns, match["groups"]):
+        record[column] = group["value"]
+    return record
+
+
+def iter_ndjson(messages):
+    """Yields one JSON line per match followed by a line with the error, execution time and timing of the stream."""
+    for message in messages:
+        for match in message["matches"]:
+            yield json.dumps(match) + "\n"
+        if message["done"]:
+            yield json.dumps(
+                {
+                    "done": True,
+                    "error": message["error"],
+                    "execution_time": message["execution_time"],
+                    "timing": message.get("timing"),
+                }
+            )
+            yield "\n"
+
+
+def iter_jsonl(matches):
+    """Yields one flat JSON record per match for export."""
+    columns = None
+    for match in matches:
+        if columns is None:
+            columns = group_columns(match)
+        yield json.dumps(match_record(match, columns)) + "\n"
+
+
+def iter_csv(matches):
+    """Yields CSV rows of the flat match records for export, the header is taken from the first match."""
+    buffer = io.StringIO()
+    writer = None
+    for match in matches:
+        if writer is None:
+            columns = group_columns(match)
+            writer = csv.DictWriter(buffer, fieldnames=[*MATCH_COLUMNS, *columns], extrasaction="ignore")
+            writer.writeheader()
+        writer.writerow(match_record(match, columns))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if writer is None:
+        yield "match,start,end\r\n"
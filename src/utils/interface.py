@@ -111,14 +111,14 @@ class MatchTableGenerator:
     GROUP_TABLE_HEADER_END = "</tr></thead><tbody>"
     GROUP_TABLE_END = "</tbody></table></div>"
 
-    def generate_match_table(self, matches):
-        """Generates the complete HTML table(s) for the given matches data."""
+    def generate_match_table(self, matches, first_number=1):
+        """Generates the complete HTML table(s) for the given matches data, numbered from `first_number`."""
         tables = []
         for i, match_data in enumerate(matches, start=1):
             match_str = match_data.get("match")
             if match_str:
                 match_id = i - 1
-                table = [self._create_match_header(i)]
+                table = [self._create_match_header(first_number + match_id)]
                 if "groups" in match_data and match_data["groups"] and len(match_data["groups"]) > 0:
                     table.append(self._create_match_body(match_data, match_id))
                     table.append(self._create_group_header())
@@ -0,0 +1,632 @@
+"""
+This module provides a pool of long-lived match worker processes which are started ahead of time and reused.
+"""
+
+import asyncio
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from project import log
+from src.engine.cache import cache_stats, compile_time_total
+from src.metrics import metrics
+from src.text_store import TextHandle, text_store
+
+_CACHE_COUNTERS = ("hits", "misses", "evictions", "compile_time")
+# Reasons for replacing a worker which kill it, the others let it finish
+_KILL_REASONS = ("timeout", "failure", "orphan")
+
+
+def _cpu_time():
+    """CPU time of this process in seconds, including its native threads, None where it is not available."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _worker_timing(elapsed, compile_start, cpu_start):
+    """Split the time a worker spent on a match into compiling the pattern and matching, with its CPU time.
+
+    Compile time is taken from the pattern caches of the worker, it is 0 for a cached pattern and for the engines which
+    compile in their daemon, where it is part of the match.
+    """
+    compile_time = compile_time_total() - compile_start
+    cpu_end = _cpu_time()
+    return {
+        "compile": compile_time,
+        "match": max(0.0, elapsed - compile_time),
+        "cpu": None if cpu_start is None else cpu_end - cpu_start,
+    }
+
+
+def _timing(queue_time, total, worker_timing=None):
+    """Phases of a match in seconds: waiting for a free worker, compiling, matching, sending the task and the result
+    through the pipe (the rest of the round trip) and the CPU time of the worker. Unknown phases are None."""
+    timing = {"queue": queue_time, "compile": None, "match": None, "ipc": None, "cpu": None, "total": total}
+    if worker_timing:
+        timing.update(worker_timing)
+        timing["ipc"] = max(0.0, total - queue_time - worker_timing["compile"] - worker_timing["match"])
+    return timing
+
+
+def _is_timeout(error):
+    """Whether a match error is a timeout, of the pool or reported by the engine itself."""
+    error = error.lower()
+    return "timeout exceeded" in error or "timed out" in error
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+async def _wait_readable(conn, timeout):
+    """Wait in the running event loop until the connection has data, return False after `timeout` seconds."""
+    if conn.poll():
+        return True
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    try:
+        loop.add_reader(conn.fileno(), _wake, ready)
+    except NotImplementedError:
+        return await loop.run_in_executor(None, conn.poll, timeout)
+    try:
+        await asyncio.wait_for(ready, timeout)
+        return True
+    except asyncio.TimeoutError:
+        return conn.poll()
+    finally:
+        loop.remove_reader(conn.fileno())
+
+
+def _worker_main(engines, conn):
+    """Main loop of a match worker: receive a task, run the match, send the result back."""
+    # Ctrl+C is delivered to the whole process group, let the parent decide when the worker stops
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # A handler inherited from the forking server (e.g. gunicorn's graceful shutdown) would survive `terminate()`
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+
+        if not _run_task(engines, conn, task):
+            break
+
+
+def _run_task(engines, conn, task):
+    """Run one task and send its result. Returns False if the pipe is broken."""
+    engine_name, pattern, text, flags, chunk_size, limit, offset, timeout = task
+    if isinstance(text, TextHandle):
+        # Large texts are mapped from the text store instead of being copied through the pipe
+        try:
+            text = text_store.read(text.handle)
+        except KeyError:
+            return _send_error(conn, f"Text {text.handle} not found")
+
+    if chunk_size:
+        return _stream_matches(engines, conn, engine_name, pattern, text, flags, chunk_size)
+    return _send_matches(engines, conn, engine_name, pattern, text, flags, limit, offset, timeout)
+
+
+def _send_error(conn, error):
+    """Send a final result with only an error, understood by both single and streamed matches."""
+    try:
+        conn.send(
+            {
+                "matches": [],
+                "error": error,
+                "has_more": False,
+                "done": True,
+                "execution_time": 0,
+                "cache_stats": cache_stats(),
+            }
+        )
+    except (BrokenPipeError, OSError):
+        return False
+    return True
+
+
+def _send_matches(engines, conn, engine_name, pattern, text, flags, limit, offset, timeout):
+    """Run the match and send the matches in one result. Returns False if the pipe is broken.
+
+    `timeout` is the time left to the pool for the result, engines which can stop a match themselves stop it before.
+
+    With a limit one extra match is requested, so `has_more` tells whether another page exists without counting
+    all matches.
+    """
+    matches, error, has_more = [], "", False
+    start_time = time.time()
+    compile_start, cpu_start = compile_time_total(), _cpu_time()
+    engine = engines.get(engine_name)
+    try:
+        if engine:
+            matches, error = engine.match(pattern, text, flags, limit + 1 if limit else 0, offset, timeout)
+            if limit and len(matches) > limit:
+                matches, has_more = matches[:limit], True
+        else:
+            error = f"Engine {engine_name} not found"
+    except (ValueError, TypeError) as e:
+        error = f"Exception in engine {engine_name}: {str(e)}"
+        log.error(error)
+    execution_time = time.time() - start_time
+
+    try:
+        conn.send(
+            {
+                "matches": matches,
+                "error": error,
+                "has_more": has_more,
+                "execution_time": execution_time,
+                "timing": _worker_timing(execution_time, compile_start, cpu_start),
+                # Pattern caches live as long as the worker, report their counters with every result
+                "cache_stats": cache_stats(),
+            }
+        )
+    except (BrokenPipeError, OSError):
+        return False
+    return True
+
+
+def _stream_matches(engines, conn, engine_name, pattern, text, flags, chunk_size):
+    """Send the matches in chunks while the engine finds them, then a final message with `done` set.
+
+    A full pipe blocks the worker until the parent reads, so a slow client slows the match down instead of
+    buffering the matches. Returns False if the pipe is broken.
+    """
+    error = ""
+    start_time = time.time()
+    compile_start, cpu_start = compile_time_total(), _cpu_time()
+    engine = engines.get(engine_name)
+    try:
+        if engine:
+            for matches, error in engine.match_chunks(pattern, text, flags, chunk_size):
+                if matches:
+                    conn.send({"matches": matches, "error": "", "done": False})
+        else:
+            error = f"Engine {engine_name} not found"
+        conn.send(
+            {
+                "matches": [],
+                "error": error,
+                "done": True,
+                "execution_time": time.time() - start_time,
+                "timing": _worker_timing(time.time() - start_time, compile_start, cpu_start),
+                "cache_stats": cache_stats(),
+            }
+        )
+    except (BrokenPipeError, OSError):
+        return False
+    return True
+
+
+class MatchWorker:
+    """
+    A single long-lived match process connected to the pool with a duplex pipe.
+    """
+
+    def __init__(self, context, engines, index):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(engines, child_conn), name=f"MatchWorker-{index}", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks_done = 0
+
+    @property
+    def pid(self):
+        """Process id of the worker."""
+        return self.process.pid
+
+    def is_alive(self):
+        """Check if the worker process is still running."""
+        return self.process.is_alive()
+
+    def stop(self, timeout=1):
+        """Ask the worker to finish, terminate it if it does not."""
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=timeout)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        """Terminate the worker, kill it if it does not react to the termination signal."""
+        self.process.terminate()
+        self.process.join(timeout=1)  # Wait for a short time to allow termination
+
+        if self.process.is_alive():
+            log.warning(f"Worker {self.process.name} did not terminate, killing it")
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class MatchWorkerPool:
+    """
+    Pool of pre-forked match workers.
+
+    Each task is sent to an idle worker and the caller waits on the worker pipe, so it is woken up as soon as the
+    result is ready. A worker that exceeds the timeout is killed and replaced in the background, a worker that has
+    served `max_tasks` tasks is recycled. `match_async` waits for the idle worker and the pipe in the event loop
+    instead of blocking the calling thread.
+    """
+
+    def __init__(self, engines, size, max_tasks=0, start_method=None):
+        self.engines = engines
+        self.size = max(1, size)
+        self.max_tasks = max_tasks
+        self.context = multiprocessing.get_context(start_method or None)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        # Futures of coroutines waiting for an idle worker, with their event loops
+        self._waiters = []
+        self._counter = 0
+        self._closed = False
+        # Latest pattern cache statistics of every live worker and the summed counters of retired workers
+        self._cache_stats = {}
+        self._retired_cache_stats = {}
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        with self._lock:
+            self._counter += 1
+            index = self._counter
+        worker = MatchWorker(self.context, self.engines, index)
+        log.debug(f"Started {worker.process.name} (pid {worker.pid})")
+        metrics.inc("openregex_worker_spawns_total")
+        return worker
+
+    def _acquire(self, timeout):
+        """Take an idle worker from the pool, replace dead workers on the way."""
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            try:
+                worker = self._idle.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if worker.is_alive():
+                return worker
+            log.warning(f"Worker {worker.process.name} died unexpectedly, replacing it")
+            self._replace(worker, reason="died")
+
+    async def _acquire_async(self, timeout):
+        """Take an idle worker from the pool like `_acquire`, waiting in the event loop instead of the thread."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return None
+                waiter = loop.create_future()
+                with self._lock:
+                    self._waiters.append((loop, waiter))
+                try:
+                    # A worker put back before the waiter was registered has woken nobody
+                    if self._idle.empty():
+                        await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    return None
+                finally:
+                    with self._lock:
+                        if (loop, waiter) in self._waiters:
+                            self._waiters.remove((loop, waiter))
+                continue
+            if worker.is_alive():
+                return worker
+            log.warning(f"Worker {worker.process.name} died unexpectedly, replacing it")
+            self._replace(worker, reason="died")
+
+    def _put_idle(self, worker):
+        """Return a worker to the idle queue and wake the coroutines waiting for one.
+
+        Threads waiting in `_acquire` are woken by the queue itself. All waiting coroutines are woken, the ones which
+        find the queue empty again wait for the next worker.
+        """
+        self._idle.put(worker)
+        with self._lock:
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:  # The event loop of the waiter is closed
+                pass
+
+    def _release(self, worker):
+        worker.tasks_done += 1
+        if self.max_tasks and worker.tasks_done >= self.max_tasks:
+            log.debug(f"Worker {worker.process.name} served {worker.tasks_done} tasks, recycling it")
+            self._replace(worker, reason="recycle")
+        else:
+            self._put_idle(worker)
+
+    def _replace(self, worker, reason):
+        """Stop the worker and start a new one in a background thread.
+
+        Workers replaced for one of `_KILL_REASONS` are killed, the others are asked to finish.
+        """
+        kill = reason in _KILL_REASONS
+        if kill:
+            metrics.inc("openregex_worker_kills_total", {"reason": reason})
+        elif reason == "recycle":
+            metrics.inc("openregex_worker_recycles_total")
+        else:
+            metrics.inc("openregex_worker_deaths_total")
+        self._retire_cache_stats(worker)
+
+        def replace():
+            if kill:
+                worker.kill()
+            else:
+                worker.stop()
+            if not self._closed:
+                self._put_idle(self._spawn())
+
+        threading.Thread(target=replace, name=f"Replace-{worker.process.name}", daemon=True).start()
+
+    def match(self, engine_name, pattern, text, flags=0, timeout=5, limit=0, offset=0, wait=None):
+        """Run a match in one of the workers and wait for the result at most `timeout` seconds.
+
+        Returns at most `limit` matches (0 for all) after skipping `offset` matches, `has_more` of the result is set if
+        the limit cut off further matches. The wait for an idle worker counts against the timeout, unless `wait` limits
+        it separately: the timeout then starts when the match is sent to the worker.
+        """
+        time_start = time.time()
+        worker = self._acquire(timeout if wait is None else wait)
+        if worker is None:
+            return self._exhausted(engine_name, timeout if wait is None else wait)
+
+        queue_time = time.time() - time_start
+        deadline_start = time_start if wait is None else time.time()
+        metrics.add("openregex_inflight_matches", 1)
+        try:
+            remaining = max(0.0, timeout - (time.time() - deadline_start))
+            worker.conn.send((engine_name, pattern, text, flags, 0, limit, offset, remaining))
+            ready = worker.conn.poll(remaining)
+            result = worker.conn.recv() if ready else None
+        except (EOFError, BrokenPipeError, OSError) as e:
+            return self._failed(worker, engine_name, e, time_start, queue_time)
+        finally:
+            metrics.add("openregex_inflight_matches", -1)
+        return self._completed(worker, engine_name, result, timeout, time_start, queue_time)
+
+    async def match_async(self, engine_name, pattern, text, flags=0, timeout=5, limit=0, offset=0):
+        """Run a match like `match`, waiting for an idle worker and for its result in the running event loop.
+
+        The result pipe is watched with `add_reader`, so many matches can wait in one thread. Event loops without
+        reader support (the Windows proactor loop) wait for the pipe in the default executor instead.
+        """
+        time_start = time.time()
+        worker = await self._acquire_async(timeout)
+        if worker is None:
+            return self._exhausted(engine_name, timeout)
+
+        queue_time = time.time() - time_start
+        metrics.add("openregex_inflight_matches", 1)
+        try:
+            remaining = max(0.0, timeout - (time.time() - time_start))
+            worker.conn.send((engine_name, pattern, text, flags, 0, limit, offset, remaining))
+            ready = await _wait_readable(worker.conn, remaining)
+            result = worker.conn.recv() if ready else None
+        except (EOFError, BrokenPipeError, OSError) as e:
+            return self._failed(worker, engine_name, e, time_start, queue_time)
+        except asyncio.CancelledError:
+            # The worker may still be matching and would send its result to the next task
+            self._replace(worker, reason="orphan")
+            raise
+        finally:
+            metrics.add("openregex_inflight_matches", -1)
+        return self._completed(worker, engine_name, result, timeout, time_start, queue_time)
+
+    def _exhausted(self, engine_name, timeout):
+        """Result of a match which found no idle worker within the timeout."""
+        log.warning(f"No free match worker for engine '{engine_name}' within {timeout} seconds")
+        metrics.inc("openregex_pool_exhausted_total", self._labels(engine_name))
+        return self._record(
+            engine_name,
+            {
+                "matches": [],
+                "error": f"Timeout exceeded: {timeout} seconds",
+                "has_more": False,
+                "execution_time": timeout,
+                "timing": _timing(timeout, timeout),
+            },
+        )
+
+    def _failed(self, worker, engine_name, error, time_start, queue_time):
+        """Replace a worker whose pipe failed and return the result of its match."""
+        log.error(f"Worker {worker.process.name} for engine '{engine_name}' failed: {error}")
+        self._replace(worker, reason="failure")
+        return self._record(
+            engine_name,
+            {
+                "matches": [],
+                "error": "No result returned from engine",
+                "has_more": False,
+                "execution_time": time.time() - time_start,
+                "timing": _timing(queue_time, time.time() - time_start),
+            },
+        )
+
+    def _completed(self, worker, engine_name, result, timeout, time_start, queue_time):
+        """Return the worker and the result of its match, a missing result is a timeout and kills the worker."""
+        execution_time = time.time() - time_start
+        if result is None:
+            log.warning(f"Process for engine '{engine_name}' timed out after {timeout} seconds")
+            self._replace(worker, reason="timeout")
+            return self._record(
+                engine_name,
+                {
+                    "matches": [],
+                    "error": f"Timeout exceeded: {timeout} seconds",
+                    "has_more": False,
+                    "execution_time": execution_time,
+                    "timing": _timing(queue_time, execution_time),
+                },
+            )
+
+        self._finish(worker, result)
+        result["execution_time"] = execution_time
+        result["timing"] = _timing(queue_time, execution_time, result.get("timing"))
+        return self._record(engine_name, result)
+
+    def stream(self, engine_name, pattern, text, flags=0, timeout=5, chunk_size=1000):
+        """Run a match in one of the workers and yield the matches in chunks while they arrive.
+
+        Yields dictionaries with `matches`, `error` and `done`, the last one has `done` set and the `execution_time`.
+        `timeout` limits the wait for each chunk instead of the whole match, so long extractions keep running as long
+        as they make progress. Closing the generator early kills the worker, it may still be sending matches.
+        """
+        time_start = time.time()
+        worker = self._acquire(timeout)
+        if worker is None:
+            log.warning(f"No free match worker for engine '{engine_name}' within {timeout} seconds")
+            metrics.inc("openregex_pool_exhausted_total", self._labels(engine_name))
+            yield self._record(
+                engine_name,
+                {
+                    "matches": [],
+                    "error": f"Timeout exceeded: {timeout} seconds",
+                    "done": True,
+                    "execution_time": 0,
+                    "timing": _timing(timeout, timeout),
+                },
+            )
+            return
+
+        # Unless the stream ends, the consumer went away and the worker may still be sending matches for nobody
+        reason = "orphan"
+        queue_time = time.time() - time_start
+        metrics.add("openregex_inflight_matches", 1)
+        try:
+            worker.conn.send((engine_name, pattern, text, flags, max(1, chunk_size), 0, 0, None))
+            while True:
+                if not worker.conn.poll(timeout):
+                    log.warning(f"Stream of engine '{engine_name}' stalled for {timeout} seconds")
+                    reason = "timeout"
+                    yield self._record(
+                        engine_name,
+                        {
+                            "matches": [],
+                            "error": f"Timeout exceeded: {timeout} seconds",
+                            "done": True,
+                            "execution_time": time.time() - time_start,
+                            "timing": _timing(queue_time, time.time() - time_start),
+                        },
+                    )
+                    return
+                message = worker.conn.recv()
+                if message["done"]:
+                    reason = None
+                    self._finish(worker, message)
+                    message["execution_time"] = time.time() - time_start
+                    message["timing"] = _timing(queue_time, message["execution_time"], message.get("timing"))
+                    yield self._record(engine_name, message)
+                    return
+                yield message
+        except (EOFError, BrokenPipeError, OSError) as e:
+            log.error(f"Worker {worker.process.name} for engine '{engine_name}' failed: {e}")
+            reason = "failure"
+            yield self._record(
+                engine_name,
+                {
+                    "matches": [],
+                    "error": "No result returned from engine",
+                    "done": True,
+                    "execution_time": time.time() - time_start,
+                    "timing": _timing(queue_time, time.time() - time_start),
+                },
+            )
+        finally:
+            metrics.add("openregex_inflight_matches", -1)
+            if reason:
+                self._replace(worker, reason=reason)
+
+    def _labels(self, engine_name):
+        # Engine names come from requests, unknown ones share a label so they cannot grow the number of series
+        return {"engine": engine_name if engine_name in self.engines else "unknown"}
+
+    def _record(self, engine_name, result):
+        """Record the duration and the outcome of a finished match in the metrics and return the result."""
+        labels = self._labels(engine_name)
+        metrics.observe("openregex_match_duration_seconds", result["execution_time"], labels)
+        if result["error"]:
+            metrics.inc("openregex_match_errors_total", labels)
+            if _is_timeout(result["error"]):
+                metrics.inc("openregex_match_timeouts_total", labels)
+        return result
+
+    def _finish(self, worker, result):
+        """Record the cache statistics sent with a result and return the worker to the pool."""
+        stats = result.pop("cache_stats", {})
+        with self._lock:
+            previous = self._cache_stats.get(worker.pid, {})
+            self._cache_stats[worker.pid] = stats
+        # The statistics of a worker are cumulative, the metrics count the lookups since its previous result
+        for name, cache in stats.items():
+            for counter, result_label in (("hits", "hit"), ("misses", "miss")):
+                lookups = cache[counter] - previous.get(name, {}).get(counter, 0)
+                if lookups > 0:
+                    metrics.inc(
+                        "openregex_pattern_cache_lookups_total", {"cache": name, "result": result_label}, lookups
+                    )
+        self._release(worker)
+
+    def _retire_cache_stats(self, worker):
+        """Keep the counters of a stopped worker, so the pool totals never go backwards."""
+        with self._lock:
+            for name, stats in self._cache_stats.pop(worker.pid, {}).items():
+                retired = self._retired_cache_stats.setdefault(name, {})
+                for key in _CACHE_COUNTERS:
+                    retired[key] = retired.get(key, 0) + stats[key]
+
+    def cache_stats(self):
+        """Pattern cache statistics summed over all workers, keyed by cache name.
+
+        Counters include retired workers, `size` and `max_size` cover the live workers only.
+        """
+        with self._lock:
+            totals = {
+                name: {"size": 0, "max_size": 0, **counters} for name, counters in self._retired_cache_stats.items()
+            }
+            for worker_stats in self._cache_stats.values():
+                for name, stats in worker_stats.items():
+                    total = totals.setdefault(name, {"size": 0, "max_size": 0, **dict.fromkeys(_CACHE_COUNTERS, 0)})
+                    for key in ("size", "max_size", *_CACHE_COUNTERS):
+                        total[key] += stats[key]
+        for total in totals.values():
+            lookups = total["hits"] + total["misses"]
+            total["hit_rate"] = total["hits"] / lookups if lookups else 0.0
+        return totals
+
+    def close(self):
+        """Stop all workers of the pool."""
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
@@ -0,0 +1,29 @@
+// static/js/components/output/matchesPager.js
+import { getElement } from '../../utils/dom.js';
+
+export const matchesPager = getElement('matches-pager');
+
+let currentOffset = 0;
+let currentLimit = 0;
+
+// Show the pager only when the matches do not fit on one page
+export const updatePager = (data) => {
+    currentOffset = data.offset || 0;
+    currentLimit = data.limit || 0;
+    const count = data.match_count || 0;
+    const paged = Boolean(data.has_more) || currentOffset > 0;
+    matchesPager.hidden = !paged;
+    if (!paged) {
+        return;
+    }
+    getElement('pager-info').textContent = count
+        ? `Matches ${currentOffset + 1}-${currentOffset + count}`
+        : `No matches after ${currentOffset}`;
+    getElement('pager-prev').disabled = currentOffset === 0;
+    getElement('pager-next').disabled = !data.has_more;
+};
+
+export const initPager = (onPageChange) => {
+    getElement('pager-prev').addEventListener('click', () => onPageChange(Math.max(0, currentOffset - currentLimit)));
+    getElement('pager-next').addEventListener('click', () => onPageChange(currentOffset + currentLimit));
+};
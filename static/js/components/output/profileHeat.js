@@ -0,0 +1,89 @@
+// static/js/components/output/profileHeat.js
+import { getElement } from '../../utils/dom.js';
+
+export const profileToggle = getElement('profile-toggle');
+export const profileSummary = getElement('profile-summary');
+
+const HEAT_LEVELS = 5;
+
+export const isProfiling = () => profileToggle.classList.contains('active');
+
+export const initProfileToggle = (onToggle) => {
+    const setActive = (active) => {
+        profileToggle.classList.toggle('active', active);
+        profileToggle.setAttribute('aria-pressed', String(active));
+    };
+    setActive(localStorage.getItem('profileMode') === 'true');
+    profileToggle.addEventListener('click', () => {
+        setActive(!isProfiling());
+        localStorage.setItem('profileMode', String(isProfiling()));
+        onToggle();
+    });
+};
+
+// Logarithmic heat level of a step count, 0 for characters which cost nothing
+const heatLevel = (steps, maxSteps) => {
+    if (!steps || !maxSteps) {
+        return 0;
+    }
+    return Math.max(1, Math.ceil((HEAT_LEVELS * Math.log1p(steps)) / Math.log1p(maxSteps)));
+};
+
+// Replace the content of an element with the source, runs of characters with the same heat share one span
+const renderHeat = (element, source, steps, unit) => {
+    const chars = Array.from(source); // The server counts code points
+    const maxSteps = steps.reduce((max, value) => Math.max(max, value), 0);
+    element.replaceChildren();
+    let runStart = 0;
+    let runLevel = heatLevel(steps[0], maxSteps);
+    for (let index = 1; index <= chars.length; index++) {
+        const level = index < chars.length ? heatLevel(steps[index], maxSteps) : -1;
+        if (level === runLevel) {
+            continue;
+        }
+        const run = document.createElement('span');
+        run.className = `heat heat-${runLevel}`;
+        run.textContent = chars.slice(runStart, index).join('');
+        if (runLevel > 0 && index - runStart === 1) {
+            run.title = `${steps[runStart].toLocaleString()} steps ${unit}`;
+        }
+        element.appendChild(run);
+        runStart = index;
+        runLevel = level;
+    }
+};
+
+const renderSummary = (profile, regex) => {
+    const steps = profile.steps.toLocaleString();
+    const budget = profile.exhausted ? ` - step budget of ${profile.max_steps.toLocaleString()} exhausted` : '';
+    profileSummary.textContent = `Profile: ${steps} steps${budget}, ${profile.matches} matches. `;
+    if (!profile.hotspots.length) {
+        profileSummary.appendChild(document.createTextNode('No backtracking.'));
+        return;
+    }
+    profileSummary.appendChild(document.createTextNode('Most backtracking: '));
+    const chars = Array.from(regex);
+    for (const hotspot of profile.hotspots) {
+        const part = document.createElement('code');
+        part.className = 'profile-hotspot';
+        part.textContent = chars.slice(hotspot.start, hotspot.end).join('');
+        part.title = `${hotspot.kind}: ${hotspot.backtracks.toLocaleString()} backtracks, ${hotspot.steps.toLocaleString()} steps`;
+        profileSummary.appendChild(part);
+    }
+};
+
+// Overlay the steps of a profile on the highlighted regex and text, the text shows the steps per starting position
+export const updateProfile = (profile, regex, text, elements) => {
+    profileSummary.replaceChildren();
+    profileSummary.hidden = !profile;
+    if (!profile) {
+        return;
+    }
+    if (profile.error) {
+        profileSummary.textContent = `Profile: ${profile.error}`;
+        return;
+    }
+    renderSummary(profile, regex);
+    renderHeat(elements.highlightRegex, regex, profile.pattern_steps, 'in this part of the pattern');
+    renderHeat(elements.highlightText, text, profile.text_steps, 'for a match starting here');
+};
@@ -0,0 +1,38 @@
+// static/js/components/output/redosWarning.js
+import { getElement } from '../../utils/dom.js';
+
+export const redosWarning = getElement('redos-warning');
+
+const RISKS = {
+    exponential: 'Exponential backtracking risk',
+    polynomial: 'Polynomial backtracking risk',
+};
+
+const ACTIONS = {
+    budget: (redos) => `Matched with a shorter time limit of ${redos.timeout} s.`,
+    refuse: () => 'The pattern was not matched.',
+    warn: () => 'Failing matches may get slow on long texts.',
+};
+
+// Show the backtracking risk reported by the server for the pattern, hide the warning for safe patterns
+export const updateRedosWarning = (redos, regex) => {
+    redosWarning.replaceChildren();
+    redosWarning.hidden = !redos || redos.risk === 'none';
+    if (redosWarning.hidden) {
+        return;
+    }
+    redosWarning.className = `redos-warning redos-${redos.risk}`;
+
+    const title = document.createElement('strong');
+    title.textContent = `${RISKS[redos.risk] || 'Backtracking risk'}. `;
+    redosWarning.appendChild(title);
+    redosWarning.appendChild(document.createTextNode(`${(ACTIONS[redos.action] || ACTIONS.warn)(redos)} `));
+
+    for (const finding of redos.findings) {
+        const part = document.createElement('code');
+        part.className = 'redos-finding';
+        part.title = finding.message;
+        part.textContent = regex.slice(finding.start, finding.end);
+        redosWarning.appendChild(part);
+    }
+};
@@ -0,0 +1,42 @@
+// static/js/components/output/timingBreakdown.js
+import { getElement } from '../../utils/dom.js';
+
+export const timingBreakdown = getElement('timing-breakdown');
+
+// Phases in the order they happen, with their labels and descriptions
+const PHASES = [
+    ['cache', 'Cache', 'Result served from the result cache'],
+    ['flight', 'Shared', 'Waiting for an identical match of another request'],
+    ['queue', 'Queue', 'Waiting for a free match worker'],
+    ['compile', 'Compile', 'Compiling the pattern, 0 when it was cached'],
+    ['match', 'Match', 'Matching in the engine'],
+    ['ipc', 'IPC', 'Sending the task and the matches between the server and the match worker'],
+    ['highlight', 'Highlight', 'Highlighting the text and the pattern'],
+    ['table', 'Table', 'Rendering the matches table'],
+    ['total', 'Total', 'Whole request on the server'],
+    ['cpu', 'CPU', 'CPU time of the match worker'],
+];
+
+const formatMs = (seconds) => {
+    const ms = seconds * 1000;
+    return ms < 10 ? `${ms.toFixed(2)} ms` : `${Math.round(ms)} ms`;
+};
+
+// Show the phases reported in the timing of a match response, hide the breakdown without one
+export const updateTimingBreakdown = (timing) => {
+    timingBreakdown.replaceChildren();
+    timingBreakdown.hidden = !timing;
+    if (!timing) {
+        return;
+    }
+    for (const [key, label, description] of PHASES) {
+        if (timing[key] === undefined || timing[key] === null) {
+            continue;
+        }
+        const phase = document.createElement('span');
+        phase.className = `timing-phase timing-${key}`;
+        phase.title = description;
+        phase.textContent = `${label}: ${formatMs(timing[key])}`;
+        timingBreakdown.appendChild(phase);
+    }
+};
@@ -4,12 +4,16 @@ import { initThemeSwitcher } from './components/themeSwitcher.js';
 import { initEngineSelector, initCheatSheetState } from './components/engineSelector.js';
 import { initRegexInput, getRegexInputValue } from './components/regexInput.js';
 import { initTextInput, getTextInputValue } from './components/textInput.js';
-import { fetchRegexMatch, fetchAndDecodeLink } from './utils/regex.js';
+import { fetchRegexMatch, fetchAndDecodeLink, renderLiveMessage } from './utils/regex.js';
 import { matchesTable } from './components/output/matchesTable.js';
 import { highlightText, highlightRegex } from './components/output/highlight.js';
 import { execTime } from './components/output/executionTime.js';
 import { webTime } from './components/output/webTime.js';
+import { initPager } from './components/output/matchesPager.js';
+import { initProfileToggle } from './components/output/profileHeat.js';
 import { getElement } from './utils/dom.js';
+import { debounceDelay } from './utils/matchSession.js';
+import { initLiveSession } from './utils/liveSession.js';
 import { attachMatchEventListeners } from './components/output/hoverHighlight.js';
 import { initExampleButton, initClearButton, initGenerateLinkButton } from './components/actionButton.js';
 
@@ -30,7 +34,7 @@ export const handleInputChange = async () => { // Add async here
         timeoutId = setTimeout(async () => {
             // Await the fetchRegexMatch function inside the timeout as well
             await fetchRegexMatch(regex, text, engine, elements);
-        }, 500);
+        }, debounceDelay());
     }
 };
 
@@ -43,6 +47,15 @@ document.addEventListener('DOMContentLoaded', async () => { // Add async here
     initExampleButton();
     initClearButton();
     initGenerateLinkButton();
+    initLiveSession(renderLiveMessage);
+    initProfileToggle(async () => {
+        const elements = { matchesTable, highlightText, highlightRegex, execTime, webTime };
+        await fetchRegexMatch(getRegexInputValue(), getTextInputValue(), getElement('engine-selector').value, elements);
+    });
+    initPager(async (offset) => {
+        const elements = { matchesTable, highlightText, highlightRegex, execTime, webTime };
+        await fetchRegexMatch(getRegexInputValue(), getTextInputValue(), getElement('engine-selector').value, elements, offset);
+    });
 
     const debugMode = getElement('mode');
      if (debugMode && debugMode.textContent.trim() !== "") {
@@ -0,0 +1,103 @@
+// static/js/utils/liveSession.js
+
+// Live session: one WebSocket per tab instead of a POST per edit. The page sends the whole state once and then only
+// what changed, the server answers every edit with `matching`, then `result` or `error`, and cancels the match of an
+// edit superseded by the next one.
+const RECONNECT_MS = 5000;
+
+let socket = null;
+let onMessage = null;
+let seq = 0;
+let lastSent = null; // State the server has, null until it has the whole text
+let latest = null; // Latest edit with the request it answers
+
+const isHighSurrogate = (code) => code >= 0xd800 && code <= 0xdbff;
+const isLowSurrogate = (code) => code >= 0xdc00 && code <= 0xdfff;
+const codePoints = (text) => {
+    let count = 0;
+    for (const _ of text) {
+        count++;
+    }
+    return count;
+};
+
+// The change from the previous to the current text as one splice in code points, like the server indexes the text
+export const textSplice = (previous, current) => {
+    const shorter = Math.min(previous.length, current.length);
+    let start = 0;
+    while (start < shorter && previous.charCodeAt(start) === current.charCodeAt(start)) {
+        start++;
+    }
+    if (start > 0 && isHighSurrogate(previous.charCodeAt(start - 1))) {
+        start--;
+    }
+    let end = 0;
+    while (end < shorter - start
+        && previous.charCodeAt(previous.length - 1 - end) === current.charCodeAt(current.length - 1 - end)) {
+        end++;
+    }
+    if (end > 0 && isLowSurrogate(previous.charCodeAt(previous.length - end))) {
+        end--;
+    }
+    const spliceStart = codePoints(previous.slice(0, start));
+    const removed = codePoints(previous.slice(start, previous.length - end));
+    return {
+        splice: [spliceStart, spliceStart + removed, current.slice(start, current.length - end)],
+        length: codePoints(current)
+    };
+};
+
+const connect = () => {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    socket = new WebSocket(`${protocol}//${window.location.host}/live`);
+    socket.addEventListener('open', () => {
+        lastSent = null;
+    });
+    socket.addEventListener('message', (event) => handleMessage(JSON.parse(event.data)));
+    socket.addEventListener('close', () => {
+        // Matches go through POST requests until the session is back
+        socket = null;
+        setTimeout(connect, RECONNECT_MS);
+    });
+};
+
+const handleMessage = (message) => {
+    if (!latest || message.seq !== latest.seq) {
+        return; // Answer to a superseded edit
+    }
+    if (message.type === 'resync') {
+        lastSent = null;
+        sendLiveEdit(latest.state, latest.request);
+    } else if (message.type === 'result' || message.type === 'error') {
+        onMessage(message, latest.request);
+    }
+};
+
+export const initLiveSession = (handleResult) => {
+    if (document.body.dataset.liveSessions !== 'true' || !window.WebSocket) {
+        return;
+    }
+    onMessage = handleResult;
+    connect();
+};
+
+export const isLive = () => socket !== null && socket.readyState === WebSocket.OPEN;
+
+// Send the changes of the state since the last edit, `request` is handed back with the answer
+export const sendLiveEdit = (state, request) => {
+    seq += 1;
+    const message = { seq };
+    for (const key of ['regex', 'engine', 'offset', 'profile']) {
+        if (!lastSent || lastSent[key] !== state[key]) {
+            message[key] = state[key];
+        }
+    }
+    if (!lastSent) {
+        message.text = state.text;
+    } else if (lastSent.text !== state.text) {
+        Object.assign(message, textSplice(lastSent.text, state.text));
+    }
+    socket.send(JSON.stringify(message));
+    lastSent = { ...state };
+    latest = { seq, state, request };
+};
@@ -0,0 +1,39 @@
+// static/js/utils/matchSession.js
+
+// Every match request of this tab carries the session id and a growing sequence number. The server cancels the
+// running match of an older request when a newer one arrives, the page aborts the fetch of the older one.
+const createSessionId = () => (
+    window.crypto && crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+);
+
+const sessionId = sessionStorage.getItem('matchSession') || createSessionId();
+sessionStorage.setItem('matchSession', sessionId);
+
+const MIN_DEBOUNCE_MS = 150;
+const MAX_DEBOUNCE_MS = 1000;
+const RTT_WEIGHT = 0.3;
+
+let seq = 0;
+let controller = null;
+let roundTripMs = 500; // Until the first response, the fixed delay used before
+
+// Start a match request, the previous one is aborted
+export const nextMatchRequest = () => {
+    if (controller) {
+        controller.abort();
+    }
+    controller = new AbortController();
+    seq += 1;
+    return { session: sessionId, seq, signal: controller.signal };
+};
+
+export const isLatestMatchRequest = (requestSeq) => requestSeq === seq;
+
+// Moving average of the round trip of answered match requests
+export const recordRoundTrip = (elapsedMs) => {
+    roundTripMs = RTT_WEIGHT * elapsedMs + (1 - RTT_WEIGHT) * roundTripMs;
+};
+
+// Wait for a pause in typing as long as a match takes, a fast server answers while typing and a slow one is not sent
+// requests which would be superseded before they finish
+export const debounceDelay = () => Math.min(MAX_DEBOUNCE_MS, Math.max(MIN_DEBOUNCE_MS, roundTripMs));
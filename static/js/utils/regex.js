@@ -1,56 +1,126 @@
 // static/js/utils/regex.js
 
 import { attachMatchEventListeners } from '../components/output/hoverHighlight.js';
-
-export const fetchRegexMatch = async (regex, text, engine, elements) => {
-    const { matchesTable, highlightText, highlightRegex, execTime, webTime } = elements;
-
+import { updatePager } from '../components/output/matchesPager.js';
+import { isProfiling, updateProfile } from '../components/output/profileHeat.js';
+import { updateRedosWarning } from '../components/output/redosWarning.js';
+import { updateTimingBreakdown } from '../components/output/timingBreakdown.js';
+import { textPayload, forgetUploadedText } from './textUpload.js';
+import { nextMatchRequest, isLatestMatchRequest, recordRoundTrip } from './matchSession.js';
+import { isLive, sendLiveEdit } from './liveSession.js';
+
+const startLoading = ({ execTime, webTime }) => {
     execTime.classList.add('loading');
     execTime.textContent = '';
     webTime.textContent = '';
+};
+
+const stopLoading = ({ execTime, webTime }, startTime) => {
+    execTime.classList.remove('loading');
+    webTime.textContent = `Web: ${Math.round(performance.now() - startTime)} ms`;
+};
+
+const showThrottled = ({ execTime }, retryAfter) => {
+    // Throttled by the admission control, keep the last results until the client may match again
+    execTime.textContent = `Throttled, retry in ${retryAfter} s`;
+};
+
+const renderMatchResult = (data, regex, text, elements) => {
+    const { matchesTable, highlightText, highlightRegex, execTime } = elements;
+    matchesTable.innerHTML = data.matches_table;
+    highlightText.innerHTML = data.highlighted_text;
+    highlightRegex.innerHTML = data.highlighted_regex;
+    execTime.textContent = data.execution_time;
+    updateTimingBreakdown(data.timing);
+    updateRedosWarning(data.redos, regex);
+    updateProfile(data.profile, regex, text, elements);
+    updatePager(data);
+
+    // Store the fetched colors in localStorage
+    localStorage.setItem('darkThemeColors', JSON.stringify(data.dark_theme_color));
+    localStorage.setItem('lightThemeColors', JSON.stringify(data.light_theme_color));
+
+    // Apply dynamic styles based on the fetched colors
+    applyDynamicStyles(data.dark_theme_color, data.light_theme_color);
+
+    attachMatchEventListeners();
+
+    if (data.encode_data && regex !== '') {
+        const newUrl = `${window.location.origin}${window.location.pathname}?link=${data.encode_data}`;
+        window.history.replaceState({}, document.title, newUrl);
+    }
+    if (regex === '') {
+        const newUrl = `${window.location.origin}${window.location.pathname}`;
+        window.history.replaceState({}, document.title, newUrl);
+    }
+};
+
+// Answer of the live session to the latest edit, see liveSession.js
+export const renderLiveMessage = (message, { regex, text, elements, startTime }) => {
+    recordRoundTrip(performance.now() - startTime);
+    if (message.type === 'result') {
+        renderMatchResult(message.result, regex, text, elements);
+    } else if (message.status === 429) {
+        showThrottled(elements, Math.ceil(message.retry_after));
+    } else {
+        console.error('Error in live session', message.error);
+    }
+    stopLoading(elements, startTime);
+};
+
+export const fetchRegexMatch = async (regex, text, engine, elements, offset = 0) => {
+    // Also aborts a request still running from before the live session was connected
+    const { session, seq, signal } = nextMatchRequest();
+    startLoading(elements);
     const startTime = performance.now();
 
+    if (isLive()) {
+        // The server cancels the match of the previous edit, its answer is ignored
+        sendLiveEdit({ regex, text, engine, offset, profile: isProfiling() }, { regex, text, elements, startTime });
+        return;
+    }
+
     try {
-        const response = await fetch('/', {
+        const postMatch = async () => fetch('/', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ regex_input: regex, text_input: text, engine }) // Now send isDarkTheme
+            body: JSON.stringify({
+                regex_input: regex, ...(await textPayload(text)), engine, offset, profile: isProfiling(), session, seq
+            }),
+            signal
         });
+        let response = await postMatch();
+        if (response.status === 404) {
+            // The uploaded text was evicted from the server, upload it again
+            forgetUploadedText();
+            response = await postMatch();
+        }
 
+        if (!isLatestMatchRequest(seq) || response.status === 409) {
+            return; // Superseded by a newer request, which updates the page
+        }
+        recordRoundTrip(performance.now() - startTime);
+        if (response.status === 429) {
+            showThrottled(elements, response.headers.get('Retry-After'));
+            return;
+        }
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
 
         const data = await response.json();
-        matchesTable.innerHTML = data.matches_table;
-        highlightText.innerHTML = data.highlighted_text;
-        highlightRegex.innerHTML = data.highlighted_regex;
-        execTime.textContent = data.execution_time;
-
-        // Store the fetched colors in localStorage
-        localStorage.setItem('darkThemeColors', JSON.stringify(data.dark_theme_color));
-        localStorage.setItem('lightThemeColors', JSON.stringify(data.light_theme_color));
-
-        // Apply dynamic styles based on the fetched colors
-        applyDynamicStyles(data.dark_theme_color, data.light_theme_color);
-
-        attachMatchEventListeners();
-
-        if (data.encode_data && regex !== '') {
-            const newUrl = `${window.location.origin}${window.location.pathname}?link=${data.encode_data}`;
-            window.history.replaceState({}, document.title, newUrl);
-        }
-        if (regex === '') {
-            const newUrl = `${window.location.origin}${window.location.pathname}`;
-            window.history.replaceState({}, document.title, newUrl);
+        if (isLatestMatchRequest(seq)) {
+            renderMatchResult(data, regex, text, elements);
         }
     } catch (error) {
-        console.error('Error fetching regex match', error);
+        if (error.name !== 'AbortError') {
+            console.error('Error fetching regex match', error);
+        }
     } finally {
-        execTime.classList.remove('loading');
-        const endTime = performance.now();
-        const elapsedTime = endTime - startTime;
-        webTime.textContent = `Web: ${Math.round(elapsedTime)} ms`;
+        // A newer request shows its own progress and time
+        if (isLatestMatchRequest(seq)) {
+            stopLoading(elements, startTime);
+        }
     }
 };
 
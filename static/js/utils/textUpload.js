@@ -0,0 +1,37 @@
+// static/js/utils/textUpload.js
+
+// Texts from this size on are uploaded once and referenced by their handle in match requests
+const UPLOAD_THRESHOLD = 64 * 1024;
+
+let uploaded = { text: null, handle: null };
+
+const uploadText = async (text) => {
+    let body = new Blob([text], { type: 'text/plain; charset=utf-8' });
+    const headers = { 'Content-Type': 'text/plain; charset=utf-8' };
+    if (typeof CompressionStream !== 'undefined') {
+        body = await new Response(body.stream().pipeThrough(new CompressionStream('gzip'))).blob();
+        headers['Content-Encoding'] = 'gzip';
+    }
+
+    const response = await fetch('/upload_text', { method: 'POST', headers, body });
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return (await response.json()).handle;
+};
+
+// Request fields carrying the text: the text itself, or the handle of the uploaded text if it is large
+export const textPayload = async (text) => {
+    if (text.length < UPLOAD_THRESHOLD) {
+        return { text_input: text };
+    }
+    if (uploaded.text !== text) {
+        uploaded = { text, handle: await uploadText(text) };
+    }
+    return { text_handle: uploaded.handle };
+};
+
+// Forget the uploaded text, e.g. after the server evicted it
+export const forgetUploadedText = () => {
+    uploaded = { text: null, handle: null };
+};
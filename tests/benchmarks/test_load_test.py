@@ -0,0 +1,48 @@
+import logging
+import os
+import random
+
+import pytest
+
+from benchmarks.load_test import RequestFactory, _classify, parse_mix, process_tree_rss, summarize_load
+from project import log
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+class TestLoadTest:
+    def test_parse_mix(self):
+        assert parse_mix("index=70,engine_info=30") == {"index": 70.0, "engine_info": 30.0}
+        with pytest.raises(ValueError):
+            parse_mix("index=1,unknown=1")
+        with pytest.raises(ValueError):
+            parse_mix("index=0")
+
+    def test_request_factory_bust_cache(self):
+        factory = RequestFactory({"index": 1}, ["Python - re"], bust_cache=True)
+        rng = random.Random(0)
+        first, second = factory.build(rng), factory.build(rng)
+        assert first[0] == second[0] == "index"
+        assert first[1]["text_input"] != second[1]["text_input"]
+
+    def test_classify(self):
+        assert _classify(200, {"error": ""}) == "ok"
+        assert _classify(200, {"error": "Timeout exceeded: 5 seconds"}) == "timeout"
+        assert _classify(200, {"error": "JavaScript regex execution timed out."}) == "timeout"
+        assert _classify(500, None) == "error"
+        assert _classify(429, {"error": "The server is busy, try again shortly."}) == "throttled"
+
+    def test_summarize_load(self):
+        records = [("index", 0.1, "ok"), ("index", 0.3, "timeout"), ("example", 0.2, "error"), ("example", 0.2, "ok")]
+        summary = summarize_load(records, elapsed=2.0)
+        assert summary["all"]["requests"] == 4
+        assert summary["all"]["throughput"] == 2.0
+        assert summary["index"]["timeout_rate"] == 0.5
+        assert summary["example"]["error_rate"] == 0.5
+
+    @pytest.mark.skipif(not os.path.isdir("/proc"), reason="Requires /proc")
+    def test_process_tree_rss(self):
+        assert process_tree_rss(os.getpid()) > 0
@@ -0,0 +1,51 @@
+import logging
+
+import pytest
+
+from benchmarks.corpus import build_scenarios
+from benchmarks.run import compare, percentile, run_scenario, summarize
+from project import log
+from src.engine import PythonRe
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+def result(p50, error="", phase="warm", scenario="ipv4/small"):
+    return {
+        "engine": "Python - re",
+        "scenario": scenario,
+        "phase": phase,
+        "error": error,
+        "samples": [p50],
+        "p50": p50,
+    }
+
+
+class TestBenchmarks:
+    def test_percentile(self):
+        samples = [4.0, 1.0, 3.0, 2.0, 5.0]
+        assert percentile(samples, 50) == 3.0
+        assert percentile(samples, 95) == pytest.approx(4.8)
+        assert percentile([2.0], 95) == 2.0
+        assert summarize(samples)["max"] == 5.0
+
+    def test_scenarios_are_reproducible(self):
+        first = build_scenarios(scale=0.1, sizes=["small"])
+        second = build_scenarios(scale=0.1, sizes=["small"])
+        assert first == second
+        assert {scenario.name for scenario in first} >= {"ipv4/small", "backtracking/nested_quantifier"}
+
+    def test_run_scenario(self):
+        scenario = build_scenarios(scale=0.1, sizes=["small"])[0]
+        results = run_scenario(PythonRe(), scenario, repeat=3, cold_repeat=2)
+        assert [(entry["phase"], len(entry["samples"])) for entry in results] == [("cold", 2), ("warm", 3)]
+        assert all(entry["matches"] > 0 and entry["error"] == "" for entry in results)
+
+    def test_compare(self):
+        baseline = [result(1.0), result(1.0, phase="cold"), result(1.0, "Timeout", scenario="email/small")]
+        current = [result(1.1), result(1.5, phase="cold"), result(1.0, scenario="email/small")]
+        comparison = compare(current, baseline, tolerance=0.2)
+        assert [(entry["phase"], entry["regression"]) for entry in comparison] == [("warm", False), ("cold", True)]
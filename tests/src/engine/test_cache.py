@@ -0,0 +1,71 @@
+import logging
+import re
+
+import pytest
+
+from project import log
+from src.engine.cache import CompiledPattern, PatternCache
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+@pytest.fixture
+def evicted():
+    return []
+
+
+@pytest.fixture
+def cache(evicted):
+    return PatternCache(max_size=2, on_evict=evicted.append)
+
+
+class TestPatternCache:
+    def test_compile_once(self, cache):
+        calls = []
+        assert cache.get("a", lambda: calls.append("a") or "compiled-a") == "compiled-a"
+        assert cache.get("a", lambda: calls.append("a") or "compiled-a") == "compiled-a"
+        assert calls == ["a"]
+
+    def test_evict_least_recently_used(self, cache, evicted):
+        cache.get("a", lambda: "compiled-a")
+        cache.get("b", lambda: "compiled-b")
+        cache.get("a", lambda: "compiled-a")
+        cache.get("c", lambda: "compiled-c")
+        assert evicted == ["compiled-b"]
+        assert len(cache) == 2
+
+    def test_compile_error_not_cached(self, cache):
+        def fail():
+            raise ValueError("bad pattern")
+
+        with pytest.raises(ValueError):
+            cache.get("bad", fail)
+        assert len(cache) == 0
+
+    def test_clear(self, cache, evicted):
+        cache.get("a", lambda: "compiled-a")
+        cache.clear()
+        assert evicted == ["compiled-a"]
+        assert len(cache) == 0
+
+    def test_stats(self, cache):
+        cache.get("a", lambda: "compiled-a")
+        cache.get("a", lambda: "compiled-a")
+        cache.get("b", lambda: "compiled-b")
+        cache.get("c", lambda: "compiled-c")
+        stats = cache.stats()
+        assert stats["size"] == 2
+        assert stats["hits"] == 1
+        assert stats["misses"] == 3
+        assert stats["evictions"] == 1
+        assert stats["compile_time"] >= 0
+
+
+class TestCompiledPattern:
+    def test_from_regex(self):
+        compiled = CompiledPattern.from_regex(re.compile(r"(?P<year>\d{4})-(\d{2})-(?P<day>\d{2})"))
+        assert compiled.group_names == {1: "year", 3: "day"}
+        assert compiled.group_count == 3
@@ -1,11 +1,13 @@
 import logging
 import os
 import re
+import time
 
 import pytest
 
 from project import Path, log
 from src.engine import CppRegex
+from src.engine.cpp import cpp
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -53,9 +55,71 @@ class TestCppRegex:
         result = engine.match(pattern=pattern, text=text, flags=0)
         assert result == expected_result
 
+    def test_match_unicode(self, engine):
+        pattern = r"(w)(x)?orld"
+        text = "Zażółć, world!"
+        expected_result = (
+            [
+                {
+                    "match": "world",
+                    "index": [8, 13],
+                    "groups": [{"name": "", "value": "w", "index": [8, 9]}, {"name": "", "value": "", "index": []}],
+                }
+            ],
+            "",
+        )
+        result = engine.match(pattern=pattern, text=text, flags=0)
+        assert result == expected_result
+
     def test_error_match(self, engine):
         pattern = r"(?s<word>[A-Z]\w+)\W"
         text = "Hello, World!"
         expected_result = ([], "Invalid '(?...)' zero-width assertion in regular expression")
         result = engine.match(pattern=pattern, text=text, flags=0)
         assert result == expected_result
+
+    def test_compiled_pattern_reused(self, engine):
+        pattern = r"[A-Z]\w+ reused"
+        engine.match(pattern=pattern, text="Hello reused", flags=0)
+        pattern_cache = cpp._pattern_caches[engine.lib_path]
+        cached = len(pattern_cache)
+        matches, error = engine.match(pattern=pattern, text="World reused", flags=0)
+        assert error == ""
+        assert matches[0]["match"] == "World reused"
+        assert len(pattern_cache) == cached
+
+    def test_match_large_text(self, engine):
+        text = "a" * 500_000
+        matches, error = engine.match(pattern=r"a.*", text=text, flags=0)
+        assert error == ""
+        assert matches[0]["index"] == [0, len(text)]
+
+    def test_match_timeout(self, engine, monkeypatch):
+        monkeypatch.setattr(engine, "match_timeout", 0.2)
+        matches, error = engine.match(pattern=r"\w", text="ab " * 2_000_000, flags=0)
+        assert matches == []
+        assert error == "Timeout exceeded: 0.2 seconds"
+
+    def test_match_timeout_of_the_match(self, engine):
+        # A shorter timeout of the match is kept inside the library, with a margin for sending the result back
+        matches, error = engine.match(pattern=r"\w", text="ab " * 2_000_000, flags=0, timeout=0.6)
+        assert (matches, error) == ([], "Timeout exceeded: 0.35 seconds")
+
+    def test_match_timeout_without_match(self, engine, monkeypatch):
+        # Every start position scans to the end of the text and fails, the deadline is checked during the scan
+        monkeypatch.setattr(engine, "match_timeout", 0.5)
+        start_time = time.perf_counter()
+        matches, error = engine.match(pattern=r"(a|b)*c", text="ab" * 200_000, flags=0)
+        assert (matches, error) == ([], "Timeout exceeded: 0.5 seconds")
+        assert time.perf_counter() - start_time < 3
+
+    def test_match_timeout_while_skipping(self, engine, monkeypatch):
+        monkeypatch.setattr(engine, "match_timeout", 0.2)
+        matches, error = engine.match(pattern=r"\w", text="ab " * 2_000_000, flags=0, limit=1, offset=3_000_000)
+        assert (matches, error) == ([], "Timeout exceeded: 0.2 seconds")
+
+    def test_match_limit_offset(self, engine):
+        matches, error = engine.match(pattern=r"\d", text="1 2 3 4 5", flags=0, limit=2, offset=1)
+        assert error == ""
+        assert [match["match"] for match in matches] == ["2", "3"]
+        assert matches[0]["index"] == [2, 3]
@@ -0,0 +1,53 @@
+import logging
+import sys
+
+import pytest
+
+from project import log
+from src.engine.daemon import LengthPrefixedDaemon
+
+_ECHO_SERVER = """
+import json, struct, sys
+while True:
+    header = sys.stdin.buffer.read(4)
+    if len(header) < 4:
+        break
+    request = json.loads(sys.stdin.buffer.read(struct.unpack(">I", header)[0]))
+    if request.get("exit"):
+        break
+    body = json.dumps({"echo": request, "length": len(request.get("text", ""))}).encode()
+    sys.stdout.buffer.write(struct.pack(">I", len(body)) + body)
+    sys.stdout.buffer.flush()
+"""
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+@pytest.fixture
+def daemon():
+    echo_daemon = LengthPrefixedDaemon("Echo", [sys.executable, "-c", _ECHO_SERVER])
+    yield echo_daemon
+    echo_daemon.close()
+
+
+class TestLengthPrefixedDaemon:
+    def test_request(self, daemon):
+        assert daemon.request({"text": "Hello"}) == {"echo": {"text": "Hello"}, "length": 5}
+
+    def test_process_reused(self, daemon):
+        daemon.request({"text": "a"})
+        pid = daemon._process.pid
+        daemon.request({"text": "b"})
+        assert daemon._process.pid == pid
+
+    def test_large_text(self, daemon):
+        text = "ż" * 1_000_000  # Would not fit into a single argv entry
+        assert daemon.request({"text": text})["length"] == len(text)
+
+    def test_restart_after_exit(self, daemon):
+        with pytest.raises(RuntimeError):
+            daemon.request({"exit": True})
+        assert daemon.request({"text": "again"})["length"] == 5
@@ -73,6 +73,23 @@ class TestJavaRegex:
         result = engine.match(pattern=pattern, text=text, flags=0)
         assert result == expected_result
 
+    def test_match_large_text(self, engine):
+        text = "Hello, World! " * 200_000  # Larger than a single command line argument
+        matches, error = engine.match(pattern=r"World", text=text, flags=0)
+        assert error == ""
+        assert len(matches) == 200_000
+
+    def test_match_timeout(self, engine, monkeypatch):
+        monkeypatch.setattr(engine, "match_timeout_ms", 200)
+        matches, error = engine.match(pattern=r"(a+)+$", text="a" * 60 + "!", flags=0)
+        assert matches == []
+        assert error == "Timeout exceeded: 0.2 seconds"
+        assert engine.match(pattern=r"a+", text="aaa", flags=0)[0][0]["match"] == "aaa"
+
+    def test_match_timeout_of_the_match(self, engine):
+        matches, error = engine.match(pattern=r"(a+)+$", text="a" * 60 + "!", flags=0, timeout=0.6)
+        assert (matches, error) == ([], "Timeout exceeded: 0.35 seconds")
+
     def test_error_match(self, engine):
         pattern = r"(?s<word>[A-Z]\w+)\W"
         text = "Hello, World!"
@@ -90,3 +107,9 @@ class TestJavaRegex:
         assert "CASE_INSENSITIVE" in flags
         assert "MULTILINE" in flags
         assert "DOTALL" in flags
+
+    def test_match_limit_offset(self, engine):
+        matches, error = engine.match(pattern=r"\d", text="1 2 3 4 5", flags=0, limit=2, offset=1)
+        assert error == ""
+        assert [match["match"] for match in matches] == ["2", "3"]
+        assert matches[0]["index"] == [2, 3]
@@ -1,5 +1,6 @@
 import logging
 import re
+import time
 
 import pytest
 
@@ -57,6 +58,45 @@ class TestJavaScriptRegex:
         result = engine.match(pattern=pattern, text=text, flags=0)
         assert result == expected_result
 
+    def test_match_group_name_same_value(self, engine):
+        pattern = r"(?<first>a)(a)(?<third>a)?"
+        text = "aa"
+        expected_result = (
+            [
+                {
+                    "match": "aa",
+                    "index": [0, 2],
+                    "groups": [
+                        {"name": "first", "value": "a", "index": [0, 1]},
+                        {"name": "", "value": "a", "index": [1, 2]},
+                        {"name": "third", "value": "", "index": []},
+                    ],
+                }
+            ],
+            "",
+        )
+        result = engine.match(pattern=pattern, text=text, flags=0)
+        assert result == expected_result
+
+    def test_match_large_text(self, engine):
+        text = "Hello, World! " * 200_000  # Larger than a single command line argument
+        matches, error = engine.match(pattern=r"World", text=text, flags=0)
+        assert error == ""
+        assert len(matches) == 200_000
+
+    def test_match_timeout(self, engine, monkeypatch):
+        monkeypatch.setattr(engine, "match_timeout_ms", 200)
+        matches, error = engine.match(pattern=r"(a+)+$", text="a" * 60 + "!", flags=0)
+        assert matches == []
+        assert error == "JavaScript regex execution timed out."
+        assert engine.match(pattern=r"a+", text="aaa", flags=0)[0][0]["match"] == "aaa"
+
+    def test_match_timeout_of_the_match(self, engine):
+        start_time = time.perf_counter()
+        matches, error = engine.match(pattern=r"(a+)+$", text="a" * 60 + "!", flags=0, timeout=0.6)
+        assert (matches, error) == ([], "JavaScript regex execution timed out.")
+        assert time.perf_counter() - start_time < 0.6
+
     def test_no_match(self, engine):
         pattern = r"(?<name>\d+)\W"
         text = "Hello, World!"
@@ -73,3 +113,9 @@ class TestJavaScriptRegex:
         )
         result = engine.match(pattern=pattern, text=text, flags=0)
         assert result == expected_result
+
+    def test_match_limit_offset(self, engine):
+        matches, error = engine.match(pattern=r"\d", text="1 2 3 4 5", flags=0, limit=2, offset=1)
+        assert error == ""
+        assert [match["match"] for match in matches] == ["2", "3"]
+        assert matches[0]["index"] == [2, 3]
@@ -0,0 +1,58 @@
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+from project import log
+from src.engine.manifest import CapabilityManifest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return CapabilityManifest(path=os.path.join(tmp_path, "engine_manifest.json"))
+
+
+class Probe:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"version": "1.0.0", "flags": {"IGNORECASE": 2}, "features": {}}
+
+
+class TestCapabilityManifest:
+    def test_probe_once(self, manifest):
+        probe = Probe()
+        assert manifest.get("Engine", sys.executable, probe)["version"] == "1.0.0"
+        assert manifest.get("Engine", sys.executable, probe)["flags"] == {"IGNORECASE": 2}
+        assert probe.calls == 1
+
+    def test_shared_on_disk(self, manifest):
+        probe = Probe()
+        manifest.get("Engine", sys.executable, probe)
+        other_process_manifest = CapabilityManifest(path=manifest.path)
+        assert other_process_manifest.get("Engine", sys.executable, probe)["version"] == "1.0.0"
+        assert probe.calls == 1
+
+    def test_probe_again_when_binary_changed(self, manifest):
+        probe = Probe()
+        manifest.get("Engine", sys.executable, probe)
+        with open(manifest.path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        data["Engine"]["mtime"] -= 1
+        with open(manifest.path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        manifest.get("Engine", sys.executable, probe)
+        assert probe.calls == 2
+
+    def test_missing_binary(self, manifest):
+        with pytest.raises(FileNotFoundError):
+            manifest.get("Engine", "openregex-nonexistent-binary", Probe())
@@ -0,0 +1,66 @@
+import logging
+import re
+
+import pytest
+
+from project import log
+from src.engine.profiler import profile
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+class TestProfiler:
+    @pytest.mark.parametrize("engine", ["Python - re", "Python - regex"])
+    @pytest.mark.parametrize(
+        "pattern, text",
+        [
+            (r"\d+", "a1 b22 c333"),
+            (r"(\w+)@(\w+)\.com", "mail john@example.com or jane@test.com"),
+            (r"(a|ab)(c|bcd)(d*)", "abcd"),
+            (r"(?<=\$)\d+(?:\.\d\d)?", "costs $12.50 or $3"),
+            (r"(\w)\1", "hello bookkeeper"),
+            (r"(?m)^\s*#.*$", "x = 1\n  # comment\n#another"),
+            (r"a{2,3}?", "aaaaaaa"),
+            (r"\bcat\b", "cat concat cat."),
+            (r"x*", "axxb"),
+        ],
+    )
+    def test_matches(self, engine, pattern, text):
+        result = profile(pattern, text, engine)
+        assert not result["error"]
+        assert result["matches"] == len(list(re.finditer(pattern, text)))
+        assert len(result["pattern_steps"]) == len(pattern)
+        # Searches also start at the end of the text
+        assert len(result["text_steps"]) == len(text) + 1
+        assert result["steps"] > 0
+
+    def test_flags(self):
+        assert profile(r"^b", "a\nb", "Python - re", flags=re.MULTILINE)["matches"] == 1
+        assert profile(r"^b", "a\nb", "Python - re")["matches"] == 0
+        assert profile(r"(?i)A+", "aAa", "Python - re")["matches"] == 1
+
+    def test_budget(self):
+        pattern = r"(a+)+$"
+        result = profile(pattern, "a" * 30 + "b", "Python - re", max_steps=10_000)
+        assert result["exhausted"]
+        assert result["steps"] == 10_000
+        hotspot = result["hotspots"][0]
+        assert pattern[hotspot["start"] : hotspot["end"]] in ("a+", "(a+)+", "(a+)")
+        assert hotspot["backtracks"] > 0
+        assert sum(result["text_steps"]) <= 10_000
+
+    def test_hot_character(self):
+        result = profile(r"x.*y", "x" + "a" * 50, "Python - re")
+        assert not result["exhausted"]
+        # The greedy dot backtracks over the whole text before the missing y fails
+        assert max(result["pattern_steps"]) == max(result["pattern_steps"][1:3])
+        assert result["text_steps"][0] > result["text_steps"][1]
+
+    def test_errors(self):
+        assert "Profiling is available" in profile(r"a", "a", "Java")["error"]
+        assert profile(r"(a", "a", "Python - re")["error"]
+        assert profile(r"(?(1)a|b)", "a", "Python - regex")["error"]
+        assert profile(r"(?(1)a|b)", "a", "Python - re")["error"]
@@ -76,3 +76,18 @@ class TestPythonRe:
         assert "IGNORECASE" in flags
         assert "MULTILINE" in flags
         assert "DOTALL" in flags
+
+    def test_match_chunks(self, engine):
+        chunks = list(engine.match_chunks(pattern=r"\d", text="1 2 3 4 5", flags=0, chunk_size=2))
+        assert [[match["match"] for match in matches] for matches, _ in chunks] == [["1", "2"], ["3", "4"], ["5"]]
+        assert all(error == "" for _, error in chunks)
+
+    def test_match_chunks_error(self, engine):
+        chunks = list(engine.match_chunks(pattern=r"(", text="Hello", flags=0))
+        assert chunks == [([], "missing ), unterminated subpattern at position 0")]
+
+    def test_match_limit_offset(self, engine):
+        matches, error = engine.match(pattern=r"\d", text="1 2 3 4 5", flags=0, limit=2, offset=1)
+        assert error == ""
+        assert [match["match"] for match in matches] == ["2", "3"]
+        assert matches[0]["index"] == [2, 3]
@@ -89,3 +89,9 @@ class TestPythonRe:
         assert "IGNORECASE" in flags
         assert "MULTILINE" in flags
         assert "DOTALL" in flags
+
+    def test_match_limit_offset(self, engine):
+        matches, error = engine.match(pattern=r"\d", text="1 2 3 4 5", flags=0, limit=2, offset=1)
+        assert error == ""
+        assert [match["match"] for match in matches] == ["2", "3"]
+        assert matches[0]["index"] == [2, 3]
@@ -0,0 +1,132 @@
+import logging
+import multiprocessing
+
+import pytest
+
+from project import log
+from src.admission import (
+    REASON_BUSY,
+    REASON_CLIENT_CPU,
+    REASON_CLIENT_INFLIGHT,
+    AdmissionController,
+    Throttled,
+    engine_seconds,
+)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+@pytest.fixture
+def admission_path(tmp_path):
+    return str(tmp_path / "admission.sqlite3")
+
+
+def _admission(path, **limits):
+    return AdmissionController(
+        path=path,
+        rate=limits.get("rate", 1.0),
+        burst=limits.get("burst", 5.0),
+        max_inflight=limits.get("max_inflight", 0),
+        client_max_inflight=limits.get("client_max_inflight", 0),
+    )
+
+
+def _acquire_in_child(path):
+    _admission(path, max_inflight=1).acquire("child")
+
+
+def _spend_in_child(path):
+    admission = _admission(path)
+    admission.release(admission.acquire("client"), "client", 10.0)
+
+
+class TestAdmission:
+    def test_bucket(self, admission_path):
+        admission = _admission(admission_path)
+        for _ in range(3):
+            admission.release(admission.acquire("client"), "client", 0.01)
+        # One slow match empties the bucket, the next one is refused until the debt is paid back
+        admission.release(admission.acquire("client"), "client", 7.0)
+        with pytest.raises(Throttled) as error:
+            admission.acquire("client")
+        assert error.value.reason == REASON_CLIENT_CPU
+        assert 1.9 < error.value.retry_after <= 2.1
+        assert error.value.retry_after_header == "3"
+        # Other clients are not affected
+        admission.release(admission.acquire("other"), "other", 0.01)
+
+    def test_bucket_shared_across_processes(self, admission_path):
+        process = multiprocessing.get_context("spawn").Process(target=_spend_in_child, args=(admission_path,))
+        process.start()
+        process.join()
+        with pytest.raises(Throttled):
+            _admission(admission_path).acquire("client")
+
+    def test_client_inflight(self, admission_path):
+        admission = _admission(admission_path, client_max_inflight=2)
+        first = admission.acquire("client")
+        admission.acquire("client")
+        with pytest.raises(Throttled) as error:
+            admission.acquire("client")
+        assert error.value.reason == REASON_CLIENT_INFLIGHT
+        admission.acquire("other")
+        admission.release(first, "client", 0.0)
+        admission.acquire("client")
+
+    def test_slots(self, admission_path):
+        admission = _admission(admission_path, client_max_inflight=3)
+        batch = admission.acquire("client", 2)
+        admission.acquire("client")
+        # A batch counts with the matches it runs at the same time
+        with pytest.raises(Throttled) as error:
+            admission.acquire("client", 2)
+        assert error.value.reason == REASON_CLIENT_INFLIGHT
+        admission.release(batch, "client", 0.0)
+        admission.acquire("client", 2)
+        # A request wider than the cap runs only alone
+        wide = admission.acquire("other", 4)
+        with pytest.raises(Throttled):
+            admission.acquire("other")
+        admission.release(wide, "other", 0.0)
+        admission.acquire("other")
+
+    def test_host_inflight(self, admission_path):
+        admission = _admission(admission_path, max_inflight=2)
+        first = admission.acquire("a")
+        admission.acquire("b")
+        with pytest.raises(Throttled) as error:
+            admission.acquire("c")
+        assert error.value.reason == REASON_BUSY
+        admission.release(first, "a", 0.0)
+        admission.acquire("c")
+
+    def test_inflight_of_dead_process(self, admission_path):
+        process = multiprocessing.get_context("spawn").Process(target=_acquire_in_child, args=(admission_path,))
+        process.start()
+        process.join()
+        # The child never released its match, it is dropped once the process is gone
+        _admission(admission_path, max_inflight=1).acquire("client")
+
+    def test_disabled(self, admission_path):
+        admission = _admission(admission_path, rate=0)
+        assert not admission.enabled
+        assert admission.acquire("client") is None
+        admission.release(None, "client", 100.0)
+        assert admission.acquire("client") is None
+
+    def test_database_error(self, tmp_path):
+        (tmp_path / "admission").mkdir()
+        # A directory cannot be opened as a database, matches are admitted anyway
+        admission = _admission(str(tmp_path / "admission"))
+        assert admission.acquire("client") is None
+        admission.release(None, "client", 100.0)
+
+    def test_engine_seconds(self):
+        assert engine_seconds({"queue": 0.5, "ipc": 0.1, "cpu": 0.2, "total": 1.0}) == pytest.approx(0.4)
+        assert engine_seconds({"queue": 0.0, "ipc": 0.0, "cpu": 0.9, "total": 0.5}) == 0.9
+        # Killed workers and exhausted pools report no CPU time
+        assert engine_seconds({"queue": 0.1, "ipc": None, "cpu": None, "total": 5.1}) == pytest.approx(5.0)
+        assert engine_seconds({"queue": 5.0, "ipc": None, "cpu": None, "total": 5.0}) == 0.0
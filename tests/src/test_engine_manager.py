@@ -1,4 +1,5 @@
 import logging
+import time
 
 import pytest
 
@@ -12,10 +13,27 @@ def set_log_level():
     log.setLevel(logging.DEBUG)
 
 
+class SlowEngine(PythonRe):
+    """Python `re` taking a fixed time for every match, the name tells the engines apart."""
+
+    def __init__(self, name):
+        self._engine_name = name
+        super().__init__()
+
+    def _set_name(self):
+        return self._engine_name
+
+    def _match(self, pattern, text, flags, limit=0, offset=0, timeout=None):
+        time.sleep(0.5)
+        return super()._match(pattern, text, flags, limit, offset, timeout)
+
+
 @pytest.fixture
 def engine_manager():
     """Fixture to create an EngineManager instance before each test."""
-    return EngineManager()
+    manager = EngineManager()
+    yield manager
+    manager.close()
 
 
 class TestEngineManager:
@@ -83,3 +101,43 @@ class TestEngineManager:
         matches, error, execution_time = engine_manager.match("Python - re", pattern, text)
         assert error == ""
         assert matches[0]["match"] == "abcdefgh"
+
+    def test_match_many(self, engine_manager):
+        jobs = [
+            {"engine": "Python - re", "pattern": r"\d+", "text": "a 1 b 22"},
+            {"engine": "Python - re", "pattern": r"(a+)+$", "text": "a" * 60 + "!", "timeout": 0.5},
+            {"engine": "C++", "pattern": r"[a-z]", "text": "a 1 b 22", "limit": 1},
+            {"engine": "nonexistent_engine", "pattern": r"\w", "text": "a"},
+        ]
+        results = engine_manager.match_many(jobs)
+        assert [match["match"] for match in results[0]["matches"]] == ["1", "22"]
+        assert results[1]["error"] == "Timeout exceeded: 0.5 seconds"
+        assert [match["match"] for match in results[2]["matches"]] == ["a"]
+        assert results[2]["has_more"]
+        assert results[3]["error"] == "Engine nonexistent_engine not found"
+
+    def test_compare_parallel(self, monkeypatch):
+        def init_slow_engines(manager):
+            for index in range(5):
+                engine = SlowEngine(f"Slow {index}")
+                manager.engine[engine.name] = engine
+
+        monkeypatch.setattr(EngineManager, "_init_engine", init_slow_engines)
+        manager = EngineManager()
+        try:
+            manager.start()
+            start_time = time.perf_counter()
+            results = manager.compare(r"\d+", "a 1 b 22")
+            elapsed = time.perf_counter() - start_time
+        finally:
+            manager.close()
+        assert all(result["error"] == "" for result in results.values())
+        # Every engine matches at the same time, the comparison takes as long as one of them
+        assert elapsed < 0.9
+
+    def test_compare(self, engine_manager):
+        results = engine_manager.compare(r"\d+", "a 1 b 22")
+        assert list(results) == engine_manager.get_engine_list()
+        for result in results.values():
+            assert result["error"] == ""
+            assert [match["index"] for match in result["matches"]] == [[2, 3], [6, 8]]
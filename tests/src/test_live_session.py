@@ -0,0 +1,60 @@
+import logging
+
+import pytest
+
+from project import log
+from src.live_session import LiveSession, ResyncRequired
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+@pytest.fixture
+def session():
+    session = LiveSession()
+    session.apply({"seq": 1, "regex": r"\w+", "engine": "Python - re", "text": "hello world"})
+    return session
+
+
+class TestLiveSession:
+    def test_full_text(self, session):
+        assert (session.seq, session.regex, session.engine, session.text) == (1, r"\w+", "Python - re", "hello world")
+        assert session.synced
+
+    def test_splice(self, session):
+        session.apply({"seq": 2, "splice": [5, 5, ","], "length": 12})
+        assert session.text == "hello, world"
+        # Fields missing from an edit keep their value
+        assert (session.seq, session.regex, session.engine) == (2, r"\w+", "Python - re")
+
+    def test_splice_code_points(self, session):
+        session.apply({"seq": 2, "splice": [6, 11, "🌍🌎"], "length": 8})
+        session.apply({"seq": 3, "splice": [7, 8, "🌏"], "length": 8})
+        assert session.text == "hello 🌍🌏"
+
+    @pytest.mark.parametrize(
+        "splice, length",
+        [
+            ([0, 20, ""], 0),
+            ([6, 5, ""], 12),
+            ([0, 0, "a"], 100),
+        ],
+    )
+    def test_resync(self, session, splice, length):
+        with pytest.raises(ResyncRequired):
+            session.apply({"seq": 2, "regex": "x", "splice": splice, "length": length})
+        # A rejected edit leaves the session as it was
+        assert (session.seq, session.regex, session.text) == (1, r"\w+", "hello world")
+
+    def test_resync_without_text(self):
+        with pytest.raises(ResyncRequired):
+            LiveSession().apply({"seq": 1, "splice": [0, 0, "a"], "length": 1})
+
+    def test_invalid(self, session):
+        with pytest.raises(KeyError):
+            session.apply({"regex": "x"})
+        with pytest.raises(ValueError):
+            session.apply({"seq": 2, "offset": "first"})
+        assert (session.seq, session.regex, session.offset) == (1, r"\w+", 0)
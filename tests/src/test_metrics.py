@@ -0,0 +1,64 @@
+import logging
+import multiprocessing
+
+import pytest
+
+from project import log
+from src.metrics import Metrics
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+@pytest.fixture
+def metrics_store(tmp_path):
+    return Metrics(path=str(tmp_path / "metrics.sqlite3"), flush_interval=60)
+
+
+def _record_in_child(path):
+    child = Metrics(path=path, flush_interval=60)
+    child.inc("openregex_worker_spawns_total", value=2)
+    child.add("openregex_inflight_matches", 3)
+    child.flush()
+
+
+class TestMetrics:
+    def test_counter(self, metrics_store):
+        metrics_store.inc("openregex_match_timeouts_total", {"engine": "C++"})
+        metrics_store.inc("openregex_match_timeouts_total", {"engine": "C++"}, value=2)
+        assert metrics_store.collect()[("openregex_match_timeouts_total", '[["engine", "C++"]]')] == 3
+
+    def test_counters_aggregated_across_processes(self, metrics_store):
+        metrics_store.inc("openregex_worker_spawns_total")
+        process = multiprocessing.get_context("spawn").Process(target=_record_in_child, args=(metrics_store.path,))
+        process.start()
+        process.join()
+        totals = metrics_store.collect()
+        assert totals[("openregex_worker_spawns_total", "[]")] == 3
+        # Gauges of exited processes are dropped
+        assert ("openregex_inflight_matches", "[]") not in totals
+
+    def test_gauge(self, metrics_store):
+        metrics_store.add("openregex_inflight_matches", 1)
+        metrics_store.add("openregex_inflight_matches", 1)
+        metrics_store.add("openregex_inflight_matches", -1)
+        assert metrics_store.collect()[("openregex_inflight_matches", "[]")] == 1
+
+    def test_render_histogram(self, metrics_store):
+        for value in (0.002, 0.3, 20):
+            metrics_store.observe("openregex_match_duration_seconds", value, {"engine": "Python - re"})
+        text = metrics_store.render()
+        assert "# TYPE openregex_match_duration_seconds histogram" in text
+        assert 'openregex_match_duration_seconds_bucket{engine="Python - re",le="0.001"} 0' in text
+        assert 'openregex_match_duration_seconds_bucket{engine="Python - re",le="0.005"} 1' in text
+        assert 'openregex_match_duration_seconds_bucket{engine="Python - re",le="0.5"} 2' in text
+        assert 'openregex_match_duration_seconds_bucket{engine="Python - re",le="+Inf"} 3' in text
+        assert 'openregex_match_duration_seconds_count{engine="Python - re"} 3' in text
+        lines = [line for line in text.splitlines() if line.startswith("openregex_match_duration_seconds_bucket")]
+        assert lines[-1].endswith('le="+Inf"} 3')
+
+    def test_render_escapes_labels(self, metrics_store):
+        metrics_store.inc("openregex_worker_kills_total", {"reason": 'a"b\\c'})
+        assert 'openregex_worker_kills_total{reason="a\\"b\\\\c"} 1' in metrics_store.render()
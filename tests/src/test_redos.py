@@ -0,0 +1,99 @@
+import logging
+import re
+import time
+
+import pytest
+
+from project import log
+from src.redos import RISK_EXPONENTIAL, RISK_NONE, RISK_POLYNOMIAL, analyze
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+class TestRedos:
+    @pytest.mark.parametrize(
+        "pattern, kind",
+        [
+            (r"(a+)+$", "nested_quantifier"),
+            (r"(\w+\s?)*$", "nested_quantifier"),
+            (r"((ab)*)*", "nested_quantifier"),
+            (r"(a|aa)*b", "ambiguous_alternation"),
+            (r"(\w|\d)+", "ambiguous_alternation"),
+            # Bounded variable quantifiers give back characters like unbounded ones
+            (r"(a{1,5})+$", "nested_quantifier"),
+            (r"^(\d{1,3})+$", "nested_quantifier"),
+            (r"(a?){25}a{25}", "nested_quantifier"),
+            (r"(\s*,\s*)*$", "overlapping_repetitions"),
+        ],
+    )
+    def test_exponential(self, pattern, kind):
+        report = analyze(pattern)
+        assert report.risk == RISK_EXPONENTIAL
+        assert [finding.kind for finding in report.findings] == [kind]
+
+    @pytest.mark.parametrize(
+        "pattern", [r"\d+\.?\d+", r".*.*=", r"[a-m]+[k-z]+", r"(a+){2,5}", r"(?:ab)+(?:ab)+", r"(a?){3}"]
+    )
+    def test_polynomial(self, pattern):
+        assert analyze(pattern).risk == RISK_POLYNOMIAL
+
+    @pytest.mark.parametrize(
+        "pattern",
+        [
+            r"(a+b)+",
+            r"([^,]+,)+",
+            r"(?:a|b)*c",
+            r"(\d{1,3}\.){3}\d{1,3}",
+            r"^[\w.+-]+@[\w-]+\.[\w.-]+$",
+            r"\s*\w+\s*",
+            r"(\p{L}|\d)+",
+            r"\Q(a+)+\E",
+            r"(a+",
+            r"[",
+            # Alternatives sharing a first character, but no text
+            r"(ab|ac)*",
+            r"(?:Mon|Tue|Thu)+",
+            r"(a|ab|abc)*",
+            r"(x(a|aa))*",
+            # The item between the quantifiers ends every repetition
+            r"(?:[0-9]+,)*[0-9]+",
+            r"\w+(?:-\w+)*",
+            r"(-?\d+,)*",
+            r"(\s*,)*",
+        ],
+    )
+    def test_safe(self, pattern):
+        assert analyze(pattern).risk == RISK_NONE
+
+    def test_finding_span(self):
+        pattern = r"^id=(\d+)+;"
+        finding = analyze(pattern).findings[0]
+        assert pattern[finding.start : finding.end] == r"(\d+)+"
+
+    def test_flags(self):
+        assert analyze(r"(A|a)+").risk == RISK_NONE
+        assert analyze(r"(A|a)+", flags=re.IGNORECASE).risk == RISK_EXPONENTIAL
+        assert analyze(r"(?i)(A|a)+").risk == RISK_EXPONENTIAL
+        assert analyze(r"(a +) + $", flags=re.VERBOSE).risk == RISK_EXPONENTIAL
+
+    def test_dialects(self):
+        # Possessive quantifiers and atomic groups give back nothing where they are supported
+        assert analyze(r"(a++)+", "Java").risk == RISK_NONE
+        assert analyze(r"(?>a+)+", "Python - regex").risk == RISK_NONE
+        assert analyze(r"(?>a+)+", "JavaScript").risk == RISK_EXPONENTIAL
+
+    def test_fast(self):
+        analyze.cache_clear()
+        start_time = time.perf_counter()
+        analyze(r"(\d+\.\d+\.\d+\.\d+) - - \[([^\]]+)\] \"([A-Z]+) (\S+) [^\"]*\" (\d{3}) (\d+)")
+        assert time.perf_counter() - start_time < 0.01
+        start_time = time.perf_counter()
+        for _ in range(1000):
+            analyze(r"(\d+\.\d+\.\d+\.\d+) - - \[([^\]]+)\] \"([A-Z]+) (\S+) [^\"]*\" (\d{3}) (\d+)")
+        assert time.perf_counter() - start_time < 0.01
+
+    def test_deeply_nested(self):
+        assert analyze("(" * 5000 + "a" + ")" * 5000).risk == RISK_NONE
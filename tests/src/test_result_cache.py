@@ -0,0 +1,93 @@
+import logging
+import sqlite3
+
+import pytest
+
+from project import log
+from src.result_cache import ResultCache
+from src.text_store import TextHandle
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "results.sqlite3")
+
+
+@pytest.fixture
+def cache(cache_path):
+    return ResultCache(cache_path, max_bytes=200, access_interval=0)
+
+
+class TestResultCache:
+    def test_get_put(self, cache):
+        key = ResultCache.make_key("Python - re", "2.2.1", r"\w+", 0, "Hello")
+        assert cache.get(key) is None
+        cache.put(key, {"matches": [{"match": "Hello"}]})
+        assert cache.get(key) == {"matches": [{"match": "Hello"}]}
+
+    def test_key_depends_on_every_input(self):
+        key = ResultCache.make_key("Python - re", "2.2.1", "ab", 0, "c")
+        assert key != ResultCache.make_key("Python - re", "2.2.1", "a", 0, "bc")
+        assert key != ResultCache.make_key("Python - re", "2.2.2", "ab", 0, "c")
+        assert key != ResultCache.make_key("Python - regex", "2.2.1", "ab", 0, "c")
+
+    def test_key_of_uploaded_text(self):
+        handle = TextHandle("0" * 64)
+        key = ResultCache.make_key("Python - re", "2.2.1", "a", 0, handle)
+        assert key == ResultCache.make_key("Python - re", "2.2.1", "a", 0, TextHandle("0" * 64))
+        # The handle is not mistaken for a text with the same characters
+        assert key != ResultCache.make_key("Python - re", "2.2.1", "a", 0, "0" * 64)
+
+    def test_shared_between_instances(self, cache, cache_path):
+        cache.put("shared", {"value": 1})
+        assert ResultCache(cache_path, max_bytes=200).get("shared") == {"value": 1}
+
+    def test_evict_least_recently_used(self, cache):
+        cache.put("a", {"value": "a" * 50})
+        cache.put("b", {"value": "b" * 50})
+        cache.get("a")
+        cache.put("c", {"value": "c" * 50})
+        cache.put("d", {"value": "d" * 50})
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("d") is not None
+
+    def test_disabled(self, cache_path):
+        cache = ResultCache(cache_path, max_bytes=0)
+        cache.put("a", {"value": 1})
+        assert cache.get("a") is None
+
+    def test_access_time_throttled(self, cache_path):
+        cache = ResultCache(cache_path, max_bytes=200)
+        cache.put("a", {"value": "a" * 50})
+        cache.put("b", {"value": "b" * 50})
+        # A hit right after the store does not move the result, it is still the oldest one
+        cache.get("a")
+        cache.put("c", {"value": "c" * 50})
+        cache.put("d", {"value": "d" * 50})
+        assert cache.get("a") is None
+        assert cache.get("b") is not None
+
+    def test_replace_keeps_total(self, cache):
+        for _ in range(10):
+            cache.put("a", {"value": "a" * 50})
+        cache.put("b", {"value": "b" * 50})
+        assert cache.get("a") is not None
+        assert cache.get("b") is not None
+
+    def test_total_of_existing_database(self, cache_path):
+        # A database of an earlier version has no running total, it is counted from its results
+        connection = sqlite3.connect(cache_path)
+        connection.execute("CREATE TABLE results (key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed REAL)")
+        connection.execute("INSERT INTO results VALUES ('a', ?, 150, 0)", (b'{"value": 1}',))
+        connection.commit()
+        connection.close()
+        cache = ResultCache(cache_path, max_bytes=200, access_interval=0)
+        cache.put("b", {"value": "b" * 50})
+        assert cache.get("a") is None
+        assert cache.get("b") is not None
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+
+import pytest
+
+from project import log
+from src.engine import PythonRe
+from src.sessions import MatchSessions, Superseded
+from src.worker_pool import MatchWorkerPool
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+def _begin_in_child(path, seq):
+    MatchSessions(path).begin("tab", seq)
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    return MatchSessions(str(tmp_path / "sessions.sqlite3"), poll_interval=0.01)
+
+
+class TestMatchSessions:
+    def test_begin(self, sessions):
+        sessions.begin("tab", 1)
+        assert not sessions.is_superseded("tab", 1)
+        sessions.begin("tab", 2)
+        assert sessions.is_superseded("tab", 1)
+        # A retry of the latest request is not superseded, a late older request is
+        sessions.begin("tab", 2)
+        with pytest.raises(Superseded):
+            sessions.begin("tab", 1)
+        assert not sessions.is_superseded("other", 1)
+
+    def test_run(self, sessions):
+        sessions.begin("tab", 1)
+
+        async def match():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        assert asyncio.run(sessions.run("tab", 1, match())) == "result"
+
+    def test_run_superseded(self, sessions):
+        sessions.begin("tab", 1)
+        cancelled = []
+
+        async def match():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def run():
+            task = asyncio.ensure_future(sessions.run("tab", 1, match()))
+            await asyncio.sleep(0.05)
+            sessions.begin("tab", 2)
+            await task
+
+        with pytest.raises(Superseded):
+            asyncio.run(run())
+        assert cancelled == [True]
+
+    def test_run_superseded_by_other_process(self, sessions):
+        sessions.begin("tab", 1)
+
+        async def run():
+            task = asyncio.ensure_future(sessions.run("tab", 1, asyncio.sleep(10)))
+            process = multiprocessing.get_context("spawn").Process(target=_begin_in_child, args=(sessions.path, 2))
+            process.start()
+            await asyncio.get_running_loop().run_in_executor(None, process.join)
+            await task
+
+        start_time = time.perf_counter()
+        with pytest.raises(Superseded):
+            asyncio.run(run())
+        assert time.perf_counter() - start_time < 10
+
+    def test_run_reads_sessions_after_changes(self, sessions, monkeypatch):
+        reads = []
+        latest = MatchSessions._latest
+        monkeypatch.setattr(MatchSessions, "_latest", staticmethod(lambda *args: reads.append(args) or latest(*args)))
+        for seq in range(5):
+            sessions.begin(f"tab{seq}", 1)
+
+        async def run():
+            # Five running matches are watched by one thread, which reads the sessions only when the database changed
+            await asyncio.gather(*(sessions.run(f"tab{seq}", 1, asyncio.sleep(0.3)) for seq in range(5)))
+
+        asyncio.run(run())
+        assert len(reads) <= 1
+
+    def test_superseded_match_kills_worker(self, sessions):
+        python_re = PythonRe()
+        pool = MatchWorkerPool({python_re.name: python_re}, size=1)
+        try:
+            sessions.begin("tab", 1)
+
+            async def run():
+                match = pool.match_async("Python - re", r"(a+)+$", "a" * 60 + "!", timeout=30)
+                task = asyncio.ensure_future(sessions.run("tab", 1, match))
+                await asyncio.sleep(0.2)
+                sessions.begin("tab", 2)
+                with pytest.raises(Superseded):
+                    await task
+                return await pool.match_async("Python - re", r"a+", "aaa", timeout=30)
+
+            start_time = time.perf_counter()
+            result = asyncio.run(run())
+            assert result["matches"][0]["match"] == "aaa"
+            # The worker stuck in the superseded match was replaced instead of running into the timeout
+            assert time.perf_counter() - start_time < 10
+        finally:
+            pool.close()
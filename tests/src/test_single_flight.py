@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import threading
+
+import pytest
+
+from project import log
+from src.single_flight import MODE_HOST, MODE_OFF, MODE_PROCESS, ORIGIN_HOST, ORIGIN_LEADER, SingleFlight
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+@pytest.fixture
+def lock_path(tmp_path):
+    return str(tmp_path / "single_flight.lock")
+
+
+class Computation:
+    def __init__(self, duration=0.2, error=None):
+        self.duration = duration
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.duration)
+        if self.error:
+            raise self.error
+        return {"matches": self.calls}
+
+
+def _compute_in_child(lock_path, store_path, started):
+    async def compute():
+        started.set()
+        await asyncio.sleep(0.5)
+        with open(store_path, "w", encoding="utf-8") as file:
+            json.dump({"matches": "child"}, file)
+        return {"matches": "child"}
+
+    asyncio.run(SingleFlight(lock_path, MODE_HOST).run("key", compute, lookup=lambda: None))
+
+
+class TestSingleFlight:
+    def test_coalesced(self, lock_path):
+        single_flight = SingleFlight(lock_path, MODE_PROCESS)
+        compute = Computation()
+
+        async def run():
+            return await asyncio.gather(*(single_flight.run("key", compute) for _ in range(10)))
+
+        results = asyncio.run(run())
+        assert compute.calls == 1
+        assert [result for result, _ in results] == [{"matches": 1}] * 10
+        assert sorted(origin for _, origin in results) == ["leader"] + ["process"] * 9
+        # The flight ends with its computation
+        assert asyncio.run(single_flight.run("key", compute))[0] == {"matches": 2}
+
+    def test_coalesced_across_threads(self, lock_path):
+        # Every async view runs in an event loop of its own thread
+        single_flight = SingleFlight(lock_path, MODE_PROCESS)
+        compute = Computation()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(asyncio.run(single_flight.run("key", compute))))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert compute.calls == 1
+        assert len(results) == 5
+
+    def test_different_keys(self, lock_path):
+        single_flight = SingleFlight(lock_path, MODE_PROCESS)
+        compute = Computation()
+
+        async def run():
+            return await asyncio.gather(single_flight.run("first", compute), single_flight.run("second", compute))
+
+        asyncio.run(run())
+        assert compute.calls == 2
+
+    def test_failure_not_shared(self, lock_path):
+        single_flight = SingleFlight(lock_path, MODE_PROCESS)
+        compute = Computation(error=ValueError("leader only"))
+
+        async def run():
+            return await asyncio.gather(*(single_flight.run("key", compute) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, ValueError) for result in results)
+        # The waiting callers ran the computation themselves
+        assert compute.calls == 3
+
+    def test_off(self, lock_path):
+        single_flight = SingleFlight(lock_path, MODE_OFF)
+        compute = Computation()
+
+        async def run():
+            return await asyncio.gather(*(single_flight.run("key", compute) for _ in range(3)))
+
+        assert all(origin == ORIGIN_LEADER for _, origin in asyncio.run(run()))
+        assert compute.calls == 3
+
+    def test_coalesced_across_processes(self, lock_path, tmp_path):
+        store_path = tmp_path / "result.json"
+        context = multiprocessing.get_context("spawn")
+        started = context.Event()
+        process = context.Process(target=_compute_in_child, args=(lock_path, str(store_path), started))
+        process.start()
+        assert started.wait(timeout=30)
+
+        def lookup():
+            return json.loads(store_path.read_text(encoding="utf-8")) if store_path.exists() else None
+
+        compute = Computation()
+        result, origin = asyncio.run(SingleFlight(lock_path, MODE_HOST).run("key", compute, lookup=lookup))
+        process.join()
+        assert (result, origin) == ({"matches": "child"}, ORIGIN_HOST)
+        assert compute.calls == 0
+
+    def test_host_without_result(self, lock_path):
+        # Nothing is stored for other processes, the lock is released and the computation runs here
+        single_flight = SingleFlight(lock_path, MODE_HOST)
+        compute = Computation(duration=0)
+        assert asyncio.run(single_flight.run("key", compute, lookup=lambda: None)) == ({"matches": 1}, ORIGIN_LEADER)
+        assert asyncio.run(single_flight.run("key", compute, lookup=lambda: None)) == ({"matches": 2}, ORIGIN_LEADER)
@@ -0,0 +1,67 @@
+import logging
+import os
+
+import pytest
+
+from project import log
+from src.text_store import TextStore, TextTooLargeError
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TextStore(str(tmp_path), max_bytes=100)
+
+
+class TestTextStore:
+    def test_put_read(self, store):
+        handle = store.put("Zażółć gęślą jaźń")
+        assert TextStore(store.path).read(handle) == "Zażółć gęślą jaźń"
+
+    def test_content_addressed(self, store):
+        assert store.put("Hello") == store.put("Hello")
+        assert store.put("Hello") != store.put("World")
+
+    def test_put_stream(self, store):
+        encoded = "Zażółć".encode()
+        # Split inside a multi-byte character
+        handle = store.put_stream([encoded[:3], encoded[3:]])
+        assert store.read(handle) == "Zażółć"
+
+    def test_invalid_utf8(self, store):
+        with pytest.raises(UnicodeDecodeError):
+            store.put_stream([b"\xff\xfe"])
+        assert os.listdir(store.path) == []
+
+    def test_too_large(self, store):
+        with pytest.raises(TextTooLargeError):
+            store.put_stream([b"a" * 10, b"a" * 10], max_size=15)
+        assert os.listdir(store.path) == []
+
+    def test_unknown_handle(self, store):
+        with pytest.raises(KeyError):
+            store.read("0" * 64)
+        with pytest.raises(KeyError):
+            store.read("../../etc/passwd")
+
+    def test_touch(self, store):
+        handle = store.put("a" * 40)
+        file_path = os.path.join(store.path, f"{handle}.txt")
+        os.utime(file_path, (0, 0))
+        store.touch(handle)
+        assert os.path.getmtime(file_path) > 0
+        with pytest.raises(KeyError):
+            store.touch("0" * 64)
+        with pytest.raises(KeyError):
+            store.touch("../../etc/passwd")
+
+    def test_evict_least_recently_used(self, store):
+        first = store.put("a" * 40)
+        os.utime(os.path.join(store.path, f"{first}.txt"), (0, 0))
+        second = store.put("b" * 40)
+        third = store.put("c" * 40)
+        assert sorted(os.listdir(store.path)) == sorted([f"{second}.txt", f"{third}.txt"])
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import signal
+import threading
+
+import pytest
+
+from project import log
+from src.engine import PythonRe
+from src.text_store import TextHandle, TextStore
+from src.worker_pool import MatchWorkerPool
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+class TimeoutEngine(PythonRe):
+    """Matches the timeout it was given for the match."""
+
+    def _match(self, pattern, text, flags, limit=0, offset=0, timeout=None):
+        return [{"match": timeout, "index": [0, 0], "groups": []}]
+
+
+def worker_pids(pool):
+    return {worker.pid for worker in list(pool._idle.queue)}
+
+
+@pytest.fixture
+def pool():
+    python_re = PythonRe()
+    worker_pool = MatchWorkerPool({python_re.name: python_re}, size=2, max_tasks=3)
+    yield worker_pool
+    worker_pool.close()
+
+
+class TestMatchWorkerPool:
+    def test_match(self, pool):
+        result = pool.match("Python - re", r"[A-Z]\w+", "Hello, World!", timeout=5)
+        assert result["error"] == ""
+        assert [match["match"] for match in result["matches"]] == ["Hello", "World"]
+
+    def test_worker_reused(self, pool):
+        pids = worker_pids(pool)
+        pool.match("Python - re", r"\w+", "Hello", timeout=5)
+        pool.match("Python - re", r"\w+", "Hello", timeout=5)
+        assert worker_pids(pool) == pids
+
+    def test_worker_recycled_after_max_tasks(self, pool):
+        pids = worker_pids(pool)
+        for _ in range(pool.size * pool.max_tasks):
+            pool.match("Python - re", r"\w+", "Hello", timeout=5)
+        worker = pool._acquire(timeout=5)
+        assert worker.pid not in pids
+        pool._release(worker)
+
+    def test_timeout_replaces_worker(self, pool):
+        result = pool.match("Python - re", r"(a+)+$", "a" * 60 + "!", timeout=0.5)
+        assert result["matches"] == []
+        assert result["error"] == "Timeout exceeded: 0.5 seconds"
+        result = pool.match("Python - re", r"a+", "aaa", timeout=5)
+        assert result["error"] == ""
+        assert result["matches"][0]["match"] == "aaa"
+
+    def test_timeout_sent_to_engine(self):
+        engine = TimeoutEngine()
+        pool = MatchWorkerPool({engine.name: engine}, size=1)
+        try:
+            # The engine gets the time left for the match, so it can stop the match before the worker is killed
+            timeout = pool.match(engine.name, "", "", timeout=0.7)["matches"][0]["match"]
+            assert 0.5 < timeout <= 0.7
+        finally:
+            pool.close()
+
+    def test_wait_for_worker(self, pool):
+        # Both workers are busy for 0.5 seconds, longer than the timeout of the match
+        busy = [pool._acquire(timeout=5) for _ in range(pool.size)]
+        release = threading.Timer(0.5, lambda: [pool._release(worker) for worker in busy])
+        release.start()
+        result = pool.match("Python - re", r"a+", "aaa", timeout=0.3, wait=5)
+        release.join()
+        assert result["error"] == ""
+        assert result["timing"]["queue"] >= 0.4
+        busy = [pool._acquire(timeout=5) for _ in range(pool.size)]
+        release = threading.Timer(0.5, lambda: [pool._release(worker) for worker in busy])
+        release.start()
+        # Without `wait` the time waiting for a worker counts against the timeout
+        result = pool.match("Python - re", r"a+", "aaa", timeout=0.3)
+        release.join()
+        assert result["error"] == "Timeout exceeded: 0.3 seconds"
+
+    def test_engine_not_found(self, pool):
+        result = pool.match("nonexistent_engine", r"\w+", "Hello", timeout=5)
+        assert result["matches"] == []
+        assert result["error"] == "Engine nonexistent_engine not found"
+
+    def test_cache_stats(self, pool):
+        for _ in range(pool.size * 2):
+            pool.match("Python - re", r"cached\w+", "cached pattern", timeout=5)
+        stats = pool.cache_stats()["Python"]
+        assert stats["hits"] + stats["misses"] >= pool.size * 2
+        assert stats["hits"] >= pool.size
+        assert 0 < stats["hit_rate"] <= 1
+
+    def test_stream(self, pool):
+        messages = list(pool.stream("Python - re", r"\d", "1 2 3 4 5", timeout=5, chunk_size=2))
+        assert [[match["match"] for match in message["matches"]] for message in messages] == [
+            ["1", "2"],
+            ["3", "4"],
+            ["5"],
+            [],
+        ]
+        assert messages[-1]["done"] and messages[-1]["error"] == ""
+
+    def test_stream_closed_early_replaces_worker(self, pool):
+        messages = pool.stream("Python - re", r"\w", "a" * 100_000, timeout=5, chunk_size=10)
+        next(messages)
+        messages.close()
+        result = pool.match("Python - re", r"\w+", "Hello", timeout=5)
+        assert result["matches"][0]["match"] == "Hello"
+
+    def test_match_page(self, pool):
+        result = pool.match("Python - re", r"\d", "1 2 3 4 5", timeout=5, limit=2, offset=2)
+        assert [match["match"] for match in result["matches"]] == ["3", "4"]
+        assert result["has_more"]
+        result = pool.match("Python - re", r"\d", "1 2 3 4 5", timeout=5, limit=2, offset=3)
+        assert [match["match"] for match in result["matches"]] == ["4", "5"]
+        assert not result["has_more"]
+
+    def test_match_text_handle(self, tmp_path, monkeypatch):
+        store = TextStore(str(tmp_path))
+        monkeypatch.setattr("src.worker_pool.text_store", store)
+        python_re = PythonRe()
+        handle_pool = MatchWorkerPool({python_re.name: python_re}, size=1)
+        try:
+            result = handle_pool.match("Python - re", r"\w+", TextHandle(store.put("Hello World")), timeout=5)
+            assert [match["match"] for match in result["matches"]] == ["Hello", "World"]
+            result = handle_pool.match("Python - re", r"\w+", TextHandle("0" * 64), timeout=5)
+            assert result["error"] == f"Text {'0' * 64} not found"
+        finally:
+            handle_pool.close()
+
+    def test_worker_terminates_with_inherited_handler(self):
+        # gunicorn workers handle SIGTERM themselves, the forked match workers must still stop on terminate()
+        previous = signal.signal(signal.SIGTERM, lambda signum, frame: None)
+        try:
+            python_re = PythonRe()
+            worker_pool = MatchWorkerPool({python_re.name: python_re}, size=1)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+        # A served task shows the worker has reset its handlers
+        assert not worker_pool.match(python_re.name, "a", "a", timeout=5)["error"]
+        worker = worker_pool._acquire(timeout=5)
+        worker.process.terminate()
+        worker.process.join(timeout=5)
+        assert not worker.process.is_alive()
+        worker_pool._release(worker)
+        worker_pool.close()
+
+    def test_timing(self, pool):
+        result = pool.match("Python - re", r"timing-(\d+)", "timing-1 timing-2", timeout=5)
+        timing = result["timing"]
+        assert set(timing) == {"queue", "compile", "match", "ipc", "cpu", "total"}
+        assert timing["compile"] > 0
+        assert timing["total"] == result["execution_time"]
+        assert timing["queue"] + timing["compile"] + timing["match"] + timing["ipc"] == pytest.approx(timing["total"])
+
+    def test_match_async(self, pool):
+        async def run():
+            return await asyncio.gather(
+                *(pool.match_async("Python - re", r"\d+", f"{index} and {index + 1}", timeout=5) for index in range(10))
+            )
+
+        results = asyncio.run(run())
+        assert [[match["match"] for match in result["matches"]] for result in results] == [
+            [str(index), str(index + 1)] for index in range(10)
+        ]
+        assert all(result["timing"]["cpu"] is not None for result in results)
+
+    def test_match_async_waits_in_one_thread(self, pool):
+        # Both workers are busy until the timeout, the third match waits for one of them to be replaced
+        async def run():
+            return await asyncio.gather(
+                pool.match_async("Python - re", r"(a+)+$", "a" * 60 + "!", timeout=0.5),
+                pool.match_async("Python - re", r"(a+)+$", "a" * 60 + "!", timeout=0.5),
+                pool.match_async("Python - re", r"a+", "aaa", timeout=0.2),
+                pool.match_async("Python - re", r"a+", "aaa", timeout=10),
+            )
+
+        threads = threading.active_count()
+        first, second, exhausted, last = asyncio.run(run())
+        assert first["error"] == second["error"] == "Timeout exceeded: 0.5 seconds"
+        assert exhausted["error"] == "Timeout exceeded: 0.2 seconds"
+        assert last["error"] == ""
+        assert last["timing"]["queue"] >= 0.5
+        # Only the threads replacing the killed workers were started
+        assert threading.active_count() <= threads + 2
+
+    def test_match_async_cancelled(self, pool):
+        async def run():
+            task = asyncio.ensure_future(pool.match_async("Python - re", r"(a+)+$", "a" * 60 + "!", timeout=5))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return await pool.match_async("Python - re", r"a+", "aaa", timeout=5)
+
+        assert asyncio.run(run())["matches"][0]["match"] == "aaa"
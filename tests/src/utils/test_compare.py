@@ -0,0 +1,54 @@
+import logging
+
+import pytest
+
+from project import log
+from src.utils.compare import diff_results, normalize_offsets, utf16_to_code_point_table
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+def match(start, end, groups=()):
+    return {
+        "match": "",
+        "index": [start, end],
+        "groups": [{"name": "", "value": value, "index": index} for value, index in groups],
+    }
+
+
+class TestCompare:
+    def test_utf16_table_bmp_only(self):
+        assert utf16_to_code_point_table("Zażółć") is None
+
+    def test_normalize_offsets(self):
+        text = "😀 ab 😀 cd"
+        table = utf16_to_code_point_table(text)
+        # JavaScript reports "cd" at UTF-16 offsets [9, 11]
+        normalized = normalize_offsets([match(9, 11, [("cd", [9, 11])])], table)
+        assert normalized[0]["index"] == [7, 9]
+        assert normalized[0]["groups"][0]["index"] == [7, 9]
+        assert text[7:9] == "cd"
+
+    def test_diff_consistent(self):
+        results = {
+            "Python - re": {"matches": [match(0, 2, [("ab", [0, 2])])], "error": ""},
+            "C++": {"matches": [match(0, 2, [("ab", [0, 2])])], "error": ""},
+        }
+        diff = diff_results(results)
+        assert diff["consistent"]
+        assert diff["reference"] == "Python - re"
+        assert diff["engines"]["C++"] == {"missing": [], "extra": [], "groups": []}
+
+    def test_diff_differences(self):
+        results = {
+            "Python - re": {"matches": [match(0, 2, [("ab", [0, 2])]), match(3, 5)], "error": ""},
+            "JavaScript": {"matches": [match(0, 2, [("", [])]), match(6, 8)], "error": ""},
+            "Java": {"matches": [], "error": "Error from java CLI"},
+        }
+        diff = diff_results(results)
+        assert not diff["consistent"]
+        assert diff["errors"] == ["Java"]
+        assert diff["engines"]["JavaScript"] == {"missing": [[3, 5]], "extra": [[6, 8]], "groups": [[0, 2]]}
@@ -0,0 +1,73 @@
+import json
+import logging
+
+import pytest
+
+from project import log
+from src.utils.export import group_columns, iter_csv, iter_jsonl, iter_ndjson
+
+MATCHES = [
+    {
+        "match": "2024-01-02 id=7",
+        "index": [0, 15],
+        "groups": [{"name": "date", "value": "2024-01-02", "index": [0, 10]}, {"name": "", "value": "7", "index": []}],
+    },
+    {
+        "match": "2024-01-03 id=8",
+        "index": [16, 31],
+        "groups": [{"name": "date", "value": "2024-01-03", "index": [16, 26]}, {"name": "", "value": "8", "index": []}],
+    },
+]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+class TestExport:
+    def test_ndjson(self):
+        messages = [
+            {"matches": MATCHES[:1], "error": "", "done": False},
+            {"matches": MATCHES[1:], "error": "", "done": True, "execution_time": 0.5, "timing": {"total": 0.5}},
+        ]
+        lines = "".join(iter_ndjson(messages)).splitlines()
+        assert [json.loads(line) for line in lines] == [
+            *MATCHES,
+            {"done": True, "error": "", "execution_time": 0.5, "timing": {"total": 0.5}},
+        ]
+
+    def test_jsonl(self):
+        lines = "".join(iter_jsonl(iter(MATCHES))).splitlines()
+        assert json.loads(lines[1]) == {
+            "match": "2024-01-03 id=8",
+            "start": 16,
+            "end": 31,
+            "date": "2024-01-03",
+            "group_2": "8",
+        }
+
+    def test_csv(self):
+        assert "".join(iter_csv(iter(MATCHES))).splitlines() == [
+            "match,start,end,date,group_2",
+            "2024-01-02 id=7,0,15,2024-01-02,7",
+            "2024-01-03 id=8,16,31,2024-01-03,8",
+        ]
+
+    def test_colliding_group_names(self):
+        groups = [
+            {"name": "start", "value": "2024", "index": [0, 4]},
+            {"name": "group_3", "value": "01", "index": [5, 7]},
+            {"name": "", "value": "02", "index": [8, 10]},
+        ]
+        match = {"match": "2024-01-02", "index": [0, 10], "groups": groups}
+        assert group_columns(match) == ["group_start", "group_3", "group_group_3"]
+        assert "".join(iter_csv(iter([match]))).splitlines() == [
+            "match,start,end,group_start,group_3,group_group_3",
+            "2024-01-02,0,10,2024,01,02",
+        ]
+        record = json.loads("".join(iter_jsonl(iter([match]))))
+        assert (record["start"], record["group_start"]) == (0, "2024")
+
+    def test_csv_without_matches(self):
+        assert "".join(iter_csv(iter([]))) == "match,start,end\r\n"
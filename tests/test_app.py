@@ -0,0 +1,405 @@
+import gzip
+import json
+import logging
+import threading
+import time
+
+import pytest
+from werkzeug.serving import make_server
+
+import app
+from app import RegexMatcherApp
+from project import Config, log
+from src.admission import AdmissionController
+from src.result_cache import ResultCache
+from src.sessions import MatchSessions
+from src.single_flight import MODE_PROCESS, SingleFlight
+from src.text_store import TextHandle
+
+# Each start position scans to the end of the text before failing, over half a second in Python `re`
+SLOW_PATTERN = r"(?:a|b)*c"
+SLOW_TEXT = "ab" * 8000
+
+
+@pytest.fixture(scope="session", autouse=True)
+def set_log_level():
+    log.setLevel(logging.DEBUG)
+
+
+@pytest.fixture(scope="module")
+def matcher(tmp_path_factory):
+    path = tmp_path_factory.mktemp("app")
+    live_sessions, Config.live_sessions = Config.live_sessions, True
+    try:
+        matcher = RegexMatcherApp()
+    finally:
+        Config.live_sessions = live_sessions
+    matcher.result_cache = ResultCache(str(path / "result_cache.sqlite3"))
+    matcher.admission = AdmissionController(str(path / "admission.sqlite3"))
+    matcher.sessions = MatchSessions(str(path / "sessions.sqlite3"), poll_interval=0.01)
+    matcher.single_flight = SingleFlight(str(path / "single_flight.lock"), MODE_PROCESS)
+    yield matcher
+    matcher.engine_manager.close()
+
+
+@pytest.fixture
+def client(matcher):
+    matcher.result_cache.clear()
+    matcher.admission.clear()
+    matcher.sessions.clear()
+    return matcher.app.test_client()
+
+
+@pytest.fixture(scope="module")
+def live_url(matcher):
+    if not matcher.live_sessions:
+        pytest.skip("Live sessions need flask-sock")
+    server = make_server("127.0.0.1", 0, matcher.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"ws://127.0.0.1:{server.server_port}/live"
+    server.shutdown()
+
+
+@pytest.fixture
+def live(matcher, live_url):
+    simple_websocket = pytest.importorskip("simple_websocket")
+    matcher.result_cache.clear()
+    matcher.admission.clear()
+    ws = simple_websocket.Client.connect(live_url)
+    yield ws
+    ws.close()
+
+
+def exchange(ws, edit, count):
+    """Sends an edit to a live session and returns the next `count` messages."""
+    ws.send(json.dumps(edit))
+    return [json.loads(ws.receive(timeout=30)) for _ in range(count)]
+
+
+def metric(client, sample):
+    """Returns the value of a sample of `/metrics`, e.g. `name{label="value"}`, 0 if it is not rendered."""
+    for line in client.get("/metrics").get_data(as_text=True).splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def post_concurrently(client, path, bodies, delay=0.0):
+    """Posts the bodies from one thread each, `delay` seconds apart, and returns the responses in order."""
+    responses = [None] * len(bodies)
+
+    def post(index):
+        responses[index] = client.post(path, json=bodies[index])
+
+    threads = [threading.Thread(target=post, args=(index,)) for index in range(len(bodies))]
+    for thread in threads:
+        thread.start()
+        time.sleep(delay)
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+class TestIndex:
+    def test_coalesced(self, matcher, client, monkeypatch):
+        shared = []
+        run = matcher.single_flight.run
+
+        async def run_and_keep(*args, **kwargs):
+            result, origin = await run(*args, **kwargs)
+            shared.append(result)
+            return result, origin
+
+        monkeypatch.setattr(matcher.single_flight, "run", run_and_keep)
+        body = {"regex_input": SLOW_PATTERN, "text_input": SLOW_TEXT, "engine": "Python - re"}
+        # The first request leads, the others arrive while its match runs
+        responses = post_concurrently(client, "/", [{**body, "profile": True}] + [body] * 3, delay=0.05)
+        results = [response.get_json() for response in responses]
+        assert all(response.status_code == 200 for response in responses)
+        assert "profile" in results[0]
+        assert sum(result["execution_time"].endswith("(shared)") for result in results) == 3
+        # The profile of the leader is not added to the result shared with the requests waiting for its match
+        assert all("profile" not in result for result in results[1:] + shared)
+
+    def test_superseded(self, client):
+        slow = {"regex_input": SLOW_PATTERN, "text_input": SLOW_TEXT, "engine": "Python - re", "session": "tab"}
+        fast = {"regex_input": "b", "text_input": "ab", "engine": "Python - re", "session": "tab"}
+        start_time = time.perf_counter()
+        responses = post_concurrently(client, "/", [{**slow, "seq": 1}, {**fast, "seq": 2}], delay=0.1)
+        # The running match is cancelled as soon as the newer request arrives
+        assert [response.status_code for response in responses] == [409, 200]
+        assert time.perf_counter() - start_time < 0.5
+        assert responses[1].get_json()["match_count"] == 1
+        # A late request older than the latest one is refused before it runs
+        assert client.post("/", json={**fast, "seq": 1}).status_code == 409
+
+    def test_profile_admitted(self, matcher, client, monkeypatch):
+        inflight, charged = [], []
+        release = matcher.admission.release
+
+        def profile(*args):
+            inflight.append(AdmissionController._inflight(matcher.admission._connection(), "127.0.0.1"))
+            time.sleep(0.3)
+            return {"steps": 0}
+
+        def release_and_keep(ticket, client, seconds):
+            charged.append(seconds)
+            release(ticket, client, seconds)
+
+        monkeypatch.setattr(app, "profile", profile)
+        monkeypatch.setattr(matcher.admission, "release", release_and_keep)
+        body = {"regex_input": "a", "text_input": "a", "engine": "Python - re", "profile": True}
+        assert client.post("/", json=body).get_json()["profile"] == {"steps": 0}
+        # The profiler runs in the web process under the admission control, charged with its time
+        assert inflight == [1]
+        assert len(charged) == 2 and charged[1] >= 0.3
+
+    @pytest.mark.parametrize("seq", [{}, {"seq": None}, {"seq": "first"}, {"seq": 1.5}, {"seq": [1]}, {"seq": True}])
+    def test_invalid_seq(self, client, seq):
+        response = client.post("/", json={"regex_input": "a", "text_input": "a", "session": "tab", **seq})
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "Limit, offset and seq must be integers."
+
+
+class TestLive:
+    def test_edits(self, live):
+        edit = {"seq": 1, "regex": r"\w+", "engine": "Python - re", "text": "hello world"}
+        matching, result = exchange(live, edit, 2)
+        assert matching == {"type": "matching", "seq": 1}
+        assert (result["type"], result["seq"], result["result"]["match_count"]) == ("result", 1, 2)
+        _, result = exchange(live, {"seq": 2, "splice": [5, 5, " big"], "length": 15}, 2)
+        assert result["result"]["match_count"] == 3
+
+    def test_rejected_edits(self, live):
+        exchange(live, {"seq": 1, "regex": r"\w+", "engine": "Python - re", "text": "hello"}, 2)
+        assert exchange(live, {"seq": 2, "splice": [50, 60, ""], "length": 1}, 1) == [{"type": "resync", "seq": 2}]
+        # The page waits for the answer to its latest edit, errors carry its seq
+        (error,) = exchange(live, {"seq": 3, "offset": "first"}, 1)
+        assert (error["type"], error["seq"], error["status"]) == ("error", 3, 400)
+        _, result = exchange(live, {"seq": 4, "text": "hello world"}, 2)
+        assert result["result"]["match_count"] == 2
+
+    def test_superseded(self, live):
+        exchange(live, {"seq": 1, "regex": SLOW_PATTERN, "engine": "Python - re", "text": SLOW_TEXT}, 1)
+        messages = exchange(live, {"seq": 2, "regex": "b"}, 3)
+        assert [(message["type"], message["seq"]) for message in messages] == [
+            ("cancelled", 1),
+            ("matching", 2),
+            ("result", 2),
+        ]
+
+    def test_failed_match(self, matcher, live, monkeypatch):
+        async def fail(*args, **kwargs):
+            raise RuntimeError("broken")
+
+        monkeypatch.setattr(matcher, "_process_regex", fail)
+        _, error = exchange(live, {"seq": 1, "regex": "a", "engine": "Python - re", "text": "a"}, 2)
+        assert (error["type"], error["seq"], error["status"]) == ("error", 1, 500)
+        # The session stays open
+        monkeypatch.undo()
+        _, result = exchange(live, {"seq": 2, "text": "aa"}, 2)
+        assert result["result"]["match_count"] == 2
+
+
+class TestStream:
+    def test_ndjson(self, client):
+        response = client.post(
+            "/stream", json={"regex_input": r"\w+", "text_input": "hello world", "engine": "Python - re"}
+        )
+        *matches, done = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [match["match"] for match in matches] == ["hello", "world"]
+        assert done["done"] and not done["error"]
+
+    def test_uploaded_text_not_read(self, matcher, client, monkeypatch):
+        handle = client.post("/upload_text", data="hello world".encode()).get_json()["handle"]
+        # The web process only checks the handle, the match worker reads the text
+        monkeypatch.setattr(matcher.text_store, "read", None)
+        response = client.post(
+            "/stream", json={"regex_input": r"\w+", "text_handle": handle, "engine": "Python - re", "format": "csv"}
+        )
+        assert response.status_code == 200
+        assert response.get_data(as_text=True).splitlines()[1:] == ["hello,0,5", "world,6,11"]
+
+    @pytest.mark.parametrize(
+        "body, status",
+        [
+            ({"regex_input": "a", "text_handle": "0" * 64}, 404),
+            ({"regex_input": "a", "format": "xml"}, 400),
+            ({"regex_input": ""}, 400),
+        ],
+    )
+    def test_invalid_request(self, client, body, status):
+        response = client.post("/stream", json=body)
+        assert response.status_code == status
+        assert response.get_json()["error"]
+
+    def test_refused_pattern(self, client, monkeypatch):
+        monkeypatch.setattr(Config, "redos_policy", "refuse")
+        response = client.post("/stream", json={"regex_input": "(a+)+$", "engine": "Python - re", "text_input": "a"})
+        assert response.status_code == 400
+        assert response.get_json()["redos"]["action"] == "refuse"
+
+    def test_export_error_releases_admission(self, matcher, client):
+        response = client.post("/stream", json={"regex_input": "(", "engine": "Python - re", "format": "jsonl"})
+        assert response.status_code == 400
+        assert AdmissionController._inflight(matcher.admission._connection()) == 0
+
+
+class TestUploadText:
+    def test_match_by_handle(self, client):
+        text = "h\u00e9llo w\U0001F600rld " * 100
+        handle = client.post("/upload_text", data=gzip.compress(text.encode()), headers={"Content-Encoding": "gzip"})
+        handle = handle.get_json()["handle"]
+        assert client.post("/upload_text", data=text.encode()).get_json()["handle"] == handle
+        response = client.post("/", json={"regex_input": r"\S+", "text_handle": handle, "engine": "Python - re"})
+        assert response.get_json()["match_count"] == 200
+
+    def test_cached_by_handle(self, client, monkeypatch):
+        text = "cached by handle " * 100
+        handle = client.post("/upload_text", data=text.encode()).get_json()["handle"]
+        make_key = ResultCache.make_key
+        keys = []
+
+        def record_key(*args, **kwargs):
+            keys.append(args[4])
+            return make_key(*args, **kwargs)
+
+        monkeypatch.setattr(ResultCache, "make_key", staticmethod(record_key))
+        body = {"regex_input": r"cached\s", "text_handle": handle, "engine": "Python - re"}
+        results = [client.post("/", json=body).get_json() for _ in range(2)]
+        assert keys == [TextHandle(handle)] * 2
+        assert results[0]["match_count"] == results[1]["match_count"] == 100
+
+    @pytest.mark.parametrize(
+        "data, headers, status",
+        [
+            (b"\xff\xfe", {}, 400),
+            (gzip.compress(b"hello")[:-4], {"Content-Encoding": "gzip"}, 400),
+            (b"not gzip", {"Content-Encoding": "gzip"}, 400),
+            (b"a" * (1024 * 1024 + 1), {}, 413),
+        ],
+    )
+    def test_invalid_text(self, client, monkeypatch, data, headers, status):
+        monkeypatch.setattr(Config, "max_upload_mb", 1)
+        response = client.post("/upload_text", data=data, headers=headers)
+        assert response.status_code == status
+        assert response.get_json()["error"]
+
+    def test_unknown_handle(self, client):
+        response = client.post("/", json={"regex_input": "a", "text_handle": "0" * 64, "engine": "Python - re"})
+        assert response.status_code == 404
+
+
+class TestBatch:
+    def test_jobs(self, client):
+        jobs = [
+            {"regex_input": r"\w+", "text_input": "hello world", "engine": "Python - re", "limit": 1},
+            {"regex_input": "a", "text_input": "a", "engine": "unknown"},
+            {"regex_input": r"\d", "text_input": "1 2 3", "engine": "Python - regex", "offset": 1},
+        ]
+        response = client.post("/batch", json={"jobs": jobs})
+        first, failed, last = response.get_json()["results"]
+        assert ([match["match"] for match in first["matches"]], first["has_more"]) == (["hello"], True)
+        # A failing job does not affect the others
+        assert failed["error"] and not failed["matches"]
+        assert [match["match"] for match in last["matches"]] == ["2", "3"]
+
+    @pytest.mark.parametrize(
+        "jobs, error",
+        [
+            (None, "No jobs provided."),
+            ([], "No jobs provided."),
+            ([{"regex_input": "a"}] * (Config.max_batch_jobs + 1), "Too many jobs"),
+            (["a"], "Invalid job"),
+            ([{"regex_input": "a", "limit": "all"}], "Invalid job"),
+        ],
+    )
+    def test_invalid_request(self, client, jobs, error):
+        response = client.post("/batch", json={"jobs": jobs})
+        assert response.status_code == 400
+        assert response.get_json()["error"].startswith(error)
+
+    def test_counts_parallel_jobs(self, matcher, client, monkeypatch):
+        monkeypatch.setattr(matcher.admission, "client_max_inflight", 2)
+        matcher.admission.acquire("127.0.0.1")
+        jobs = [{"regex_input": "a", "text_input": "a", "engine": "Python - re"}] * 3
+        # The batch would run three jobs at the same time, the client has one slot left
+        response = client.post("/batch", json={"jobs": jobs})
+        assert response.status_code == 429
+        matcher.admission.clear()
+        response = client.post("/batch", json={"jobs": jobs})
+        assert response.status_code == 200
+        assert [len(result["matches"]) for result in response.get_json()["results"]] == [1, 1, 1]
+
+    def test_parallel(self, matcher, client, monkeypatch):
+        pool = matcher.engine_manager._get_pool()
+        match = pool.match
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def match_slowly(*args, **kwargs):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.2)
+            try:
+                return match(*args, **kwargs)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        monkeypatch.setattr(pool, "match", match_slowly)
+        jobs = [{"regex_input": "a", "text_input": "a", "engine": "Python - re"}] * (pool.size * 2)
+        # The default admission config lets a batch of a client with nothing else running use every match worker
+        response = client.post("/batch", json={"jobs": jobs})
+        assert response.status_code == 200
+        assert peak[0] == pool.size
+
+
+class TestCompare:
+    def test_engines_agree(self, matcher, client):
+        response = client.post("/compare", json={"regex_input": "b", "text_input": "\U0001F600b"})
+        body = response.get_json()
+        assert set(body["results"]) == set(matcher.engine_manager.engine)
+        # Offsets of the engines counting UTF-16 code units are converted to code points
+        assert {tuple(result["matches"][0]["index"]) for result in body["results"].values()} == {(1, 2)}
+        assert body["diff"]["consistent"]
+
+    @pytest.mark.parametrize(
+        "body, status",
+        [
+            ({"regex_input": "", "text_input": "a"}, 400),
+            ({"regex_input": "a", "text_input": "a", "limit": "all"}, 400),
+            ({"regex_input": "a", "text_handle": "0" * 64}, 404),
+        ],
+    )
+    def test_invalid_request(self, client, body, status):
+        response = client.post("/compare", json=body)
+        assert response.status_code == status
+        assert response.get_json()["error"]
+
+    def test_counts_every_engine(self, matcher, client, monkeypatch):
+        monkeypatch.setattr(matcher.admission, "max_inflight", len(matcher.engine_manager.engine))
+        matcher.admission.acquire("other")
+        response = client.post("/compare", json={"regex_input": "a", "text_input": "a"})
+        assert response.status_code == 429
+
+
+class TestMetrics:
+    def test_render(self, client):
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.mimetype == "text/plain"
+        assert "# TYPE openregex_match_duration_seconds histogram" in response.get_data(as_text=True)
+
+    def test_counters(self, matcher, client, monkeypatch):
+        hits = metric(client, 'openregex_result_cache_lookups_total{result="hit"}')
+        rejections = metric(client, 'openregex_admission_rejections_total{reason="client_inflight"}')
+        body = {"regex_input": "a", "text_input": "a", "engine": "Python - re"}
+        client.post("/", json=body)
+        client.post("/", json=body)
+        assert metric(client, 'openregex_result_cache_lookups_total{result="hit"}') == hits + 1
+        monkeypatch.setattr(matcher.admission, "client_max_inflight", 1)
+        matcher.admission.acquire("127.0.0.1")
+        assert client.post("/", json={**body, "text_input": "aa"}).status_code == 429
+        assert metric(client, 'openregex_admission_rejections_total{reason="client_inflight"}') == rejections + 1